@@ -0,0 +1,123 @@
+# bandwidth.py - Global download bandwidth cap and adaptive fragment concurrency
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Protocols yt-dlp downloads fragment by fragment, where parallel fragments help
+FRAGMENTED_PROTOCOLS = ('m3u8', 'dash', 'ism', 'f4m')
+
+
+def is_fragmented(info):
+    """True if yt-dlp fetched any selected format of this info dict in fragments"""
+    parts = info.get('requested_formats') or [info]
+    return any(
+        any(protocol in (part.get('protocol') or '') for protocol in FRAGMENTED_PROTOCOLS)
+        for part in parts
+    )
+
+
+class BandwidthGovernor:
+    """Splits a global bandwidth cap evenly between running downloads.
+
+    Each download's yt-dlp options get a 'ratelimit' that is rewritten
+    whenever a download starts or finishes. yt-dlp re-reads it for every
+    chunk, so downloads in the thread pool speed up or slow down as soon as
+    their share changes (process pool downloads keep the share they started
+    with).
+    """
+
+    def __init__(self, limit=0, minimum=64 * 1024):
+        self.limit = limit
+        self.minimum = minimum
+        self._active = []
+        self._lock = threading.Lock()
+
+    def share_size(self):
+        with self._lock:
+            return self._share(len(self._active) or 1)
+
+    def _share(self, count):
+        return max(self.minimum, int(self.limit / count))
+
+    def _rebalance(self):
+        share = self._share(len(self._active) or 1)
+        for ydl_opts in self._active:
+            ydl_opts['ratelimit'] = share
+
+    @contextmanager
+    def share(self, ydl_opts):
+        """Keep ydl_opts' rate limit at its fair share of the cap while the block runs"""
+        if not self.limit:
+            yield
+            return
+        with self._lock:
+            self._active.append(ydl_opts)
+            self._rebalance()
+        try:
+            yield
+        finally:
+            with self._lock:
+                # Options dicts can compare equal, so remove this one by identity
+                self._active = [active for active in self._active if active is not ydl_opts]
+                self._rebalance()
+            ydl_opts.pop('ratelimit', None)
+
+
+class FragmentTuner:
+    """Per-platform concurrent_fragment_downloads, hill-climbing on measured throughput.
+
+    After every fragmented download the level takes one step in its current
+    direction, and turns around when the last step made downloads slower.
+    A download held back by the bandwidth cap steps down, since more
+    connections can't beat the cap.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, tolerance=0.05, smoothing=0.3):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._level = {}
+        self._direction = {}
+        self._speed = {}
+        self._lock = threading.Lock()
+
+    def level(self, platform):
+        with self._lock:
+            return self._level.get(platform, self.initial)
+
+    def levels(self):
+        with self._lock:
+            return dict(self._level)
+
+    def record(self, platform, level, bytes_per_second, capped=False):
+        """Feed back the throughput a download reached with level parallel fragments"""
+        with self._lock:
+            key = (platform, level)
+            previous = self._speed.get(key)
+            speed = bytes_per_second if previous is None else (
+                self.smoothing * bytes_per_second + (1 - self.smoothing) * previous
+            )
+            self._speed[key] = speed
+
+            direction = self._direction.get(platform, 1)
+            if capped:
+                direction = -1
+                new_level = max(self.minimum, level - 1)
+            else:
+                neighbour = self._speed.get((platform, level - direction))
+                if neighbour is not None and speed < neighbour * (1 - self.tolerance):
+                    # The last step made things slower; go back the other way
+                    direction = -direction
+                new_level = level + direction
+                if not self.minimum <= new_level <= self.maximum:
+                    direction = -direction
+                    new_level = max(self.minimum, min(self.maximum, level + direction))
+            self._direction[platform] = direction
+            if new_level != self._level.get(platform, self.initial):
+                logger.debug(f"🧵 {platform} fragment concurrency {level} -> {new_level} ({speed / 1048576:.1f} MB/s)")
+            self._level[platform] = new_level
+            return new_level
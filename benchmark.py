@@ -0,0 +1,298 @@
+# benchmark.py - Offline end-to-end benchmark with a stub Bot API and a synthetic media origin
+#
+# Drives MultiPlatformDownloaderBot through python-telegram-bot and real yt-dlp
+# against two local aiohttp servers, so it needs no network and no real token:
+#   * a stub Bot API that accepts sendVideo/editMessageText/... and can inject flood waits
+#   * a media origin serving deterministic synthetic files with configurable size,
+#     latency and failure rate (yt-dlp's generic extractor downloads them)
+#
+#   python benchmark.py --levels 1,4,16 --requests 32 --size-mb 2 --latency 0.2 --fail-rate 0.1
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aiohttp import web
+
+BENCH_TOKEN = '123456:BENCHMARKBENCHMARKBENCHMARKBENCHMARK'
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), or 0 where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class MediaOrigin:
+    """Serves /media/<name>.mp4 as deterministic synthetic bytes.
+
+    Whether a name fails is decided by seed and name alone, so every run
+    injects the same failures for the same request set.
+    """
+
+    def __init__(self, size, latency, fail_rate, seed):
+        self.size = size
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.seed = seed
+        self.requests = 0
+        # ftyp header so the file at least looks like an mp4, padded with fixed noise
+        header = b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom'
+        noise = random.Random(seed).randbytes(64 * 1024)
+        self._chunk = (header + noise)[:64 * 1024]
+
+    def fails(self, name):
+        return random.Random(f"{self.seed}:{name}").random() < self.fail_rate
+
+    async def handle(self, request):
+        self.requests += 1
+        name = request.match_info['name']
+        await asyncio.sleep(self.latency)
+        if self.fails(name):
+            return web.Response(status=503, text='injected failure')
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'video/mp4',
+            'Content-Length': str(self.size),
+            'Accept-Ranges': 'none',
+        })
+        await response.prepare(request)
+        if request.method != 'HEAD':
+            remaining = self.size
+            try:
+                while remaining > 0:
+                    piece = self._chunk[:min(remaining, len(self._chunk))]
+                    await response.write(piece)
+                    remaining -= len(piece)
+            except ConnectionError:
+                # yt-dlp sniffs the start of the file and hangs up; that's expected
+                return response
+        await response.write_eof()
+        return response
+
+
+class StubBotAPI:
+    """Just enough of the Bot API for the download flow, recording what was delivered"""
+
+    def __init__(self, flood_rate=0.0, seed=0):
+        self.flood_rate = flood_rate
+        self.calls = {}
+        self.deliveries = {}
+        self.upload_bytes = 0
+        self._message_id = 0
+        self._random = random.Random(seed)
+
+    def _message(self, chat_id, **extra):
+        self._message_id += 1
+        return {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            **extra,
+        }
+
+    def _video(self, chat_id):
+        file_id = f"bench-{self._message_id + 1}"
+        return self._message(chat_id, video={
+            'file_id': file_id, 'file_unique_id': file_id, 'width': 640, 'height': 360, 'duration': 10,
+        })
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] = self.calls.get(method, 0) + 1
+        form = await request.post()
+        for value in form.values():
+            if hasattr(value, 'file'):
+                self.upload_bytes += len(value.file.read())
+        chat_id = form.get('chat_id', 0)
+
+        if method == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'editMessageText' and self._random.random() < self.flood_rate:
+            return web.json_response(
+                {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                 'parameters': {'retry_after': 1}},
+                status=429,
+            )
+        elif method == 'sendVideo':
+            self.deliveries[int(chat_id)] = self.deliveries.get(int(chat_id), 0) + 1
+            result = self._video(chat_id)
+        elif method == 'sendMediaGroup':
+            media = json.loads(form.get('media', '[]'))
+            self.deliveries[int(chat_id)] = self.deliveries.get(int(chat_id), 0) + len(media)
+            result = [self._video(chat_id) for _ in media]
+        elif method in ('deleteMessage', 'answerCallbackQuery'):
+            result = True
+        else:
+            result = self._message(chat_id, text=form.get('text', ''))
+        return web.json_response({'ok': True, 'result': result})
+
+
+async def start_site(app, port=0):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', port)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+def make_update(bot, update_id, chat_id, user_id, text):
+    from telegram import Update
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+            'text': text,
+        },
+    }, bot)
+
+
+async def run_level(downloader, api, origin_url, concurrency, requests, users, offset):
+    """Send requests with at most concurrency in flight; returns the per-level report"""
+    application = downloader.application
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    succeeded = 0
+
+    async def one(index):
+        nonlocal succeeded
+        update_id = offset + index + 1
+        chat_id = 1_000_000 + update_id
+        url = f"{origin_url}/media/clip-{update_id}.mp4"
+        async with semaphore:
+            started = time.perf_counter()
+            await application.process_update(make_update(application.bot, update_id, chat_id, index % users + 1, url))
+            # Downloads run as background jobs; wait for this request's job to finish
+            jobs = [task for task, job in downloader.job_tasks.items() if job['chat_id'] == chat_id]
+            await asyncio.gather(*jobs, return_exceptions=True)
+            latencies.append(time.perf_counter() - started)
+        if api.deliveries.get(chat_id):
+            succeeded += 1
+
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'succeeded': succeeded,
+        'failed': requests - succeeded,
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else 0.0,
+        'p50': round(percentile(latencies, 0.50), 3),
+        'p95': round(percentile(latencies, 0.95), 3),
+        'p99': round(percentile(latencies, 0.99), 3),
+        'rss_mb': round(rss_mb(), 1),
+        'peak_traced_mb': round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1) if tracemalloc.is_tracing() else None,
+    }
+
+
+async def main(args):
+    origin = MediaOrigin(int(args.size_mb * 1024 * 1024), args.latency, args.fail_rate, args.seed)
+    api = StubBotAPI(args.flood_rate, args.seed)
+
+    origin_app = web.Application()
+    origin_app.router.add_get('/media/{name}.mp4', origin.handle)
+    api_app = web.Application(client_max_size=4 * 1024 ** 3)
+    api_app.router.add_post('/bot{token}/{method}', api.handle)
+    origin_runner, origin_port = await start_site(origin_app)
+    api_runner, api_port = await start_site(api_app)
+
+    # main reads its configuration from the environment at import time
+    state_dir = tempfile.mkdtemp(prefix='anylink-bench-')
+    os.environ.update({
+        'BOT_TOKEN': BENCH_TOKEN,
+        'BOT_API_URL': f"http://127.0.0.1:{api_port}",
+        'FILE_CACHE_PATH': os.path.join(state_dir, 'file_cache.sqlite3'),
+        'METRICS_PORT': '0',
+        'JOB_QUEUE_PATH': os.path.join(state_dir, 'jobs.sqlite3'),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as bot_module
+
+    downloader = bot_module.MultiPlatformDownloaderBot()
+    application = downloader.application
+    await application.initialize()
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    reports = []
+    offset = 0
+    try:
+        for concurrency in args.levels:
+            report = await run_level(
+                downloader, api, f"http://127.0.0.1:{origin_port}",
+                concurrency, args.requests, args.users or concurrency, offset,
+            )
+            offset += args.requests
+            reports.append(report)
+            print(
+                f"📊 c={report['concurrency']:>3}  ok={report['succeeded']:>4}/{report['requests']:<4} "
+                f"{report['throughput_rps']:>7.2f} req/s  p50={report['p50']:.2f}s  p95={report['p95']:.2f}s  "
+                f"p99={report['p99']:.2f}s  rss={report['rss_mb']:.0f} MB",
+                flush=True,
+            )
+    finally:
+        await application.shutdown()
+        await downloader.post_shutdown(application)
+        await api_runner.cleanup()
+        await origin_runner.cleanup()
+
+    summary = {
+        'config': {
+            'size_mb': args.size_mb, 'latency': args.latency, 'fail_rate': args.fail_rate,
+            'flood_rate': args.flood_rate, 'seed': args.seed,
+        },
+        'levels': reports,
+        'bot_api_calls': api.calls,
+        'uploaded_mb': round(api.upload_bytes / (1024 * 1024), 1),
+        'origin_requests': origin.requests,
+    }
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(summary, output, indent=2)
+        print(f"💾 Wrote {args.json}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark for the downloader bot")
+    parser.add_argument('--levels', default='1,4,8', type=lambda s: [int(x) for x in s.split(',') if x],
+                        help="comma-separated concurrency levels (default 1,4,8)")
+    parser.add_argument('--requests', type=int, default=16, help="requests per level (default 16)")
+    parser.add_argument('--users', type=int, default=0, help="distinct users per level (default: one per slot)")
+    parser.add_argument('--size-mb', type=float, default=1.0, help="synthetic file size in MB (default 1)")
+    parser.add_argument('--latency', type=float, default=0.05, help="origin time to first byte in seconds")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fraction of media URLs that return 503")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="fraction of message edits answered with 429")
+    parser.add_argument('--seed', type=int, default=1, help="seed for synthetic data and injected failures")
+    parser.add_argument('--trace-memory', action='store_true', help="also report tracemalloc peak per level")
+    parser.add_argument('--json', help="write the full report to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,156 @@
+# download_executor.py - Bounded worker pool for blocking yt-dlp work
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import yt_dlp
+
+from ydl_pool import CHECKED_YTDLP_VERSION, YDLPool, internals_supported
+
+logger = logging.getLogger(__name__)
+
+# This process's pool of warm yt-dlp sessions; None builds a fresh YoutubeDL for every job
+_ydl_pool = None
+
+
+def configure_pool(max_idle, max_jobs, idle_timeout):
+    """Set up the session pool for yt-dlp jobs run in this process (also the process pool initializer)"""
+    global _ydl_pool
+    if max_idle > 0 and not internals_supported():
+        logger.warning(
+            f"⚠️ yt-dlp {yt_dlp.version.__version__} changed internals the session pool uses "
+            f"(checked against {CHECKED_YTDLP_VERSION}), building a fresh YoutubeDL per job"
+        )
+        max_idle = 0
+    _ydl_pool = YDLPool(max_idle, max_jobs, idle_timeout) if max_idle > 0 else None
+
+
+def youtube_dl(platform, ydl_opts):
+    if _ydl_pool:
+        return _ydl_pool.session(platform, ydl_opts)
+    return yt_dlp.YoutubeDL(ydl_opts)
+
+
+class DownloadQueueFull(Exception):
+    """Raised when the download queue has no room for another job"""
+
+
+def add_cookie_headers(ydl, info):
+    """Give each direct http(s) format the Cookie header the jar would send to its URL
+
+    yt-dlp's own 'cookies' field is in Set-Cookie form (with Domain, Path and
+    Expires attributes), which is not something a plain HTTP client can send.
+    """
+    for fmt in [info] + list(info.get('formats') or []):
+        if fmt.get('cookies') and fmt.get('url') and fmt.get('protocol') in ('http', 'https'):
+            fmt['cookie_header'] = ydl.cookiejar.get_cookie_header(fmt['url'])
+
+
+def run_extraction(platform, url, ydl_opts, download=True):
+    """Run yt-dlp in a worker and return a picklable info dict"""
+    with youtube_dl(platform, ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=download)
+        if not info:
+            return {}
+        info = ydl.sanitize_info(info)
+        if not download:
+            # Streamed formats are fetched outside yt-dlp, so they need their cookies spelled out
+            add_cookie_headers(ydl, info)
+        return info
+
+
+def run_processing(platform, info, ydl_opts):
+    """Download media for an already-extracted info dict without re-extracting"""
+    with youtube_dl(platform, ydl_opts) as ydl:
+        result = ydl.process_ie_result(info, download=True)
+        return ydl.sanitize_info(result) if result else {}
+
+
+def parse_platform_limits(spec):
+    """Parse 'youtube=2,tiktok=4' into {'youtube': 2, 'tiktok': 4}"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        platform, _, value = item.partition('=')
+        try:
+            limits[platform.strip().lower()] = max(1, int(value))
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid platform limit: {item}")
+    return limits
+
+
+class DownloadExecutor:
+    """Runs yt-dlp jobs off the event loop with per-platform caps and a bounded queue"""
+
+    def __init__(self, max_workers=4, mode='thread', queue_size=20, platform_limits=None, session_pool=(0, 100, 300)):
+        self.max_workers = max(1, max_workers)
+        self.mode = mode
+        self.queue_size = max(0, queue_size)
+        self.platform_limits = platform_limits or {}
+        self._semaphores = {}
+        self._pending = 0
+        self._running = 0
+
+        # session_pool is (idle sessions kept, jobs per session, idle seconds); each worker process gets its own
+        if mode == 'process':
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=configure_pool, initargs=session_pool
+            )
+        else:
+            configure_pool(*session_pool)
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ytdlp')
+
+        logger.info(f"⚙️ Download executor: {self.mode} pool, {self.max_workers} workers, queue {self.queue_size}")
+
+    @property
+    def capacity(self):
+        """Maximum number of jobs accepted at once (running + queued)"""
+        return self.max_workers + self.queue_size
+
+    def stats(self):
+        """Snapshot of the current executor load"""
+        return {
+            'pending': self._pending,
+            'running': self._running,
+            'capacity': self.capacity,
+            'sessions': _ydl_pool.stats() if _ydl_pool and self.mode == 'thread' else None,
+        }
+
+    def _semaphore(self, platform):
+        if platform not in self._semaphores:
+            limit = self.platform_limits.get(platform, self.max_workers)
+            self._semaphores[platform] = asyncio.Semaphore(min(limit, self.max_workers))
+        return self._semaphores[platform]
+
+    async def submit(self, platform, func, *args):
+        """Run func(*args) in the pool once a platform slot is free"""
+        if self._pending >= self.capacity:
+            raise DownloadQueueFull(f"Download queue is full ({self.capacity} jobs)")
+
+        self._pending += 1
+        try:
+            async with self._semaphore(platform):
+                self._running += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._pool, func, *args)
+                finally:
+                    self._running -= 1
+        finally:
+            self._pending -= 1
+
+    async def extract(self, platform, url, ydl_opts, download=True):
+        """Run a yt-dlp extraction for a platform in the pool"""
+        return await self.submit(platform, run_extraction, platform, url, ydl_opts, download)
+
+    async def download_info(self, platform, info, ydl_opts):
+        """Download media for a probed info dict in the pool"""
+        return await self.submit(platform, run_processing, platform, info, ydl_opts)
+
+    def shutdown(self, wait=False):
+        """Stop accepting work and release pool workers"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        if _ydl_pool and self.mode == 'thread':
+            _ydl_pool.close()
+        logger.info("🛑 Download executor stopped")
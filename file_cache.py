@@ -0,0 +1,168 @@
+# file_cache.py - Persistent Telegram file_id cache for already-uploaded media
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that never change which media a URL points to, on any site
+TRACKING_PARAMS = {
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'utm_id', 'fbclid', 'gclid',
+    'igshid', 'igsh', 'mibextid',
+}
+
+# Short share and referrer parameters that are only known to be tracking on these sites
+# (elsewhere a parameter like 's' or 't' can pick the media); subdomains count too
+SITE_TRACKING_PARAMS = {
+    'youtube.com': {'si', 'feature', 'pp', 't'},
+    'twitter.com': {'s', 't', 'ref_src'},
+    'x.com': {'s', 't', 'ref_src'},
+    'tiktok.com': {'is_from_webapp', 'sender_device', 'share_id', '_r', '_t'},
+    'facebook.com': {'ref', 's', 'sfnsn'},
+    'reddit.com': {'ref', 'ref_source', 'share_id'},
+}
+
+
+def site_tracking_params(host):
+    """Tracking parameters of host's site (matched on host and its parent domains)"""
+    labels = host.split('.')
+    for i in range(len(labels) - 1):
+        params = SITE_TRACKING_PARAMS.get('.'.join(labels[i:]))
+        if params:
+            return params
+    return set()
+
+
+def normalize_url(url):
+    """Canonical form of a media URL for cache lookups"""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return url.strip()
+
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    path = parsed.path.rstrip('/') or '/'
+
+    # youtu.be/<id> and /shorts/<id> are the same video as watch?v=<id>
+    if host == 'youtu.be' and path != '/':
+        return f"https://youtube.com/watch?v={path.lstrip('/')}"
+    if host == 'youtube.com' and path.startswith('/shorts/'):
+        return f"https://youtube.com/watch?v={path.split('/')[2]}"
+
+    tracking = TRACKING_PARAMS | site_tracking_params(host)
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in tracking
+    )
+    return urlunparse(('https', host, path, '', urlencode(query), ''))
+
+
+def media_key(info):
+    """Cache key for the extractor's own video ID, or None if unknown"""
+    if not info:
+        return None
+    extractor = info.get('extractor_key') or info.get('extractor')
+    video_id = info.get('id')
+    if not extractor or not video_id:
+        return None
+    return f"id:{extractor.lower()}:{video_id}"
+
+
+def url_key(url):
+    return f"url:{normalize_url(url)}"
+
+
+class FileIdCache:
+    """SQLite-backed file_id cache with TTL expiry and LRU eviction"""
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS media (
+                key TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                title TEXT,
+                uploader TEXT,
+                duration INTEGER,
+                file_size INTEGER,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )'''
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS media_last_used ON media (last_used)')
+        self._conn.commit()
+        logger.info(f"🗄️ File cache ready at {path}")
+
+    def get(self, *keys):
+        """Return the first fresh entry among keys, or None"""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                if not key:
+                    continue
+                row = self._conn.execute(
+                    'SELECT file_id, title, uploader, duration, file_size, created_at FROM media WHERE key = ?',
+                    (key,)
+                ).fetchone()
+                if not row:
+                    continue
+                if now - row[5] > self.ttl:
+                    self._conn.execute('DELETE FROM media WHERE key = ?', (key,))
+                    self._conn.commit()
+                    continue
+                self._conn.execute('UPDATE media SET last_used = ? WHERE key = ?', (now, key))
+                self._conn.commit()
+                return {
+                    'file_id': row[0],
+                    'title': row[1],
+                    'uploader': row[2],
+                    'duration': row[3],
+                    'file_size': row[4],
+                }
+        return None
+
+    def put(self, keys, file_id, title=None, uploader=None, duration=None, file_size=None):
+        """Store a file_id under every given key and evict old entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(key, file_id, title, uploader, duration, file_size, now, now) for key in keys if key]
+            )
+            self._conn.execute('DELETE FROM media WHERE created_at < ?', (now - self.ttl,))
+            count = self._conn.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM media WHERE key IN (SELECT key FROM media ORDER BY last_used ASC LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def invalidate(self, file_id):
+        """Drop every key pointing at a file_id Telegram no longer accepts"""
+        with self._lock:
+            self._conn.execute('DELETE FROM media WHERE file_id = ?', (file_id,))
+            self._conn.commit()
+
+    async def aget(self, *keys):
+        return await asyncio.to_thread(self.get, *keys)
+
+    async def aput(self, keys, file_id, **fields):
+        await asyncio.to_thread(self.put, keys, file_id, **fields)
+
+    async def ainvalidate(self, file_id):
+        await asyncio.to_thread(self.invalidate, file_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
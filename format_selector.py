@@ -0,0 +1,116 @@
+# format_selector.py - Size-aware format selection against the upload cap
+import logging
+from collections import namedtuple
+
+from probe import MediaTooLarge, format_size, selected_size, is_progressive, has_video, has_audio
+
+logger = logging.getLogger(__name__)
+
+# Containers Telegram plays inline without conversion
+STREAMABLE_EXTS = {'mp4'}
+
+# Audio container that merges into each video container without re-encoding
+AUDIO_FOR_VIDEO = {'mp4': 'm4a', 'webm': 'webm'}
+
+Candidate = namedtuple('Candidate', 'spec height size needs_remux ext tbr')
+
+
+def _usable(fmt):
+    return (
+        fmt.get('format_id')
+        and not fmt.get('has_drm')
+        and fmt.get('ext') not in ('mhtml', None)
+    )
+
+
+def _best_audio(audio_formats, video_ext):
+    """Audio track that merges cleanly with the video, highest bitrate first"""
+    preferred = AUDIO_FOR_VIDEO.get(video_ext)
+    if not audio_formats:
+        return None
+    return max(
+        audio_formats,
+        key=lambda fmt: (fmt.get('ext') == preferred, fmt.get('abr') or fmt.get('tbr') or 0)
+    )
+
+
+def candidate_streams(info):
+    """Every downloadable option: single-file formats and video+audio pairs"""
+    duration = info.get('duration')
+    formats = [fmt for fmt in info.get('formats') or [] if _usable(fmt)]
+    audio_only = [fmt for fmt in formats if has_audio(fmt) and not has_video(fmt)]
+
+    candidates = []
+    for fmt in formats:
+        if not has_video(fmt):
+            continue
+        if is_progressive(fmt):
+            candidates.append(Candidate(
+                spec=fmt['format_id'],
+                height=fmt.get('height') or 0,
+                size=format_size(fmt, duration),
+                needs_remux=False,
+                ext=fmt.get('ext'),
+                tbr=fmt.get('tbr') or 0,
+            ))
+            continue
+
+        audio = _best_audio(audio_only, fmt.get('ext'))
+        if not audio:
+            continue
+        video_size = format_size(fmt, duration)
+        audio_size = format_size(audio, duration)
+        candidates.append(Candidate(
+            spec=f"{fmt['format_id']}+{audio['format_id']}",
+            height=fmt.get('height') or 0,
+            size=video_size + audio_size if video_size is not None and audio_size is not None else None,
+            needs_remux=True,
+            ext=fmt.get('ext'),
+            tbr=(fmt.get('tbr') or 0) + (audio.get('tbr') or audio.get('abr') or 0),
+        ))
+    return candidates
+
+
+def rank(candidate):
+    """Sort key: quality first, then streams that need no merging, then mp4"""
+    return (
+        candidate.height,
+        not candidate.needs_remux,
+        candidate.ext in STREAMABLE_EXTS,
+        candidate.tbr,
+    )
+
+
+def select_format(info, max_bytes, max_height=None):
+    """Best-quality candidate known to fit under max_bytes, or None"""
+    candidates = candidate_streams(info)
+    if max_height:
+        within = [c for c in candidates if c.height <= max_height]
+        candidates = within or candidates
+
+    fitting = [c for c in candidates if c.size is not None and c.size <= max_bytes]
+    if not fitting:
+        return None
+    return max(fitting, key=rank)
+
+
+def plan_download(info, max_bytes, max_height=None):
+    """Decide what to download from probed metadata.
+
+    Returns a Candidate to download, None to keep yt-dlp's own selection
+    when sizes are unknown, or raises MediaTooLarge when nothing can fit.
+    """
+    if not info or info.get('_type') == 'playlist':
+        return None
+
+    choice = select_format(info, max_bytes, max_height)
+    if choice:
+        size_mb = choice.size / (1024 * 1024)
+        logger.info(f"📏 Selected format {choice.spec} ({choice.height or '?'}p, ~{size_mb:.1f} MB)")
+        return choice
+
+    size = selected_size(info)
+    if size is None or size <= max_bytes:
+        return None
+
+    raise MediaTooLarge(size, max_bytes, info.get('title'))
@@ -0,0 +1,54 @@
+# hedge.py - Hedged execution: race backup strategies when the first one is slow
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def hedged_race(candidates, delay, max_parallel=2, is_fatal=None):
+    """Run candidates with staggered starts and return the first success.
+
+    candidates is a list of (key, coroutine_function). The first one starts
+    right away; the next starts when the running ones haven't finished within
+    delay seconds, or as soon as one fails. Returns (key, result) for the
+    winner and cancels the rest. Raises the last error if every candidate
+    fails, or immediately for errors is_fatal(error) says not to hedge past.
+    """
+    remaining = list(candidates)
+    pending = {}
+    last_error = None
+
+    def launch():
+        key, func = remaining.pop(0)
+        pending[asyncio.ensure_future(func())] = key
+        if len(pending) > 1:
+            logger.info(f"🏁 Hedging with strategy {key} ({len(pending)} running)")
+
+    launch()
+    try:
+        while pending:
+            can_hedge = remaining and len(pending) < max_parallel
+            done, _ = await asyncio.wait(
+                pending, timeout=delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                launch()
+                continue
+
+            for task in done:
+                key = pending.pop(task)
+                error = task.exception()
+                if error is None:
+                    return key, task.result()
+                last_error = error
+                if is_fatal and is_fatal(error):
+                    raise error
+
+            # A failure frees a slot; start the next strategy without waiting
+            while remaining and len(pending) < max_parallel:
+                launch()
+
+        raise last_error or RuntimeError("No strategies to run")
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,168 @@
+# info_cache.py - Short-lived cache of extracted metadata, and of links that are known to be dead
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from file_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+
+def info_key(url, platform, strategy, playlist=False):
+    return f"info:{platform}:{strategy}:{int(bool(playlist))}:{normalize_url(url)}"
+
+
+def failure_key(url):
+    return f"failure:{normalize_url(url)}"
+
+
+class InfoCache:
+    """Bounded in-memory LRU of info dicts and permanent failures, optionally backed by SQLite.
+
+    Info dicts hold signed format URLs that expire, so they live for ttl
+    seconds; failures such as private or deleted media live for failure_ttl
+    (0 turns either half off). Entries are stored as JSON, so every hit is
+    a private copy yt-dlp can mutate. With a path, misses fall through to
+    the on-disk table that restarts and other processes share.
+    """
+
+    def __init__(self, path=None, ttl=300, failure_ttl=3600, max_entries=512, max_disk_entries=5000):
+        self.path = path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                '''CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )'''
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)')
+            self._conn.commit()
+        logger.info(f"🧠 Info cache ready ({max_entries} entries in memory{f', backed by {path}' if path else ''})")
+
+    def _get_many(self, keys):
+        """Fresh JSON values for keys, checking memory first and SQLite in one query for the rest"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry and entry[1] > now:
+                    self._memory.move_to_end(key)
+                    found[key] = entry[0]
+                    continue
+                if entry:
+                    del self._memory[key]
+                missing.append(key)
+            if missing and self._conn:
+                rows = self._conn.execute(
+                    f"SELECT key, value, expires_at FROM entries WHERE key IN ({', '.join('?' * len(missing))})",
+                    missing
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if expires_at > now:
+                        self._remember(key, value, expires_at)
+                        found[key] = value
+        return found
+
+    def _get(self, key):
+        value = self._get_many([key]).get(key)
+        return None if value is None else json.loads(value)
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _put(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        value = json.dumps(value)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if not self._conn:
+                return
+            self._conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)', (key, value, expires_at))
+            self._conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+            count = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            if count > self.max_disk_entries:
+                self._conn.execute(
+                    'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires_at ASC LIMIT ?)',
+                    (count - self.max_disk_entries,)
+                )
+            self._conn.commit()
+
+    def _delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn:
+                self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self._conn.commit()
+
+    def get_info(self, url, platform, strategies, playlist=False):
+        """(strategy, info) for the first strategy with fresh metadata for url, or None"""
+        if self.ttl <= 0:
+            return None
+        keys = {strategy: info_key(url, platform, strategy, playlist) for strategy in strategies}
+        found = self._get_many(list(keys.values()))
+        for strategy, key in keys.items():
+            if key in found:
+                return strategy, json.loads(found[key])
+        return None
+
+    def put_info(self, url, platform, strategy, info, playlist=False):
+        if info and self.ttl > 0:
+            self._put(info_key(url, platform, strategy, playlist), info, self.ttl)
+
+    def drop_info(self, url, platform, strategy, playlist=False):
+        """Forget metadata that turned out to be stale (its media URLs stopped working)"""
+        self._delete(info_key(url, platform, strategy, playlist))
+
+    def get_failure(self, url):
+        """The error message url failed with recently, or None"""
+        if self.failure_ttl <= 0:
+            return None
+        return self._get(failure_key(url))
+
+    def put_failure(self, url, error):
+        if self.failure_ttl > 0:
+            self._put(failure_key(url), str(error)[:500], self.failure_ttl)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._memory)}
+
+    async def aget_info(self, *args, **kwargs):
+        return await asyncio.to_thread(self.get_info, *args, **kwargs)
+
+    async def aput_info(self, *args, **kwargs):
+        await asyncio.to_thread(self.put_info, *args, **kwargs)
+
+    async def adrop_info(self, *args, **kwargs):
+        await asyncio.to_thread(self.drop_info, *args, **kwargs)
+
+    async def aget_failure(self, url):
+        return await asyncio.to_thread(self.get_failure, url)
+
+    async def aput_failure(self, url, error):
+        await asyncio.to_thread(self.put_failure, url, error)
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,210 @@
+# job_queue.py - Durable download job queue; also the broker between front ends and workers
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Stages a job moves through; anything not finished is claimed again after a restart
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+UPLOADING = 'uploading'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+COLUMNS = (
+    'id', 'chat_id', 'user_id', 'message_id', 'status_message_id', 'url', 'platform',
+    'stage', 'temp_dir', 'resumes', 'error', 'created_at', 'updated_at', 'worker', 'lease_until',
+)
+
+
+class JobQueue:
+    """SQLite (WAL) table of download jobs and the stage each one reached.
+
+    Several processes can share the file: workers claim a job with a lease
+    they keep renewing, and a job whose lease runs out (its worker died) can
+    be claimed by anyone else.
+    """
+
+    def __init__(self, path, retention=24 * 3600):
+        self.path = path
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                message_id INTEGER,
+                status_message_id INTEGER,
+                url TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                temp_dir TEXT,
+                resumes INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                worker TEXT,
+                lease_until REAL NOT NULL DEFAULT 0
+            )'''
+        )
+        # Tables created before workers existed lack the lease columns
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'worker' not in existing:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN worker TEXT')
+        if 'lease_until' not in existing:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN lease_until REAL NOT NULL DEFAULT 0')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_stage ON jobs (stage, id)')
+        self._conn.commit()
+        logger.info(f"🗃️ Job queue ready at {path}")
+
+    def _row(self, row):
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def add(self, chat_id, user_id, url, platform, message_id=None, status_message_id=None, worker=None, lease=0):
+        """Record a newly accepted job and return it, already claimed if a worker is given"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO jobs (chat_id, user_id, message_id, status_message_id, url, platform, stage, '
+                'created_at, updated_at, worker, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (chat_id, user_id, message_id, status_message_id, url, platform, QUEUED, now, now,
+                 worker, now + lease if worker else 0)
+            )
+            self._conn.commit()
+            job_id = cursor.lastrowid
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT {", ".join(COLUMNS)} FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def update(self, job_id, **fields):
+        """Persist a stage change or other field updates for a job"""
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+            self._conn.commit()
+
+    def finish(self, job_id, error=None):
+        """Mark a job done, or failed with an error"""
+        self.update(job_id, stage=FAILED if error else DONE, error=str(error)[:500] if error else None)
+
+    def claim(self, worker, lease):
+        """Take the next unclaimed (or abandoned) job for worker, or None.
+
+        Users with the fewest running jobs go first, then the oldest job, so
+        one user's backlog doesn't starve everyone else across workers. A job
+        that had already started counts as a resume.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    f'''SELECT {", ".join(COLUMNS)} FROM jobs
+                    WHERE stage NOT IN (?, ?) AND (worker IS NULL OR lease_until < ?)
+                    ORDER BY (
+                        SELECT COUNT(*) FROM jobs AS running
+                        WHERE running.user_id = jobs.user_id AND running.stage NOT IN (?, ?)
+                        AND running.worker IS NOT NULL AND running.lease_until >= ?
+                    ), id
+                    LIMIT 1''',
+                    (*FINISHED, now, *FINISHED, now)
+                ).fetchone()
+                if row:
+                    job = self._row(row)
+                    resumed = 1 if job['stage'] != QUEUED or job['worker'] else 0
+                    self._conn.execute(
+                        'UPDATE jobs SET worker = ?, lease_until = ?, resumes = resumes + ?, updated_at = ? '
+                        'WHERE id = ?',
+                        (worker, now + lease, resumed, now, job['id'])
+                    )
+                    job.update(worker=worker, lease_until=now + lease, resumes=job['resumes'] + resumed)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return job if row else None
+
+    def heartbeat(self, worker, job_ids, lease):
+        """Extend worker's lease on the jobs it is still running"""
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                f'UPDATE jobs SET lease_until = ? WHERE worker = ? AND id IN ({", ".join("?" * len(job_ids))})',
+                (time.time() + lease, worker, *job_ids)
+            )
+            self._conn.commit()
+
+    def release(self, worker):
+        """Hand worker's unfinished jobs back so anyone can claim them right away"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET worker = NULL, lease_until = 0 WHERE worker = ? AND stage NOT IN (?, ?)',
+                (worker, *FINISHED)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def unfinished(self):
+        """Jobs that were accepted but never finished, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT {", ".join(COLUMNS)} FROM jobs WHERE stage NOT IN (?, ?) ORDER BY id',
+                FINISHED
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def purge(self):
+        """Forget finished jobs older than the retention period"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM jobs WHERE stage IN (?, ?) AND updated_at < ?',
+                (*FINISHED, time.time() - self.retention)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def stats(self):
+        """Job count per stage"""
+        with self._lock:
+            rows = self._conn.execute('SELECT stage, COUNT(*) FROM jobs GROUP BY stage').fetchall()
+        return dict(rows)
+
+    async def aadd(self, *args, **kwargs):
+        return await asyncio.to_thread(self.add, *args, **kwargs)
+
+    async def aupdate(self, job_id, **fields):
+        await asyncio.to_thread(self.update, job_id, **fields)
+
+    async def afinish(self, job_id, error=None):
+        await asyncio.to_thread(self.finish, job_id, error)
+
+    async def aclaim(self, worker, lease):
+        return await asyncio.to_thread(self.claim, worker, lease)
+
+    async def aheartbeat(self, worker, job_ids, lease):
+        await asyncio.to_thread(self.heartbeat, worker, job_ids, lease)
+
+    async def arelease(self, worker):
+        return await asyncio.to_thread(self.release, worker)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
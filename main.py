@@ -4,16 +4,40 @@ import asyncio
 import logging
 import sys
 import re
+import hashlib
 import random
 import time
 import tempfile
 import shutil
 import signal
-from urllib.parse import urlparse
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import socket
+from contextlib import ExitStack
+from pathlib import Path
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message, InputMediaPhoto, InputMediaVideo
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.error import TelegramError
 import yt_dlp
 
+from download_executor import DownloadExecutor, DownloadQueueFull, parse_platform_limits
+from scheduler import FairScheduler
+from file_cache import FileIdCache, media_key, url_key
+from info_cache import InfoCache
+from singleflight import SingleFlight
+from probe import MediaTooLarge, format_size, selected_size
+from format_selector import plan_download
+from strategy_stats import StrategySelector
+from hedge import hedged_race
+from streaming_upload import StreamingUploader, streamable_format
+from platform_guard import PlatformGuard, CircuitOpen, RateLimited, format_wait, parse_platform_rates, retry_sleep
+from platforms import Platform, PlatformRegistry, PLAYLIST_RE, extract_urls
+from progress import ProgressEditor, MessageRef, describe_progress, format_eta, progress_bar
+from job_queue import JobQueue, QUEUED, DOWNLOADING, UPLOADING, DONE, FAILED
+from metrics import MetricsRegistry, MetricsServer
+from webhook import WebhookServer
+from temp_storage import TempStorage, StorageQuotaExceeded, MB
+from transcode import Transcoder, TranscodeError, TranscodeUnavailable
+from bandwidth import BandwidthGovernor, FragmentTuner, is_fragmented
+
 # Configure logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -34,13 +58,286 @@ if YOUTUBE_COOKIE_FILE and not os.path.exists(YOUTUBE_COOKIE_FILE):
     logger.warning(f"⚠️ YouTube cookie file specified but not found: {YOUTUBE_COOKIE_FILE}")
     YOUTUBE_COOKIE_FILE = None
 
+# Download worker pool settings
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+DOWNLOAD_EXECUTOR = os.getenv('DOWNLOAD_EXECUTOR', 'thread').lower()
+DOWNLOAD_QUEUE_SIZE = int(os.getenv('DOWNLOAD_QUEUE_SIZE', '20'))
+PLATFORM_CONCURRENCY = parse_platform_limits(os.getenv('PLATFORM_CONCURRENCY', 'youtube=2'))
+# Warm yt-dlp sessions (extractors, keep-alive connections, cookie jars) reused between jobs; 0 disables
+YDL_POOL_SIZE = int(os.getenv('YDL_POOL_SIZE', str(DOWNLOAD_WORKERS * 2)))
+YDL_SESSION_JOBS = int(os.getenv('YDL_SESSION_JOBS', '100'))
+YDL_SESSION_IDLE = float(os.getenv('YDL_SESSION_IDLE', '300'))
+
+# Update processing and fair scheduling settings
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+MAX_ACTIVE_DOWNLOADS = int(os.getenv('MAX_ACTIVE_DOWNLOADS', str(DOWNLOAD_WORKERS)))
+PER_USER_DOWNLOADS = int(os.getenv('PER_USER_DOWNLOADS', '1'))
+
+# Optional self-hosted Bot API server (https://github.com/tdlib/telegram-bot-api)
+BOT_API_URL = os.getenv('BOT_API_URL', '').rstrip('/')
+BOT_API_LOCAL_MODE = os.getenv('BOT_API_LOCAL_MODE', '0').lower() in ('1', 'true', 'yes')
+UPLOAD_TIMEOUT = float(os.getenv('UPLOAD_TIMEOUT', '300'))
+if BOT_API_LOCAL_MODE and not BOT_API_URL:
+    logger.warning("⚠️ BOT_API_LOCAL_MODE is set without BOT_API_URL, local mode disabled")
+    BOT_API_LOCAL_MODE = False
+
+# Largest file the bot will try to upload (a local Bot API server accepts up to 2 GB)
+MAX_FILE_SIZE_MB = float(os.getenv('MAX_FILE_SIZE_MB', '2000' if BOT_API_LOCAL_MODE else '49'))
+MAX_FILE_SIZE = int(MAX_FILE_SIZE_MB * 1024 * 1024)
+FORMAT_MAX_HEIGHT = int(os.getenv('FORMAT_MAX_HEIGHT', '720'))
+
+# Hedged extraction: race backup strategies when the first is slow (opt-in)
+HEDGED_REQUESTS = os.getenv('HEDGED_REQUESTS', '0').lower() in ('1', 'true', 'yes')
+HEDGE_DELAY = float(os.getenv('HEDGE_DELAY', '8'))
+HEDGE_MAX_PARALLEL = int(os.getenv('HEDGE_MAX_PARALLEL', '2'))
+HEDGE_PLATFORMS = {p.strip() for p in os.getenv('HEDGE_PLATFORMS', 'youtube,instagram').split(',') if p.strip()}
+
+# Streaming uploads: pipe progressive streams into sendVideo without staging on disk (opt-in)
+STREAMING_UPLOADS = os.getenv('STREAMING_UPLOADS', '0').lower() in ('1', 'true', 'yes')
+STREAM_BUFFER_MB = float(os.getenv('STREAM_BUFFER_MB', '4'))
+
+# Per-platform extraction rate limits and bot-detection circuit breaker
+PLATFORM_RATE = float(os.getenv('PLATFORM_RATE', '1'))
+PLATFORM_RATES = parse_platform_rates(os.getenv('PLATFORM_RATES', 'youtube=0.5'))
+PLATFORM_BURST = int(os.getenv('PLATFORM_BURST', '5'))
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', '5'))
+BREAKER_WINDOW = float(os.getenv('BREAKER_WINDOW', '120'))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '600'))
+# Jittered exponential backoff after 429s, bot checks and timeouts (doubling from BACKOFF_BASE up to BACKOFF_MAX seconds)
+BACKOFF_BASE = float(os.getenv('BACKOFF_BASE', '2'))
+BACKOFF_MAX = float(os.getenv('BACKOFF_MAX', '60'))
+
+# Telegram file_id cache (set FILE_CACHE_PATH to an empty string to disable)
+FILE_CACHE_PATH = os.getenv('FILE_CACHE_PATH', 'file_cache.sqlite3')
+FILE_CACHE_TTL = int(os.getenv('FILE_CACHE_TTL', str(7 * 24 * 3600)))
+FILE_CACHE_MAX_ENTRIES = int(os.getenv('FILE_CACHE_MAX_ENTRIES', '10000'))
+
+# Extraction metadata cache: info dicts for INFO_CACHE_TTL seconds, dead links for INFO_CACHE_FAILURE_TTL
+# (0 disables either), in memory with an optional SQLite tier shared by restarts and workers
+INFO_CACHE_TTL = float(os.getenv('INFO_CACHE_TTL', '300'))
+INFO_CACHE_FAILURE_TTL = float(os.getenv('INFO_CACHE_FAILURE_TTL', '3600'))
+INFO_CACHE_SIZE = int(os.getenv('INFO_CACHE_SIZE', '512'))
+INFO_CACHE_PATH = os.getenv('INFO_CACHE_PATH', '')
+
+# Batch mode: several links in one message, optionally whole playlists/carousels
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '10'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '3'))
+BATCH_PLAYLISTS = os.getenv('BATCH_PLAYLISTS', '0').lower() in ('1', 'true', 'yes')
+
+# Progress messages are edited at most once per PROGRESS_INTERVAL seconds each
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '3'))
+
+# Durable job queue so restarts resume accepted downloads (empty path disables it)
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'jobs.sqlite3')
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', str(24 * 3600)))
+JOB_MAX_RESUMES = int(os.getenv('JOB_MAX_RESUMES', '3'))
+SHUTDOWN_GRACE = float(os.getenv('SHUTDOWN_GRACE', '20'))
+
+# Process role: 'all' handles updates and downloads in one process; 'frontend' only
+# records jobs in the JOB_QUEUE_PATH broker and any number of 'worker' processes claim them
+ROLE = os.getenv('ROLE', 'all').lower()
+if ROLE not in ('all', 'frontend', 'worker'):
+    logger.warning(f"⚠️ Unknown ROLE {ROLE!r}, running as 'all'")
+    ROLE = 'all'
+if ROLE != 'all' and not JOB_QUEUE_PATH:
+    logger.critical(f"❌ FATAL: ROLE={ROLE} needs JOB_QUEUE_PATH as its broker.")
+    sys.exit(1)
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+WORKER_JOBS = int(os.getenv('WORKER_JOBS', str(MAX_ACTIVE_DOWNLOADS)))
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '1'))
+JOB_LEASE = float(os.getenv('JOB_LEASE', '60'))
+
+# Download engine (opt-in): parallel HLS/DASH fragments with a per-platform concurrency
+# tuned on measured throughput, and progressive files fetched as ranged chunks
+FRAGMENT_ENGINE = os.getenv('FRAGMENT_ENGINE', '0').lower() in ('1', 'true', 'yes')
+FRAGMENT_CONCURRENCY = int(os.getenv('FRAGMENT_CONCURRENCY', '4'))
+FRAGMENT_CONCURRENCY_MAX = int(os.getenv('FRAGMENT_CONCURRENCY_MAX', '16'))
+HTTP_CHUNK_MB = float(os.getenv('HTTP_CHUNK_MB', '10'))
+# Download bandwidth shared evenly by all running downloads, in MB/s (0 = unlimited)
+BANDWIDTH_LIMIT_MB = float(os.getenv('BANDWIDTH_LIMIT_MB', '0'))
+
+# Optional ffmpeg stage: remux videos Telegram can't stream into faststart MP4s and
+# re-encode ones over MAX_FILE_SIZE to fit, in a niced process pool with a time budget
+TRANSCODE = os.getenv('TRANSCODE', '0').lower() in ('1', 'true', 'yes')
+TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', '0'))
+TRANSCODE_THREADS = int(os.getenv('TRANSCODE_THREADS', '2'))
+TRANSCODE_NICE = int(os.getenv('TRANSCODE_NICE', '10'))
+TRANSCODE_BUDGET = float(os.getenv('TRANSCODE_BUDGET', '300'))
+TRANSCODE_MODE = os.getenv('TRANSCODE_MODE', 'twopass').lower()
+TRANSCODE_PRESET = os.getenv('TRANSCODE_PRESET', 'veryfast')
+TRANSCODE_MAX_INPUT_MB = float(os.getenv('TRANSCODE_MAX_INPUT_MB', '300'))
+TRANSCODE_MIN_VIDEO_KBPS = int(os.getenv('TRANSCODE_MIN_VIDEO_KBPS', '150'))
+
+# Webhook delivery instead of long polling when WEBHOOK_URL (public https base URL) is set;
+# the server listens on Railway's PORT and also answers /healthz and /readyz
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram').strip('/')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '8080'))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# Derived from the token by default so every replica agrees on it without extra config
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+
+# Prometheus-style /metrics endpoint (METRICS_PORT=0 disables it)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+# Gauges that walk the temp directories or query the job queue are refreshed this often off the event loop
+METRICS_REFRESH_INTERVAL = float(os.getenv('METRICS_REFRESH_INTERVAL', '15'))
+
+# Temp directories are created with this prefix so their disk usage can be measured
+TEMP_PREFIX = 'anylink-'
+
+# Temp storage: downloads reserve their estimated size under TEMP_QUOTA_MB (0 = 80% of the
+# free disk at startup) and wait when it is used up; small ones are staged on tmpfs
+TEMP_DIR = os.getenv('TEMP_DIR', '') or tempfile.gettempdir()
+TEMP_QUOTA_MB = float(os.getenv('TEMP_QUOTA_MB', '0'))
+TEMP_HEADROOM_MB = float(os.getenv('TEMP_HEADROOM_MB', '200'))
+TEMP_STAGING_DIR = os.getenv('TEMP_STAGING_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else '')
+TEMP_STAGING_QUOTA_MB = float(os.getenv('TEMP_STAGING_QUOTA_MB', '128'))
+TEMP_STAGING_MAX_MB = float(os.getenv('TEMP_STAGING_MAX_MB', '20'))
+TEMP_MAX_AGE = float(os.getenv('TEMP_MAX_AGE', str(6 * 3600)))
+TEMP_SWEEP_INTERVAL = float(os.getenv('TEMP_SWEEP_INTERVAL', '900'))
+
+# Telegram albums hold at most 10 items
+ALBUM_SIZE = 10
+PHOTO_EXTS = {'.jpg', '.jpeg', '.png', '.webp'}
+
 print("🚀 AnyLink Downloader Bot v3.0.0 - Multi-Platform Edition")
 print(f"🤖 Bot token: {BOT_TOKEN[:20]}...")
 print("🌍 Multi-platform support: YouTube, Instagram, TikTok, Facebook, Twitter, Reddit")
 
 class MultiPlatformDownloaderBot:
     def __init__(self):
-        self.application = Application.builder().token(BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .concurrent_updates(CONCURRENT_UPDATES)
+            .write_timeout(UPLOAD_TIMEOUT)
+            .read_timeout(UPLOAD_TIMEOUT)
+        )
+        if BOT_API_URL:
+            builder = builder.base_url(f"{BOT_API_URL}/bot").base_file_url(f"{BOT_API_URL}/file/bot")
+            if BOT_API_LOCAL_MODE:
+                builder = builder.local_mode(True)
+            logger.info(f"🏠 Using Bot API server at {BOT_API_URL} (local mode: {BOT_API_LOCAL_MODE})")
+        self.application = builder.build()
+        
+        # yt-dlp runs in a worker pool so the event loop keeps serving updates
+        self.download_executor = DownloadExecutor(
+            max_workers=DOWNLOAD_WORKERS,
+            mode=DOWNLOAD_EXECUTOR,
+            queue_size=DOWNLOAD_QUEUE_SIZE,
+            platform_limits=PLATFORM_CONCURRENCY,
+            session_pool=(YDL_POOL_SIZE, YDL_SESSION_JOBS, YDL_SESSION_IDLE),
+        )
+        
+        # Round-robin admission so one busy user can't starve the others
+        self.scheduler = FairScheduler(
+            max_active=MAX_ACTIVE_DOWNLOADS,
+            per_user_limit=PER_USER_DOWNLOADS,
+        )
+        
+        # Already-uploaded media is re-sent by file_id instead of downloaded again
+        self.file_cache = None
+        if FILE_CACHE_PATH:
+            try:
+                self.file_cache = FileIdCache(FILE_CACHE_PATH, ttl=FILE_CACHE_TTL, max_entries=FILE_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                logger.warning(f"⚠️ File cache disabled, failed to open {FILE_CACHE_PATH}: {e}")
+        
+        # Recent metadata skips the probe, and links that are private or deleted fail without retries
+        try:
+            self.info_cache = InfoCache(
+                INFO_CACHE_PATH or None, ttl=INFO_CACHE_TTL, failure_ttl=INFO_CACHE_FAILURE_TTL, max_entries=INFO_CACHE_SIZE
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Info cache disk tier disabled, failed to open {INFO_CACHE_PATH}: {e}")
+            self.info_cache = InfoCache(ttl=INFO_CACHE_TTL, failure_ttl=INFO_CACHE_FAILURE_TTL, max_entries=INFO_CACHE_SIZE)
+        
+        # Concurrent requests for the same link share one download
+        self.inflight = SingleFlight()
+        
+        # Retry strategies are reordered by their recent per-platform success
+        self.strategy_selector = StrategySelector()
+        
+        # Throttle extraction per platform and stop hammering platforms that block us
+        self.platform_guard = PlatformGuard(
+            default_rate=PLATFORM_RATE,
+            burst=PLATFORM_BURST,
+            rates=PLATFORM_RATES,
+            threshold=BREAKER_THRESHOLD,
+            window=BREAKER_WINDOW,
+            cooldown=BREAKER_COOLDOWN,
+            backoff_base=BACKOFF_BASE,
+            backoff_max=BACKOFF_MAX,
+        )
+        
+        # Fair shares of the bandwidth cap, and parallel fragments sized by measured throughput
+        self.bandwidth = BandwidthGovernor(limit=int(BANDWIDTH_LIMIT_MB * MB))
+        self.fragment_tuner = FragmentTuner(
+            initial=FRAGMENT_CONCURRENCY, maximum=max(FRAGMENT_CONCURRENCY, FRAGMENT_CONCURRENCY_MAX)
+        )
+        
+        # Download and upload overlap for single progressive streams
+        # (a local Bot API server reads files straight from disk, which beats streaming)
+        self.streaming_uploader = None
+        if STREAMING_UPLOADS and not BOT_API_LOCAL_MODE:
+            chunk_size = 256 * 1024
+            self.streaming_uploader = StreamingUploader(
+                chunk_size=chunk_size,
+                buffer_chunks=max(1, int(STREAM_BUFFER_MB * 1024 * 1024 / chunk_size)),
+            )
+        
+        # Live download progress with coalesced, flood-safe message edits
+        self.progress_editor = ProgressEditor(min_interval=PROGRESS_INTERVAL)
+        
+        # Accepted jobs survive restarts; running ones are drained on shutdown
+        self.job_queue = None
+        if JOB_QUEUE_PATH:
+            try:
+                self.job_queue = JobQueue(JOB_QUEUE_PATH, retention=JOB_RETENTION)
+            except Exception as e:
+                logger.warning(f"⚠️ Job queue disabled, failed to open {JOB_QUEUE_PATH}: {e}")
+        if ROLE != 'all' and not self.job_queue:
+            raise RuntimeError(f"ROLE={ROLE} needs a working job queue at {JOB_QUEUE_PATH}")
+        self.job_tasks = {}
+        
+        # Download directories share a disk quota and are swept if a crash leaves them behind
+        self.temp_storage = TempStorage(
+            root=TEMP_DIR,
+            quota=int(TEMP_QUOTA_MB * MB),
+            headroom=int(TEMP_HEADROOM_MB * MB),
+            default_reserve=MAX_FILE_SIZE,
+            staging_root=TEMP_STAGING_DIR,
+            staging_quota=int(TEMP_STAGING_QUOTA_MB * MB),
+            staging_max_file=int(TEMP_STAGING_MAX_MB * MB),
+            prefix=TEMP_PREFIX,
+            max_age=TEMP_MAX_AGE,
+        )
+        self.sweep_task = None
+        
+        # Oversized or non-streamable videos go through ffmpeg before upload (opt-in)
+        self.transcoder = None
+        if TRANSCODE:
+            try:
+                self.transcoder = Transcoder(
+                    workers=TRANSCODE_WORKERS,
+                    threads=TRANSCODE_THREADS,
+                    nice=TRANSCODE_NICE,
+                    budget=TRANSCODE_BUDGET,
+                    mode=TRANSCODE_MODE,
+                    preset=TRANSCODE_PRESET,
+                    min_video_bitrate=TRANSCODE_MIN_VIDEO_KBPS * 1000,
+                    max_height=FORMAT_MAX_HEIGHT,
+                )
+            except TranscodeUnavailable as e:
+                logger.warning(f"⚠️ Transcoding disabled: {e}")
+        self.claim_task = None
+        self.heartbeat_task = None
+        self.draining = False
+        self.aborting = False
+        
+        self.setup_metrics()
         
         # Bot information
         self.developer_info = {
@@ -86,8 +383,103 @@ class MultiPlatformDownloaderBot:
             ]
         }
         
+        self.setup_platforms()
         self.setup_handlers()
 
+    def setup_metrics(self):
+        """Latency histograms, outcome counters and load gauges for /metrics"""
+        self.metrics = MetricsRegistry(prefix='anylink_')
+        # Filled in by refresh_metrics(), so a scrape never blocks the event loop on disk or SQLite
+        self.slow_gauges = {'temp_disk_bytes': 0, 'jobs': {}}
+        self.metrics_task = None
+        self.stage_seconds = self.metrics.histogram(
+            'stage_seconds', 'Time spent per pipeline stage', ('stage', 'platform')
+        )
+        self.download_speed = self.metrics.histogram(
+            'download_bytes_per_second', 'yt-dlp download throughput', ('platform',),
+            buckets=(64e3, 256e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6, 100e6),
+        )
+        self.attempts_total = self.metrics.counter(
+            'attempts_total', 'Download strategy attempts', ('platform', 'attempt', 'outcome')
+        )
+        self.downloads_total = self.metrics.counter(
+            'downloads_total', 'Finished download requests', ('platform', 'outcome')
+        )
+        self.uploads_total = self.metrics.counter(
+            'uploads_total', 'Media sent to Telegram', ('method',)
+        )
+        self.metrics.gauge(
+            'fragment_concurrency', 'Parallel fragment downloads per platform', ('platform',),
+            callback=self.fragment_tuner.levels,
+        )
+        self.metrics.gauge(
+            'bandwidth_share_bytes', 'Rate limit each running download currently gets (0 = unlimited)',
+            callback=lambda: self.bandwidth.share_size() if self.bandwidth.limit else 0,
+        )
+        self.info_cache_total = self.metrics.counter(
+            'info_cache_total', 'Metadata and dead-link cache lookups', ('kind', 'result')
+        )
+        self.transcodes_total = self.metrics.counter(
+            'transcodes_total', 'ffmpeg remux and compression runs by outcome', ('kind', 'outcome')
+        )
+        self.scheduler_wait = self.metrics.histogram(
+            'scheduler_wait_seconds', 'Time jobs waited in the fair scheduler for a download slot', ('kind',),
+            buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+        )
+        self.metrics.gauge(
+            'scheduler_jobs', 'Download jobs admitted or waiting', ('state',),
+            callback=lambda: {'active': self.scheduler.active, 'queued': self.scheduler.queue_depth},
+        )
+        self.metrics.gauge(
+            'executor_jobs', 'yt-dlp jobs in the worker pool', ('state',),
+            callback=lambda: {
+                'running': self.download_executor.stats()['running'],
+                'pending': self.download_executor.stats()['pending'],
+            },
+        )
+        self.metrics.gauge(
+            'ytdlp_sessions', 'Idle warm yt-dlp sessions, and how many jobs reused or created one', ('state',),
+            callback=lambda: self.download_executor.stats()['sessions'] or {},
+        )
+        self.metrics.gauge(
+            'circuit_open', 'Platforms currently paused by the circuit breaker', ('platform',),
+            callback=lambda: {
+                platform: int(state['state'] != 'closed') for platform, state in self.platform_guard.stats().items()
+            },
+        )
+        self.metrics.gauge(
+            'platform_backoff_seconds', 'Seconds until a throttled platform is called again', ('platform',),
+            callback=lambda: {platform: state['backoff'] for platform, state in self.platform_guard.stats().items()},
+        )
+        self.metrics.gauge(
+            'jobs_running', 'Download jobs running in this process', callback=lambda: len(self.job_tasks)
+        )
+        if self.job_queue:
+            self.metrics.gauge(
+                'jobs', 'Jobs in the shared job queue by stage', labels=('stage',),
+                callback=lambda: self.slow_gauges['jobs'],
+            )
+        self.metrics.gauge(
+            'temp_disk_bytes', 'Bytes held in download temp directories',
+            callback=lambda: self.slow_gauges['temp_disk_bytes'],
+        )
+        self.metrics.gauge(
+            'temp_reserved_bytes', 'Temp space reserved for running downloads', labels=('tier',),
+            callback=lambda: {'disk': self.temp_storage.reserved, 'tmpfs': self.temp_storage.staging_reserved},
+        )
+        self.metrics.gauge(
+            'temp_waiting', 'Downloads waiting for temp space', callback=lambda: self.temp_storage.waiting
+        )
+        self.metrics.gauge(
+            'progress_edits', 'Progress message edits by result', ('result',),
+            callback=lambda: {
+                'sent': self.progress_editor.edits,
+                'coalesced': self.progress_editor.coalesced,
+                'flood_wait': self.progress_editor.flood_waits,
+            },
+        )
+        self.metrics_server = MetricsServer(self.metrics, METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+
     def setup_handlers(self):
         """Set up all command and message handlers"""
         self.application.add_handler(CommandHandler("start", self.start_command))
@@ -112,64 +504,81 @@ class MultiPlatformDownloaderBot:
             except Exception as e:
                 logger.error(f"Failed to send error message to user: {e}")
 
+    def setup_platforms(self):
+        """Register supported platforms with their URL patterns, strategies and limits"""
+        self.platforms = PlatformRegistry(
+            fallback=Platform('unknown', hosts=[], max_attempts=2, options=self.get_generic_options)
+        )
+        self.platforms.register(Platform(
+            'youtube',
+            hosts=['youtube.com', 'youtu.be', 'youtube-nocookie.com'],
+            patterns=[r'(?:https?://)?(?:www\.)?(?:youtube\.com/watch\?v=|youtu\.be/)[\w-]+'],
+            max_attempts=5,
+            options=self.get_youtube_options,
+        ))
+        self.platforms.register(Platform(
+            'instagram',
+            hosts=['instagram.com'],
+            patterns=[r'(?:https?://)?(?:www\.)?instagram\.com/(?:p|reel|tv)/[\w-]+'],
+            max_attempts=4,
+            options=self.get_instagram_options,
+        ))
+        self.platforms.register(Platform(
+            'tiktok',
+            hosts=['tiktok.com'],
+            patterns=[
+                r'(?:https?://)?(?:www\.)?tiktok\.com/@[\w.-]+/video/\d+',
+                r'(?:https?://)?vm\.tiktok\.com/[\w-]+',
+            ],
+            max_attempts=4,
+            options=self.get_tiktok_options,
+        ))
+        self.platforms.register(Platform(
+            'facebook',
+            hosts=['facebook.com', 'fb.watch'],
+            patterns=[
+                r'(?:https?://)?(?:www\.)?facebook\.com/.+/videos/\d+',
+                r'(?:https?://)?fb\.watch/[\w-]+',
+            ],
+            max_attempts=3,
+            options=self.get_facebook_options,
+        ))
+        self.platforms.register(Platform(
+            'twitter',
+            hosts=['twitter.com', 'x.com'],
+            patterns=[r'(?:https?://)?(?:www\.)?(?:twitter\.com|x\.com)/.+/status/\d+'],
+            max_attempts=3,
+            options=self.get_twitter_options,
+        ))
+        self.platforms.register(Platform(
+            'reddit',
+            hosts=['reddit.com', 'redd.it'],
+            patterns=[r'(?:https?://)?(?:www\.)?reddit\.com/r/.+/comments/[\w-]+'],
+            max_attempts=3,
+            options=self.get_generic_options,
+        ))
+        self.platforms.register(Platform(
+            'twitch',
+            hosts=['twitch.tv'],
+            max_attempts=3,
+            options=self.get_generic_options,
+        ))
+
     def is_valid_url(self, text):
         """Enhanced URL validation"""
-        url_patterns = [
-            # YouTube
-            r'(?:https?://)?(?:www\.)?(?:youtube\.com/watch\?v=|youtu\.be/)[\w-]+',
-            # Instagram  
-            r'(?:https?://)?(?:www\.)?instagram\.com/(?:p|reel|tv)/[\w-]+',
-            # TikTok
-            r'(?:https?://)?(?:www\.)?tiktok\.com/@[\w.-]+/video/\d+',
-            r'(?:https?://)?vm\.tiktok\.com/[\w-]+',
-            # Facebook
-            r'(?:https?://)?(?:www\.)?facebook\.com/.+/videos/\d+',
-            r'(?:https?://)?fb\.watch/[\w-]+',
-            # Twitter/X
-            r'(?:https?://)?(?:www\.)?(?:twitter\.com|x\.com)/.+/status/\d+',
-            # Reddit
-            r'(?:https?://)?(?:www\.)?reddit\.com/r/.+/comments/[\w-]+',
-            # General URL
-            r'https?://[^\s]+',
-        ]
-        
-        return any(re.search(pattern, text, re.IGNORECASE) for pattern in url_patterns)
+        return self.platforms.looks_like_url(text)
 
     def get_platform_from_url(self, url):
         """Enhanced platform detection"""
-        try:
-            hostname = urlparse(url).hostname
-            if not hostname:
-                return 'unknown'
-                
-            hostname = hostname.lower().replace('www.', '')
-            
-            platform_map = {
-                'youtube.com': 'youtube',
-                'youtu.be': 'youtube',
-                'instagram.com': 'instagram',
-                'tiktok.com': 'tiktok',
-                'vm.tiktok.com': 'tiktok',
-                'facebook.com': 'facebook',
-                'fb.watch': 'facebook',
-                'twitter.com': 'twitter',
-                'x.com': 'twitter',
-                'twitch.tv': 'twitch',
-                'reddit.com': 'reddit',
-            }
-            
-            for domain, platform in platform_map.items():
-                if domain in hostname:
-                    return platform
-                    
-            return 'unknown'
-            
-        except Exception as e:
-            logger.warning(f"Error detecting platform: {e}")
-            return 'unknown'
+        return self.platforms.for_url(url).name
 
-    def get_platform_specific_options(self, temp_dir, platform, attempt=1):
+    def get_platform_specific_options(self, temp_dir, platform, attempt=1, playlist=False):
         """Get platform-specific yt-dlp options with anti-detection"""
+        with self.stage_seconds.time(stage='options', platform=platform):
+            return self.build_platform_options(temp_dir, platform, attempt, playlist)
+
+    def build_platform_options(self, temp_dir, platform, attempt, playlist):
+        """Base yt-dlp options with the platform's strategy for the attempt applied"""
         
         # Get appropriate user agent for platform
         user_agents = self.user_agents.get(platform, self.user_agents['default'])
@@ -185,30 +594,42 @@ class MultiPlatformDownloaderBot:
             'retries': 3,
             'fragment_retries': 3,
             'user_agent': user_agent,
-            'sleep_interval': random.uniform(1, 4),
-            'max_sleep_interval': 6,
+            # No idle time before downloads; yt-dlp's own retries back off, and the platform guard paces the rest
+            'retry_sleep_functions': {'http': retry_sleep, 'fragment': retry_sleep, 'extractor': retry_sleep},
         }
         
+        # Carousels and playlists keep every item, numbered so albums stay in order
+        if playlist:
+            base_opts['noplaylist'] = False
+            base_opts['playlistend'] = BATCH_MAX_ITEMS
+            base_opts['outtmpl'] = os.path.join(temp_dir, '%(playlist_index)03d - %(title).80s.%(ext)s')
+        
         # Platform-specific configurations
-        if platform == 'youtube':
-            return self.get_youtube_options(base_opts, attempt)
-        elif platform == 'instagram':
-            return self.get_instagram_options(base_opts, attempt)
-        elif platform == 'tiktok':
-            return self.get_tiktok_options(base_opts, attempt)
-        elif platform == 'facebook':
-            return self.get_facebook_options(base_opts, attempt)
-        elif platform == 'twitter':
-            return self.get_twitter_options(base_opts, attempt)
+        return self.platforms.get(platform).build_options(base_opts, attempt)
+
+    def apply_download_engine(self, ydl_opts, platform):
+        """Enable parallel fragments and ranged HTTP chunks; returns the fragment concurrency used (0 when off)"""
+        if not FRAGMENT_ENGINE:
+            return 0
+        fragments = self.fragment_tuner.level(platform)
+        ydl_opts['concurrent_fragment_downloads'] = fragments
+        # Several platforms throttle long single requests; ranges of HTTP_CHUNK_MB dodge that
+        ydl_opts['http_chunk_size'] = int(HTTP_CHUNK_MB * MB)
+        return fragments
+
+    def relocate_output(self, ydl_opts, directory):
+        """Point the output template at directory (yt-dlp turns it into a dict once it has run)"""
+        outtmpl = ydl_opts['outtmpl']
+        if isinstance(outtmpl, dict):
+            ydl_opts['outtmpl'] = {kind: os.path.join(directory, os.path.basename(template)) for kind, template in outtmpl.items()}
         else:
-            return self.get_generic_options(base_opts, attempt)
+            ydl_opts['outtmpl'] = os.path.join(directory, os.path.basename(outtmpl))
 
     def get_youtube_options(self, base_opts, attempt):
         """YouTube-specific options with anti-bot detection"""
         youtube_opts = {
             'extractor_args': {
                 'youtube': {
-                    'skip': ['hls', 'dash'],
                     'player_skip': ['configs'],
                     'max_comments': ['0']
                 }
@@ -219,6 +640,10 @@ class MultiPlatformDownloaderBot:
             }
         }
         
+        # Fragmented manifests are only worth fetching when fragments download in parallel
+        if not FRAGMENT_ENGINE:
+            youtube_opts['extractor_args']['youtube']['skip'] = ['hls', 'dash']
+        
         if attempt == 1:
             youtube_opts['format'] = 'best[height<=720][ext=mp4]/best[ext=mp4]/mp4/best'
             youtube_opts['extractor_args']['youtube']['player_client'] = ['web']
@@ -365,6 +790,281 @@ class MultiPlatformDownloaderBot:
         
         return base_opts
 
+    def build_caption(self, title, uploader, platform, duration, file_size_mb):
+        """Caption attached to every delivered video"""
+        duration_text = f"{duration//60}:{duration%60:02d}" if duration else "Unknown"
+        
+        caption = f"✅ **Multi-Platform Download Success!**\n\n"
+        caption += f"📁 **Title:** {title[:60]}{'...' if len(title) > 60 else ''}\n"
+        caption += f"👤 **Creator:** {uploader[:30]}{'...' if len(uploader) > 30 else ''}\n"
+        caption += f"🎯 **Platform:** {platform.title()}\n"
+        caption += f"⏱️ **Duration:** {duration_text}\n"
+        caption += f"📊 **Size:** {file_size_mb:.1f} MB\n"
+        caption += f"🛡️ **Extraction:** Platform-optimized\n\n"
+        caption += f"🤖 **AnyLink Bot v3.0.0** | ☁️ **Railway Cloud**"
+        return caption[:1024]  # Telegram caption limit
+
+    def build_progress_text(self, platform, event):
+        """Live progress shown while yt-dlp downloads the file"""
+        info = event.get('info_dict') or {}
+        title = info.get('title') or 'Unknown Title'
+        
+        text = f"📥 **Downloading from {platform.title()}**\n\n"
+        text += f"📁 **Title:** {title[:40]}{'...' if len(title) > 40 else ''}\n"
+        if event.get('status') == 'finished':
+            text += "✅ **Status:** Download finished, preparing upload...\n\n"
+        else:
+            progress = describe_progress(event)
+            if progress:
+                total = f" / {progress['total_mb']:.1f}" if progress['total_mb'] else ''
+                text += f"📊 **Progress:** {progress_bar(progress['fraction'])} {progress['fraction'] * 100:.0f}%\n"
+                text += f"💾 **Size:** {progress['downloaded_mb']:.1f}{total} MB\n"
+                text += f"⚡ **Speed:** {progress['speed_mb']:.1f} MB/s | ⏱️ **ETA:** {format_eta(progress['eta'])}\n\n"
+            else:
+                text += f"💾 **Downloaded:** {(event.get('downloaded_bytes') or 0) / (1024 * 1024):.1f} MB\n\n"
+        text += "🛡️ **Anti-detection active**"
+        return text
+
+    async def lookup_cached_video(self, *keys):
+        """Find a previously uploaded file_id for any of the keys"""
+        if not self.file_cache:
+            return None
+        try:
+            return await self.file_cache.aget(*keys)
+        except Exception as e:
+            logger.warning(f"⚠️ File cache lookup failed: {e}")
+            return None
+
+    async def store_cached_video(self, keys, file_id, title, uploader, duration, file_size):
+        """Remember the file_id Telegram assigned to an uploaded video"""
+        if not self.file_cache:
+            return
+        try:
+            await self.file_cache.aput(
+                keys, file_id,
+                title=title, uploader=uploader, duration=duration, file_size=file_size
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to store file_id in cache: {e}")
+
+    async def send_cached_video(self, bot, chat_id, entry, platform):
+        """Re-send a cached upload by file_id; returns False if Telegram rejects it"""
+        file_size_mb = (entry['file_size'] or 0) / (1024 * 1024)
+        duration = entry['duration'] or 0
+        try:
+            await bot.send_video(
+                chat_id=chat_id,
+                video=entry['file_id'],
+                caption=self.build_caption(
+                    entry['title'] or 'Unknown Title', entry['uploader'] or 'Unknown',
+                    platform, duration, file_size_mb
+                ),
+                parse_mode='Markdown',
+                supports_streaming=True,
+                duration=duration if duration > 0 else None
+            )
+            self.uploads_total.inc(method='file_id')
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Cached file_id rejected, falling back to download: {e}")
+            try:
+                await self.file_cache.ainvalidate(entry['file_id'])
+            except Exception as cache_error:
+                logger.warning(f"⚠️ Failed to invalidate cached file_id: {cache_error}")
+            return False
+
+    async def finish_status(self, processing_message, text, **kwargs):
+        """Final edit of a status message; by now the job's outcome is settled, so a failed edit doesn't change it"""
+        try:
+            await self.progress_editor.finish(processing_message, text, **kwargs)
+        except TelegramError as e:
+            logger.warning(f"⚠️ Failed to update status message: {e}")
+
+    async def show_download_success(self, processing_message, platform):
+        """Replace the progress message with the completion summary"""
+        keyboard = [
+            [
+                InlineKeyboardButton("🔄 Download Another", callback_data="start"),
+                InlineKeyboardButton("⭐ Rate Bot", url=self.company_info['telegram'])
+            ],
+            [
+                InlineKeyboardButton("🧪 Test Other Platforms", callback_data="test")
+            ]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await self.finish_status(
+            processing_message,
+            f"🎉 **{platform.title()} Download Complete!**\n\n"
+            f"✅ Successfully extracted using platform-optimized settings\n"
+            f"📱 Video sent to your chat\n"
+            f"⚡ Processed by Railway Cloud\n\n"
+            f"💡 **Try other platforms too!** Each one has specialized optimization.",
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
+
+    async def show_too_large(self, processing_message, error):
+        """Explain that the media doesn't fit under the upload limit"""
+        title = error.title or 'Unknown Title'
+        await self.finish_status(
+            processing_message,
+            f"❌ **File Too Large for Telegram**\n\n"
+            f"📁 **File Size:** {error.size / (1024 * 1024):.1f} MB\n"
+            f"⚠️ **Upload Limit:** {error.limit / (1024 * 1024):.0f} MB\n"
+            f"🎬 **Title:** {title[:50]}{'...' if len(title) > 50 else ''}\n\n"
+            f"💡 **Suggestions:**\n"
+            f"• Try a shorter video\n"
+            f"• Look for different quality versions\n"
+            f"• Some platforms offer multiple formats",
+            parse_mode='Markdown'
+        )
+
+    def build_error_text(self, platform, error):
+        """Platform-specific explanation for a failed download"""
+        error_message = str(error).lower()
+        
+        if isinstance(error, DownloadQueueFull):
+            error_text = "🚦 **Bot Is Busy Right Now**\n\n"
+            error_text += "Too many downloads are in progress at the moment.\n\n"
+            error_text += "**💡 Please try again in a minute or two.**"
+            
+        elif isinstance(error, RateLimited):
+            error_text = f"⏳ **{platform.title()}: Too Many Requests**\n\n"
+            error_text += f"{platform.title()} asked the bot to slow down for a while.\n\n"
+            error_text += f"**💡 Please try again in {format_wait(error.retry_after)}.**"
+            
+        elif 'sign in to confirm' in error_message or 'not a bot' in error_message:
+            error_text = f"🤖 **{platform.title()}: Bot Detection**\n\n"
+            error_text += f"The platform detected automated access and blocked the request.\n\n"
+            if platform == 'youtube':
+                error_text += f"**💡 YouTube-specific solutions:**\n"
+                error_text += f"• Try a different YouTube video\n"
+                error_text += f"• Wait 10-15 minutes and try again\n"
+                error_text += f"• Some videos work better than others"
+            else:
+                error_text += f"**💡 Try these solutions:**\n"
+                error_text += f"• Try a different video from {platform.title()}\n"
+                error_text += f"• Wait a few minutes and try again\n"
+                error_text += f"• Try other platforms (Instagram, TikTok)"
+                
+        elif "private" in error_message or "unavailable" in error_message:
+            error_text = f"🔒 **{platform.title()}: Content Not Available**\n\n"
+            error_text += f"The video is private, deleted, or restricted.\n\n"
+            error_text += f"**💡 Solutions:**\n"
+            error_text += f"• Make sure the video is public\n"
+            error_text += f"• Check if the URL is correct\n"
+            error_text += f"• Try a different video from {platform.title()}"
+            
+        elif "geo" in error_message:
+            error_text = f"🌍 **{platform.title()}: Geographic Restriction**\n\n"
+            error_text += f"This video is not available in the bot's server region.\n\n"
+            error_text += f"**💡 Solutions:**\n"
+            error_text += f"• Try videos available globally\n"
+            error_text += f"• Try other platforms"
+            
+        else:
+            error_text = f"🚫 **{platform.title()}: Download Failed**\n\n"
+            error_text += f"**Error Details:** `{str(error)[:150]}{'...' if len(str(error)) > 150 else ''}`\n\n"
+            error_text += f"**💡 Common Solutions:**\n"
+            error_text += f"• Verify the URL is correct and public\n"
+            error_text += f"• Try a different video from {platform.title()}\n"
+            error_text += f"• Try other platforms (each has different success rates)\n"
+            error_text += f"• Contact support if the issue persists"
+        
+        return error_text
+
+    async def show_download_error(self, processing_message, platform, error):
+        """Replace the progress message with a failure explanation"""
+        error_text = self.build_error_text(platform, error)
+        
+        keyboard = [
+            [
+                InlineKeyboardButton("🔄 Try Different URL", callback_data="start"),
+                InlineKeyboardButton("🧪 Test Other Platforms", callback_data="test")
+            ],
+            [
+                InlineKeyboardButton("📞 Get Support", callback_data="contact")
+            ]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await self.finish_status(
+            processing_message,
+            error_text,
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
+
+    async def stream_video(self, bot, chat_id, fmt, title, caption, duration):
+        """Pipe a progressive stream into sendVideo without staging it on disk"""
+        filename = re.sub(r'[^\w\- ]', '', title)[:60].strip() or 'video'
+        result = await self.streaming_uploader.send_video(
+            bot.base_url,
+            chat_id,
+            fmt,
+            filename=f"{filename}.mp4",
+            max_bytes=MAX_FILE_SIZE,
+            caption=caption,
+            parse_mode='Markdown',
+            duration=duration if duration > 0 else None,
+        )
+        return Message.de_json(result, bot)
+
+    def is_fatal_error(self, error):
+        """Errors about the content itself, which no other strategy can fix"""
+        if isinstance(error, (DownloadQueueFull, MediaTooLarge, CircuitOpen, RateLimited, StorageQuotaExceeded)):
+            return True
+        message = str(error).lower()
+        return any(keyword in message for keyword in ['private', 'deleted', 'not available', 'geo'])
+
+    def is_dead_link(self, error):
+        """Private, deleted or region-locked media, which stays that way for a while"""
+        message = str(error).lower()
+        # "Requested format is not available" is about our options, not the media
+        if 'format' in message:
+            return False
+        return any(keyword in message for keyword in ['private', 'deleted', 'not available', 'geo'])
+
+    async def hedged_probe(self, url, platform, temp_dir, ladder, playlist=False):
+        """Race metadata probes across strategies; returns (strategy, ydl_opts, info)"""
+        async def probe(strategy):
+            # Each strategy gets its own directory so a loser's leftovers are easy to drop
+            strategy_dir = os.path.join(temp_dir, f"hedge-{strategy}")
+            os.makedirs(strategy_dir, exist_ok=True)
+            ydl_opts = self.get_platform_specific_options(strategy_dir, platform, strategy, playlist=playlist)
+            started = time.monotonic()
+            probe_slot = None
+            try:
+                probe_slot = await self.platform_guard.acquire(platform)
+                with self.stage_seconds.time(stage='probe', platform=platform):
+                    info = await self.download_executor.extract(platform, url, ydl_opts, download=False)
+            except Exception as e:
+                if not self.is_fatal_error(e):
+                    self.strategy_selector.record(platform, strategy, False, time.monotonic() - started)
+                    self.platform_guard.record_failure(platform, e)
+                logger.warning(f"⚠️ Hedged probe with strategy {strategy} failed for {platform}: {e}")
+                raise
+            finally:
+                # Fatal errors and cancelled losers record nothing; the half-open slot must still be given back
+                self.platform_guard.release_probe(platform, probe_slot)
+            self.relocate_output(ydl_opts, temp_dir)
+            return ydl_opts, info
+        
+        try:
+            strategy, (ydl_opts, info) = await hedged_race(
+                [(strategy, lambda strategy=strategy: probe(strategy)) for strategy in ladder],
+                delay=HEDGE_DELAY,
+                max_parallel=HEDGE_MAX_PARALLEL,
+                is_fatal=self.is_fatal_error,
+            )
+        finally:
+            for strategy in ladder:
+                shutil.rmtree(os.path.join(temp_dir, f"hedge-{strategy}"), ignore_errors=True)
+        
+        logger.info(f"🏁 Strategy {strategy} won the hedged probe for {platform}")
+        return strategy, ydl_opts, info
+
     # Command handlers
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -426,7 +1126,7 @@ Just send me a video URL to get started! 🎉"""
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command with platform-specific information"""
-        help_text = """🆘 **AnyLink Downloader Bot - Complete Guide**
+        help_text = f"""🆘 **AnyLink Downloader Bot - Complete Guide**
 
 **🎯 Supported Platforms & Features:**
 
@@ -475,7 +1175,7 @@ Just send me a video URL to get started! 🎉"""
 • Each platform has optimized settings
 
 **🚫 Limitations:**
-• Maximum file size: 50MB (Telegram limit)
+• Maximum file size: {MAX_FILE_SIZE_MB:.0f}MB (Telegram limit)
 • No private or restricted content
 • Live streams not supported (except after they end)
 • Some geo-restricted content may not work
@@ -699,11 +1399,17 @@ Each test uses a known working URL to verify platform-specific functionality.
         message_text = update.message.text.strip()
         
         if self.is_valid_url(message_text):
-            # Extract URL
-            url_match = re.search(r'https?://[^\s]+', message_text)
-            if url_match:
-                url = url_match.group(0)
-                await self.download_video(update, context, url)
+            # Extract URLs
+            with self.stage_seconds.time(stage='parse', platform='all'):
+                urls = extract_urls(message_text)
+            if ROLE == 'frontend' and len(urls) > 1:
+                # Workers only take single links, so a batch becomes one job per link
+                for url in urls[:BATCH_MAX_ITEMS]:
+                    await self.download_video(update, context, url)
+            elif len(urls) > 1 or (urls and BATCH_PLAYLISTS and PLAYLIST_RE.search(urls[0])):
+                await self.download_batch(update, context, urls)
+            elif urls:
+                await self.download_video(update, context, urls[0])
             else:
                 await update.message.reply_text(
                     "🤔 I found what looks like a URL, but couldn't extract it properly. Please send a complete URL starting with http:// or https://"
@@ -727,20 +1433,28 @@ Each test uses a known working URL to verify platform-specific functionality.
         
         logger.info(f"🎬 User {user_id} downloading from {platform}: {url}")
         
-        # Platform-specific attempt counts
-        max_attempts = {
-            'youtube': 5,
-            'instagram': 4,
-            'tiktok': 4,
-            'facebook': 3,
-            'twitter': 3,
-            'reddit': 3,
-            'unknown': 2
-        }
+        # Serve repeat links straight from the file_id cache
+        cached = await self.lookup_cached_video(url_key(url))
+        if cached and await self.send_cached_video(context.bot, update.effective_chat.id, cached, platform):
+            logger.info(f"⚡ Served cached {platform} video to user {user_id}")
+            self.downloads_total.inc(platform=platform, outcome='cached')
+            return
         
-        attempts = max_attempts.get(platform, 3)
+        # Identical links already downloading for someone else are shared
+        flight_key = url_key(url)
+        if self.inflight.in_flight(flight_key):
+            if await self.join_in_flight_download(update, context, flight_key, platform):
+                return
         
-        # Show initial processing message
+        # Record the job before any work so a restart can pick it up again;
+        # the download itself runs detached so shutdown can drain it on a deadline
+        with ExitStack() as lead:
+            flight = lead.enter_context(self.inflight.lead(flight_key))
+            job = await self.create_job(update, url, platform)
+            self.start_job(context.bot, job, flight, lead.pop_all())
+
+    async def create_job(self, update: Update, url, platform):
+        """Acknowledge a link with a status message and record it as a job"""
         processing_message = await update.message.reply_text(
             f"🎬 **Processing {platform.title()} Video**\n\n"
             f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
@@ -749,224 +1463,915 @@ Each test uses a known working URL to verify platform-specific functionality.
             f"🔄 **This may take 30-60 seconds**",
             parse_mode='Markdown'
         )
+        fields = {
+            'chat_id': update.effective_chat.id,
+            'user_id': update.effective_user.id,
+            'url': url,
+            'platform': platform,
+            'message_id': update.message.message_id,
+            'status_message_id': processing_message.message_id,
+        }
+        if self.job_queue:
+            try:
+                # Claimed straight away when this process runs it; left for a worker otherwise
+                worker = WORKER_ID if ROLE == 'all' else None
+                return await self.job_queue.aadd(**fields, worker=worker, lease=JOB_LEASE)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to persist job, running it in memory only: {e}")
+        return {**fields, 'id': None, 'stage': QUEUED, 'temp_dir': None, 'resumes': 0}
+
+    async def update_job(self, job, **fields):
+        """Persist a job's progress (stage, temp dir, ...)"""
+        job.update(fields)
+        if self.job_queue and job['id']:
+            try:
+                await self.job_queue.aupdate(job['id'], **fields)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to update job {job['id']}: {e}")
+
+    async def finish_job(self, job, error=None):
+        """Mark a job done, or failed so it is not resumed"""
+        job['stage'] = FAILED if error else DONE
+        if self.job_queue and job['id']:
+            try:
+                await self.job_queue.afinish(job['id'], error)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to finish job {job['id']}: {e}")
+
+    def start_job(self, bot, job, flight=None, lead=None):
+        """Run a job in the background, tracked so shutdown can drain it"""
+        if ROLE == 'frontend' or self.draining:
+            # Stays queued in the job table for a worker, or for this process after the restart
+            if ROLE == 'frontend':
+                logger.info(f"📮 Job {job['id']} queued for a worker: {job['url']}")
+            else:
+                logger.info(f"⏸️ Not starting job {job['id']} while shutting down")
+            if lead:
+                lead.close()
+            return None
+        task = asyncio.create_task(self.run_job(bot, job, flight, lead))
+        self.job_tasks[task] = job
+        task.add_done_callback(lambda finished: self.job_tasks.pop(finished, None))
+        return task
+
+    async def run_job(self, bot, job, flight=None, lead=None):
+        """Run one job to completion, sharing its result with identical requests"""
+        if lead is None:
+            lead = ExitStack()
+            flight = lead.enter_context(self.inflight.lead(url_key(job['url'])))
+        with lead:
+            with self.stage_seconds.time(stage='total', platform=job['platform']):
+                await self.process_download(bot, job, flight)
+
+    async def start_worker(self):
+        """Begin claiming queued and abandoned jobs from the broker"""
+        try:
+            purged = await asyncio.to_thread(self.job_queue.purge)
+            # Anything an earlier process with this WORKER_ID held is fair game again
+            released = await self.job_queue.arelease(WORKER_ID)
+        except Exception as e:
+            logger.error(f"❌ Failed to prepare the job queue: {e}")
+            return
+        if purged:
+            logger.info(f"🧹 Purged {purged} finished jobs")
+        if released:
+            logger.info(f"♻️ Reclaiming {released} jobs left by a previous run of {WORKER_ID}")
+        self.claim_task = asyncio.create_task(self.claim_jobs())
+        self.heartbeat_task = asyncio.create_task(self.renew_leases())
+
+    async def claim_jobs(self):
+        """Pull jobs from the broker whenever this process has a free slot"""
+        bot = self.application.bot
+        logger.info(f"👷 Worker {WORKER_ID} ({ROLE}) claiming jobs, up to {WORKER_JOBS} at a time")
+        while not self.draining:
+            job = None
+            if len(self.job_tasks) < WORKER_JOBS:
+                try:
+                    job = await self.job_queue.aclaim(WORKER_ID, JOB_LEASE)
+                except Exception as e:
+                    logger.error(f"❌ Failed to claim a job: {e}")
+            if job is None:
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+            if job['resumes'] > JOB_MAX_RESUMES:
+                await self.abandon_job(bot, job)
+                continue
+            if job['resumes']:
+                logger.info(f"♻️ Resuming job {job['id']} ({job['stage']}) for user {job['user_id']}: {job['url']}")
+            else:
+                logger.info(f"👷 Claimed job {job['id']} for user {job['user_id']}: {job['url']}")
+            self.start_job(bot, job)
+
+    async def renew_leases(self):
+        """Keep the leases on this process's jobs alive so no other worker takes them over"""
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            job_ids = [job['id'] for job in self.job_tasks.values() if job['id']]
+            try:
+                await self.job_queue.aheartbeat(WORKER_ID, job_ids, JOB_LEASE)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to renew job leases: {e}")
+
+    async def abandon_job(self, bot, job):
+        """Fail a job that keeps getting interrupted; likely the job itself takes the bot down"""
+        logger.warning(f"⚠️ Giving up on job {job['id']} after {job['resumes'] - 1} restarts")
+        await self.finish_job(job, 'Interrupted by too many restarts')
+        try:
+            await self.show_download_error(
+                MessageRef(bot, job['chat_id'], job['status_message_id']), job['platform'],
+                Exception('The download was interrupted by repeated restarts')
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to report abandoned job {job['id']}: {e}")
+
+    async def refresh_metrics(self):
+        """Periodically recompute the gauges that are too slow to compute during a scrape"""
+        while True:
+            try:
+                self.slow_gauges['temp_disk_bytes'] = await asyncio.to_thread(self.temp_storage.disk_usage)
+                if self.job_queue:
+                    self.slow_gauges['jobs'] = await asyncio.to_thread(self.job_queue.stats)
+            except Exception as e:
+                logger.warning(f"⚠️ Metrics refresh failed: {e}")
+            await asyncio.sleep(METRICS_REFRESH_INTERVAL)
+
+    async def sweep_temp_dirs(self):
+        """Periodically delete temp directories that crashed or killed runs left behind"""
+        def sweep():
+            # Unfinished jobs may resume from their directory, however old it is
+            keep = [job['temp_dir'] for job in self.job_queue.unfinished()] if self.job_queue else []
+            return self.temp_storage.sweep(keep)
+        
+        while True:
+            try:
+                removed = await asyncio.to_thread(sweep)
+                if removed:
+                    logger.info(f"🧹 Swept {removed} stale temp directories")
+            except Exception as e:
+                logger.warning(f"⚠️ Temp directory sweep failed: {e}")
+            await asyncio.sleep(TEMP_SWEEP_INTERVAL)
+
+    def abort_hook(self, event):
+        """Stops yt-dlp mid-download once the shutdown grace period is over; the .part file stays"""
+        if self.aborting:
+            raise yt_dlp.utils.DownloadCancelled('Bot is shutting down')
+
+    async def join_in_flight_download(self, update: Update, context: ContextTypes.DEFAULT_TYPE, flight_key, platform):
+        """Wait for an identical in-flight download and re-send its upload"""
+        waiting_message = await update.message.reply_text(
+            f"🔗 **Same Video Already Downloading**\n\n"
+            f"🎯 **Platform:** {platform.title()}\n"
+            f"⏳ **Status:** Waiting for the current download to finish...\n\n"
+            f"⚡ **You'll get the same file as soon as it's ready**",
+            parse_mode='Markdown'
+        )
         
-        temp_dir = tempfile.mkdtemp()
+        try:
+            entry = await self.inflight.wait(flight_key)
+        except MediaTooLarge as e:
+            await self.show_too_large(waiting_message, e)
+            return True
+        except Exception as e:
+            await self.show_download_error(waiting_message, platform, e)
+            return True
+        
+        if entry and await self.send_cached_video(context.bot, update.effective_chat.id, entry, platform):
+            logger.info(f"⚡ Shared in-flight {platform} download with user {update.effective_user.id}")
+            self.downloads_total.inc(platform=platform, outcome='shared')
+            await self.show_download_success(waiting_message, platform)
+            return True
+        
+        # Leader couldn't deliver; run our own download instead
+        try:
+            await waiting_message.delete()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to remove waiting message: {e}")
+        return False
+
+    async def fetch_media(self, url, platform, workspace, status=None, allow_stream=False, allow_playlist=False,
+                          progress_hook=None):
+        """Run the platform's strategy ladder until one produces media.
+
+        Returns a dict with the info dict, the yt-dlp options that worked and
+        either the downloaded file(s) in workspace or, when allow_stream is
+        set, the progressive format to stream. status(text) receives progress text.
+        allow_playlist keeps every item of a carousel or playlist in files.
+        progress_hook is attached to yt-dlp for byte-level download progress.
+        """
+        if status is None:
+            async def status(text):
+                pass
+        
+        attempts = self.platforms.get(platform).max_attempts
         success = False
         file_path = None
+        files = []
+        stream_format = None
+        info = None
         last_error = "Unknown error"
         
-        try:
-            # Try multiple attempts with platform-specific configurations
-            for attempt in range(1, attempts + 1):
-                try:
-                    await processing_message.edit_text(
-                        f"🔄 **{platform.title()} Download - Attempt {attempt}/{attempts}**\n\n"
-                        f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
-                        f"🎯 **Platform:** {platform.title()}\n"
-                        f"⏳ **Status:** {'Using mobile simulation' if attempt == 2 and platform == 'instagram' else 'Using web client' if attempt == 1 else f'Alternative method {attempt}'}\n\n"
-                        f"🛡️ **Anti-detection active**",
-                        parse_mode='Markdown'
-                    )
-                    
-                    # Clean previous files
-                    for file in os.listdir(temp_dir):
-                        file_path_temp = os.path.join(temp_dir, file)
-                        if os.path.isfile(file_path_temp):
-                            os.remove(file_path_temp)
-                    
-                    # Add delay between attempts (except first)
-                    if attempt > 1:
-                        delay = random.uniform(2, 5)
-                        await asyncio.sleep(delay)
-                    
+        # Try platform-specific strategies, currently best-performing first
+        ladder = self.strategy_selector.order(platform, list(range(1, attempts + 1)))
+        
+        # A link that just failed for good fails again at once
+        failure = await self.info_cache.aget_failure(url)
+        self.info_cache_total.inc(kind='failure', result='hit' if failure else 'miss')
+        if failure:
+            logger.info(f"🪦 {platform} link failed recently, not retrying: {failure[:100]}")
+            raise Exception(failure)
+        
+        # Metadata fetched recently by some strategy (or the winner of a hedged probe) saves a probe
+        prefetched = None
+        cached_strategy = None
+        cached = await self.info_cache.aget_info(url, platform, ladder, playlist=allow_playlist)
+        self.info_cache_total.inc(kind='info', result='hit' if cached else 'miss')
+        if cached:
+            cached_strategy, info = cached
+            ydl_opts = self.get_platform_specific_options(workspace.path, platform, cached_strategy, playlist=allow_playlist)
+            prefetched = (cached_strategy, ydl_opts, info)
+            logger.info(f"🧠 Using cached {platform} metadata from strategy {cached_strategy}")
+        elif HEDGED_REQUESTS and platform in HEDGE_PLATFORMS and len(ladder) > 1:
+            # Optionally race the first strategies' metadata probes to cut tail latency
+            await status(
+                f"🏁 **{platform.title()} Download - Racing Strategies**\n\n"
+                f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
+                f"🎯 **Platform:** {platform.title()}\n"
+                f"⏳ **Status:** Fetching video details...\n\n"
+                f"🛡️ **Anti-detection active**"
+            )
+            try:
+                prefetched = await self.hedged_probe(url, platform, workspace.path, ladder, playlist=allow_playlist)
+            except Exception as e:
+                if self.is_dead_link(e):
+                    await self.info_cache.aput_failure(url, e)
+                raise
+            await self.info_cache.aput_info(url, platform, prefetched[0], prefetched[2], playlist=allow_playlist)
+        if prefetched:
+            ladder = [prefetched[0]] + [strategy for strategy in ladder if strategy != prefetched[0]]
+        
+        for position, attempt in enumerate(ladder, 1):
+            attempt_started = time.monotonic()
+            probe_slot = None
+            try:
+                await status(
+                    f"🔄 **{platform.title()} Download - Attempt {position}/{attempts}**\n\n"
+                    f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
+                    f"🎯 **Platform:** {platform.title()}\n"
+                    f"⏳ **Status:** {'Using mobile simulation' if attempt == 2 and platform == 'instagram' else 'Using web client' if attempt == 1 else f'Alternative method {attempt}'}\n\n"
+                    f"🛡️ **Anti-detection active**"
+                )
+                
+                # The next attempt waits only if the platform asked us to slow down (see platform_guard.acquire)
+                if position > 1:
+                    # Clean previous attempt's files (the first attempt keeps them so a resumed job can continue .part files)
+                    await workspace.clear()
+                
+                if prefetched and attempt == prefetched[0]:
+                    # Metadata already fetched by the winning hedged probe or cached
+                    _, ydl_opts, info = prefetched
+                    prefetched = None
+                else:
                     # Get platform-specific options
-                    ydl_opts = self.get_platform_specific_options(temp_dir, platform, attempt)
+                    ydl_opts = self.get_platform_specific_options(workspace.path, platform, attempt, playlist=allow_playlist)
                     
                     logger.info(f"🔄 Attempt {attempt} for {platform} with specialized options")
                     
-                    # Download with yt-dlp
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(url, download=True)
-                        title = info.get('title', 'Unknown Title')
-                        duration = info.get('duration', 0)
-                        uploader = info.get('uploader', 'Unknown')
-                    
-                    # Check if files were downloaded
-                    downloaded_files = [f for f in os.listdir(temp_dir) if os.path.isfile(os.path.join(temp_dir, f))]
+                    # Wait for the platform's rate limit (or fail fast while it's blocking us)
+                    probe_slot = await self.platform_guard.acquire(platform)
                     
-                    if downloaded_files:
-                        file_path = os.path.join(temp_dir, downloaded_files[0])
-                        file_size = os.path.getsize(file_path)
-                        
-                        if file_size > 1024:  # At least 1KB
-                            success = True
-                            logger.info(f"✅ Successfully downloaded from {platform} on attempt {attempt}")
-                            break
-                        else:
-                            last_error = "Downloaded file was empty or corrupted"
-                    else:
-                        last_error = "No file was downloaded"
-                        
-                except Exception as e:
-                    last_error = str(e)
-                    logger.warning(f"⚠️ Attempt {attempt} failed for {platform}: {last_error}")
+                    # Probe metadata first so oversized media is rejected before downloading
+                    with self.stage_seconds.time(stage='probe', platform=platform):
+                        info = await self.download_executor.extract(platform, url, ydl_opts, download=False)
+                    await self.info_cache.aput_info(url, platform, attempt, info, playlist=allow_playlist)
+                # Pick the best quality that fits instead of relying on the attempt's format string
+                oversized = False
+                try:
+                    choice = plan_download(info, MAX_FILE_SIZE, FORMAT_MAX_HEIGHT)
+                except MediaTooLarge:
+                    # Nothing fits as offered, but a long enough budget per second may fit once compressed
+                    if not (self.transcoder and self.transcoder.can_fit(info.get('duration'), MAX_FILE_SIZE)):
+                        raise
+                    choice = plan_download(info, int(TRANSCODE_MAX_INPUT_MB * MB), FORMAT_MAX_HEIGHT)
+                    oversized = True
+                    logger.info(f"🗜️ {platform} media is over {MAX_FILE_SIZE_MB:.0f} MB, it will be compressed after download")
+                if choice:
+                    ydl_opts['format'] = choice.spec
+                    if choice.needs_remux:
+                        ydl_opts['merge_output_format'] = 'mp4'
+                
+                # A single progressive stream is piped straight into the upload instead
+                if allow_stream and not oversized:
+                    stream_format = streamable_format(info, choice.spec if choice else None)
+                if stream_format:
+                    title = info.get('title') or 'Unknown Title'
+                    duration = int(info.get('duration') or 0)
+                    uploader = info.get('uploader') or 'Unknown'
+                    success = True
+                    self.record_attempt(platform, attempt, 'success', attempt_started)
+                    self.strategy_selector.record(platform, attempt, True, time.monotonic() - attempt_started)
+                    self.platform_guard.record_success(platform)
+                    logger.info(f"📡 Streaming {platform} media found with strategy {attempt} (attempt {position})")
+                    break
+                
+                # Hold disk space for the download (merges keep both parts next to the output)
+                estimate = choice.size if choice and choice.size else selected_size(info)
+                if estimate and choice and choice.needs_remux:
+                    estimate *= 2
+                
+                async def waiting_for_disk():
+                    await status(
+                        f"💾 **Waiting for Disk Space**\n\n"
+                        f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
+                        f"🎯 **Platform:** {platform.title()}\n\n"
+                        f"🔄 **Your download will start as soon as other downloads finish**"
+                    )
+                
+                with self.stage_seconds.time(stage='disk_wait', platform=platform):
+                    await workspace.reserve(estimate, on_wait=waiting_for_disk)
+                self.relocate_output(ydl_opts, workspace.path)
+                
+                # Download the probed media with yt-dlp in the worker pool
+                # (hooks can't cross into a process pool, so only threads report progress)
+                if self.download_executor.mode == 'thread':
+                    ydl_opts['progress_hooks'] = [self.abort_hook] + ([progress_hook] if progress_hook else [])
+                fragments = self.apply_download_engine(ydl_opts, platform)
+                download_started = time.monotonic()
+                with self.bandwidth.share(ydl_opts), self.stage_seconds.time(stage='download', platform=platform):
+                    info = await self.download_executor.download_info(platform, info, ydl_opts)
+                    share = ydl_opts.get('ratelimit')
+                download_time = time.monotonic() - download_started
+                title = info.get('title') or 'Unknown Title'
+                duration = int(info.get('duration') or 0)
+                uploader = info.get('uploader') or 'Unknown'
+                
+                # Check if files were downloaded
+                files = workspace.files()
+                
+                if files:
+                    file_path = files[0]
+                    file_size = os.path.getsize(file_path)
                     
-                    # Don't retry if it's a fatal error
-                    if any(keyword in last_error.lower() for keyword in ['private', 'deleted', 'not available', 'geo']):
+                    if file_size > 1024:  # At least 1KB
+                        success = True
+                        if download_time > 0:
+                            speed = sum(os.path.getsize(path) for path in files) / download_time
+                            self.download_speed.observe(speed, platform=platform)
+                            if fragments and is_fragmented(info):
+                                # Close to the bandwidth share means the cap, not the fragments, set the pace
+                                capped = share is not None and speed >= share * 0.9
+                                self.fragment_tuner.record(platform, fragments, speed, capped)
+                        self.record_attempt(platform, attempt, 'success', attempt_started)
+                        self.strategy_selector.record(platform, attempt, True, time.monotonic() - attempt_started)
+                        self.platform_guard.record_success(platform)
+                        logger.info(f"✅ Successfully downloaded from {platform} with strategy {attempt} (attempt {position})")
                         break
+                    else:
+                        last_error = "Downloaded file was empty or corrupted"
+                else:
+                    last_error = "No file was downloaded"
+                
+                self.record_attempt(platform, attempt, 'empty', attempt_started)
+                self.strategy_selector.record(platform, attempt, False, time.monotonic() - attempt_started)
+                await self.info_cache.adrop_info(url, platform, attempt, playlist=allow_playlist)
                     
-                    if attempt == attempts:
-                        raise Exception(f"All {attempts} attempts failed for {platform}. Last error: {last_error}")
+            except (DownloadQueueFull, MediaTooLarge, CircuitOpen, RateLimited, StorageQuotaExceeded) as e:
+                self.record_attempt(platform, attempt, type(e).__name__, attempt_started)
+                raise
+            except Exception as e:
+                self.record_attempt(platform, attempt, 'error', attempt_started)
+                last_error = str(e)
+                logger.warning(f"⚠️ Attempt {attempt} failed for {platform}: {last_error}")
+                self.platform_guard.record_failure(platform, e)
+                # The metadata may be what went stale; the next request probes afresh
+                await self.info_cache.adrop_info(url, platform, attempt, playlist=allow_playlist)
+                
+                # Don't retry if it's a fatal error
+                if self.is_fatal_error(e):
+                    if self.is_dead_link(e):
+                        await self.info_cache.aput_failure(url, e)
+                    break
+                
+                # Content problems say nothing about the strategy; everything else counts against it
+                self.strategy_selector.record(platform, attempt, False, time.monotonic() - attempt_started)
+                
+                if position == attempts:
+                    raise Exception(f"All {attempts} attempts failed for {platform}. Last error: {last_error}")
+            finally:
+                # Paths that record no outcome (fatal errors, empty files, cancellation) give the half-open slot back
+                self.platform_guard.release_probe(platform, probe_slot)
+        
+        if not success or not (file_path or stream_format):
+            raise Exception(f"Download failed after {attempts} attempts. Last error: {last_error}")
+        
+        return {
+            'info': info,
+            'ydl_opts': ydl_opts,
+            'file_path': file_path,
+            'files': files,
+            'stream_format': stream_format,
+            'title': title,
+            'duration': duration,
+            'uploader': uploader,
+        }
+
+    async def prepare_for_upload(self, workspace, file_path, duration, platform, status=None):
+        """Remux a video Telegram can't stream, or compress one over the upload limit; returns the file to send"""
+        if not self.transcoder or Path(file_path).suffix.lower() in PHOTO_EXTS:
+            return file_path
+        file_size = os.path.getsize(file_path)
+        kind = 'compress' if file_size > MAX_FILE_SIZE else 'remux'
+        try:
+            if kind == 'compress':
+                if status:
+                    await status(
+                        f"🗜️ **Compressing Video**\n\n"
+                        f"📊 **Size:** {file_size / MB:.1f} MB → under {MAX_FILE_SIZE_MB:.0f} MB\n"
+                        f"🎯 **Platform:** {platform.title()}\n\n"
+                        f"⏳ **This can take a few minutes for long videos**"
+                    )
+                # The compressed copy sits next to the original until it is done
+                await workspace.reserve(file_size + MAX_FILE_SIZE)
+                with self.stage_seconds.time(stage='transcode', platform=platform):
+                    prepared = await self.transcoder.compress(file_path, MAX_FILE_SIZE, duration or None)
+            else:
+                with self.stage_seconds.time(stage='remux', platform=platform):
+                    prepared = await self.transcoder.make_streamable(file_path)
+        except TranscodeError as e:
+            logger.warning(f"⚠️ ffmpeg {kind} failed for {os.path.basename(file_path)}: {e}")
+            self.transcodes_total.inc(kind=kind, outcome='failed')
+            return file_path
+        except StorageQuotaExceeded as e:
+            logger.warning(f"⚠️ No disk space to {kind} {os.path.basename(file_path)}: {e}")
+            self.transcodes_total.inc(kind=kind, outcome='failed')
+            return file_path
+        if prepared != file_path:
+            self.transcodes_total.inc(kind=kind, outcome='done')
+            logger.info(f"🎞️ {kind.title()}ed {os.path.basename(file_path)}: {file_size / MB:.1f} → {os.path.getsize(prepared) / MB:.1f} MB")
+        return prepared
+
+    async def upload_video(self, bot, chat_id, file_path, caption, duration, platform):
+        """Upload a downloaded file with sendVideo"""
+        with self.stage_seconds.time(stage='upload', platform=platform):
+            if BOT_API_LOCAL_MODE:
+                # The local server reads the file by path; no bytes go over HTTP
+                sent_message = await bot.send_video(
+                    chat_id=chat_id,
+                    video=Path(file_path),
+                    caption=caption,
+                    parse_mode='Markdown',
+                    supports_streaming=True,
+                    duration=duration if duration > 0 else None
+                )
+            else:
+                with open(file_path, 'rb') as video_file:
+                    sent_message = await bot.send_video(
+                        chat_id=chat_id,
+                        video=video_file,
+                        caption=caption,
+                        parse_mode='Markdown',
+                        supports_streaming=True,
+                        duration=duration if duration > 0 else None
+                    )
+        self.uploads_total.inc(method='local' if BOT_API_LOCAL_MODE else 'upload')
+        return sent_message
+
+    def record_attempt(self, platform, attempt, outcome, started):
+        """Count one strategy attempt and its latency"""
+        self.attempts_total.inc(platform=platform, attempt=attempt, outcome=outcome)
+        self.stage_seconds.observe(time.monotonic() - started, stage='attempt', platform=platform)
+
+    async def process_download(self, bot, job, flight=None):
+        """Download with platform-specific retries and deliver the video to the chat"""
+        user_id = job['user_id']
+        chat_id = job['chat_id']
+        url = job['url']
+        platform = job['platform']
+        
+        processing_message = MessageRef(bot, chat_id, job['status_message_id'])
+        progress = self.progress_editor.tracker(processing_message)
+        if job['resumes']:
+            progress.update(
+                f"♻️ **Resuming {platform.title()} Download**\n\n"
+                f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
+                f"⏳ **Status:** Picking up where the bot left off before restarting..."
+            )
+        
+        # Fail fast while the platform is blocking us, before taking a download slot
+        blocked = self.platform_guard.blocked(platform)
+        if blocked:
+            logger.info(f"🔌 Rejected {platform} request from user {user_id}: circuit open")
+            self.downloads_total.inc(platform=platform, outcome='circuit_open')
+            await self.finish_job(job, blocked)
+            await self.show_download_error(processing_message, platform, blocked)
+            if flight:
+                flight.fail(blocked)
+            return
+        
+        # Wait for a fair share of the download slots
+        if self.scheduler.would_wait(user_id):
+            usual_wait = self.scheduler.user_wait_time(user_id)['avg']
+            progress.update(
+                f"⏳ **Waiting in Queue**\n\n"
+                f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
+                f"🎯 **Platform:** {platform.title()}\n"
+                f"📋 **Jobs ahead:** {self.scheduler.queue_depth}\n"
+                + (f"⏱️ **Your usual wait:** ~{usual_wait:.0f}s\n" if usual_wait >= 1 else "")
+                + "\n🔄 **Your download will start automatically**"
+            )
+        
+        waited = await self.scheduler.acquire(user_id)
+        self.scheduler_wait.observe(waited, kind='single')
+        
+        # A resumed job continues in its old directory so yt-dlp can pick up .part files
+        async def moved(path):
+            await self.update_job(job, temp_dir=path)
+        
+        workspace = self.temp_storage.create(reuse=job['temp_dir'], on_move=moved)
+        if workspace.path == job['temp_dir']:
+            logger.info(f"♻️ Reusing {workspace.path} for job {job['id']}")
+        interrupted = False
+        failure = None
+        
+        try:
+            await self.update_job(job, stage=DOWNLOADING, temp_dir=workspace.path)
             
-            if not success or not file_path:
-                raise Exception(f"Download failed after {attempts} attempts. Last error: {last_error}")
+            async def status(text):
+                progress.update(text)
+            
+            progress_hook = progress.hook(lambda event: self.build_progress_text(platform, event))
+            fetched = await self.fetch_media(
+                url, platform, workspace, status=status, allow_stream=self.streaming_uploader is not None,
+                progress_hook=progress_hook,
+            )
+            info = fetched['info']
+            ydl_opts = fetched['ydl_opts']
+            file_path = fetched['file_path']
+            stream_format = fetched['stream_format']
+            title = fetched['title']
+            duration = fetched['duration']
+            uploader = fetched['uploader']
             
             # Check file size
-            file_size = os.path.getsize(file_path)
+            if stream_format:
+                file_size = format_size(stream_format, duration) or 0
+            else:
+                file_size = os.path.getsize(file_path)
             file_size_mb = file_size / (1024 * 1024)
+            cache_keys = [url_key(url), media_key(info)]
             
-            if file_size_mb > 49:
-                await processing_message.edit_text(
-                    f"❌ **File Too Large for Telegram**\n\n"
-                    f"📁 **File Size:** {file_size_mb:.1f} MB\n"
-                    f"⚠️ **Telegram Limit:** 50 MB\n"
-                    f"🎬 **Title:** {title[:50]}{'...' if len(title) > 50 else ''}\n\n"
-                    f"💡 **Suggestions:**\n"
-                    f"• Try a shorter video\n"
-                    f"• Look for different quality versions\n"
-                    f"• Some platforms offer multiple formats",
-                    parse_mode='Markdown'
+            # Same media may already be uploaded under a different URL
+            cached = await self.lookup_cached_video(media_key(info))
+            if cached and await self.send_cached_video(bot, chat_id, cached, platform):
+                logger.info(f"⚡ Reused cached upload of {media_key(info)} for user {user_id}")
+                await self.store_cached_video(
+                    cache_keys, cached['file_id'], title, uploader, duration, cached['file_size']
                 )
-                return
-            
-            # Upload to Telegram
-            await processing_message.edit_text(
-                f"📤 **Uploading to Telegram**\n\n"
-                f"📁 **Title:** {title[:40]}{'...' if len(title) > 40 else ''}\n"
-                f"👤 **Creator:** {uploader[:20]}{'...' if len(uploader) > 20 else ''}\n"
-                f"📊 **Size:** {file_size_mb:.1f} MB\n"
-                f"🎯 **Platform:** {platform.title()}\n"
-                f"✅ **Method:** Platform-optimized extraction\n\n"
-                f"⚡ **Almost ready...**",
-                parse_mode='Markdown'
-            )
+                delivered = cached
+            else:
+                if not stream_format:
+                    file_path = await self.prepare_for_upload(workspace, file_path, duration, platform, status)
+                    file_size = os.path.getsize(file_path)
+                    file_size_mb = file_size / (1024 * 1024)
+                if file_size > MAX_FILE_SIZE:
+                    raise MediaTooLarge(file_size, MAX_FILE_SIZE, title)
+                
+                # Upload to Telegram
+                await self.update_job(job, stage=UPLOADING)
+                progress.update(
+                    f"📤 **Uploading to Telegram**\n\n"
+                    f"📁 **Title:** {title[:40]}{'...' if len(title) > 40 else ''}\n"
+                    f"👤 **Creator:** {uploader[:20]}{'...' if len(uploader) > 20 else ''}\n"
+                    f"📊 **Size:** {file_size_mb:.1f} MB\n"
+                    f"🎯 **Platform:** {platform.title()}\n"
+                    f"✅ **Method:** Platform-optimized extraction\n\n"
+                    f"⚡ **Almost ready...**"
+                )
+                
+                caption = self.build_caption(title, uploader, platform, duration, file_size_mb)
+                
+                sent_message = None
+                if stream_format:
+                    try:
+                        with self.stage_seconds.time(stage='stream', platform=platform):
+                            sent_message = await self.stream_video(
+                                bot, chat_id, stream_format, title, caption, duration
+                            )
+                        self.uploads_total.inc(method='stream')
+                    except MediaTooLarge:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"⚠️ Streaming upload failed, falling back to a regular download: {e}")
+                        await workspace.reserve(file_size)
+                        self.relocate_output(ydl_opts, workspace.path)
+                        if self.download_executor.mode == 'thread':
+                            ydl_opts['progress_hooks'] = [self.abort_hook] + ([progress_hook] if progress_hook else [])
+                        self.apply_download_engine(ydl_opts, platform)
+                        with self.bandwidth.share(ydl_opts):
+                            info = await self.download_executor.download_info(platform, info, ydl_opts)
+                        downloaded_files = workspace.files()
+                        if not downloaded_files:
+                            raise Exception("No file was downloaded")
+                        file_path = downloaded_files[0]
+                        file_size = os.path.getsize(file_path)
+                        if file_size > MAX_FILE_SIZE:
+                            raise MediaTooLarge(file_size, MAX_FILE_SIZE, title)
+                
+                # Send video
+                if not sent_message:
+                    sent_message = await self.upload_video(
+                        bot, chat_id, file_path, caption, duration, platform
+                    )
+                
+                sent_media = sent_message.video or sent_message.document
+                delivered = None
+                if sent_media:
+                    await self.store_cached_video(
+                        cache_keys, sent_media.file_id, title, uploader, duration, file_size
+                    )
+                    delivered = {
+                        'file_id': sent_media.file_id,
+                        'title': title,
+                        'uploader': uploader,
+                        'duration': duration,
+                        'file_size': file_size,
+                    }
             
-            # Prepare caption
-            duration_text = f"{duration//60}:{duration%60:02d}" if duration else "Unknown"
+            # Fan the upload out to identical requests waiting on this one
+            if flight and delivered:
+                flight.publish(delivered)
             
-            caption = f"✅ **Multi-Platform Download Success!**\n\n"
-            caption += f"📁 **Title:** {title[:60]}{'...' if len(title) > 60 else ''}\n"
-            caption += f"👤 **Creator:** {uploader[:30]}{'...' if len(uploader) > 30 else ''}\n"
-            caption += f"🎯 **Platform:** {platform.title()}\n"
-            caption += f"⏱️ **Duration:** {duration_text}\n"
-            caption += f"📊 **Size:** {file_size_mb:.1f} MB\n"
-            caption += f"🛡️ **Extraction:** Platform-optimized\n\n"
-            caption += f"🤖 **AnyLink Bot v3.0.0** | ☁️ **Railway Cloud**"
+            await self.finish_job(job)
+            progress.close()
+            self.downloads_total.inc(platform=platform, outcome='success')
+            await self.show_download_success(processing_message, platform)
             
-            # Send video
-            with open(file_path, 'rb') as video_file:
-                await context.bot.send_video(
-                    chat_id=update.effective_chat.id,
-                    video=video_file,
-                    caption=caption[:1024],  # Telegram caption limit
-                    parse_mode='Markdown',
-                    supports_streaming=True,
-                    duration=duration if duration > 0 else None
-                )
+            logger.info(f"🎉 Successfully completed {platform} download for user {user_id}")
             
-            # Success message
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔄 Download Another", callback_data="start"),
-                    InlineKeyboardButton("⭐ Rate Bot", url=self.company_info['telegram'])
-                ],
-                [
-                    InlineKeyboardButton("🧪 Test Other Platforms", callback_data="test")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+        except MediaTooLarge as e:
+            failure = e
+            logger.info(f"📏 Rejected oversized {platform} media for user {user_id}: {e}")
+            self.downloads_total.inc(platform=platform, outcome='too_large')
+            await self.finish_job(job, e)
+            progress.close()
+            await self.show_too_large(processing_message, e)
             
-            await processing_message.edit_text(
-                f"🎉 **{platform.title()} Download Complete!**\n\n"
-                f"✅ Successfully extracted using platform-optimized settings\n"
-                f"📱 Video sent to your chat\n"
-                f"⚡ Processed by Railway Cloud\n\n"
-                f"💡 **Try other platforms too!** Each one has specialized optimization.",
-                reply_markup=reply_markup,
+        except DownloadQueueFull as e:
+            failure = e
+            logger.warning(f"🚦 Download queue full, rejecting {platform} request from user {user_id}")
+            self.downloads_total.inc(platform=platform, outcome='busy')
+            await self.finish_job(job, e)
+            progress.close()
+            await self.finish_status(
+                processing_message,
+                self.build_error_text(platform, e),
                 parse_mode='Markdown'
             )
             
-            logger.info(f"🎉 Successfully completed {platform} download for user {user_id}")
-            
         except Exception as e:
+            failure = e
             logger.error(f"❌ Final download error for user {user_id} from {platform}: {str(e)}")
+            self.downloads_total.inc(platform=platform, outcome='failed')
             
-            # Enhanced error handling with platform-specific messages
-            error_message = str(e).lower()
+            await self.finish_job(job, e)
+            progress.close()
+            await self.show_download_error(processing_message, platform, e)
             
-            if 'sign in to confirm' in error_message or 'not a bot' in error_message:
-                error_text = f"🤖 **{platform.title()}: Bot Detection**\n\n"
-                error_text += f"The platform detected automated access and blocked the request.\n\n"
-                if platform == 'youtube':
-                    error_text += f"**💡 YouTube-specific solutions:**\n"
-                    error_text += f"• Try a different YouTube video\n"
-                    error_text += f"• Wait 10-15 minutes and try again\n"
-                    error_text += f"• Some videos work better than others"
-                else:
-                    error_text += f"**💡 Try these solutions:**\n"
-                    error_text += f"• Try a different video from {platform.title()}\n"
-                    error_text += f"• Wait a few minutes and try again\n"
-                    error_text += f"• Try other platforms (Instagram, TikTok)"
-                    
-            elif "private" in error_message or "unavailable" in error_message:
-                error_text = f"🔒 **{platform.title()}: Content Not Available**\n\n"
-                error_text += f"The video is private, deleted, or restricted.\n\n"
-                error_text += f"**💡 Solutions:**\n"
-                error_text += f"• Make sure the video is public\n"
-                error_text += f"• Check if the URL is correct\n"
-                error_text += f"• Try a different video from {platform.title()}"
-                
-            elif "geo" in error_message:
-                error_text = f"🌍 **{platform.title()}: Geographic Restriction**\n\n"
-                error_text += f"This video is not available in the bot's server region.\n\n"
-                error_text += f"**💡 Solutions:**\n"
-                error_text += f"• Try videos available globally\n"
-                error_text += f"• Try other platforms"
+        except asyncio.CancelledError:
+            # Shutdown ran out of grace time; keep the job and its partial files for the next start
+            interrupted = True
+            logger.info(f"⏸️ Job {job['id']} interrupted at stage {job['stage']}, will resume after restart")
+            progress.close()
+            try:
+                await asyncio.wait_for(processing_message.edit_text(
+                    f"⏸️ **Bot Restarting**\n\n"
+                    f"🔗 **URL:** `{url[:60]}{'...' if len(url) > 60 else ''}`\n"
+                    f"⏳ **Status:** Your download is saved and will resume automatically in a moment.",
+                    parse_mode='Markdown'
+                ), timeout=5)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to show restart notice: {e}")
+            raise
+            
+        finally:
+            # Identical requests waiting on this one share its failure instead of retrying into it
+            if flight and failure:
+                flight.fail(failure)
+            progress.close()
+            self.scheduler.release(user_id)
+            
+            # Cleanup (unless the job will resume from these files)
+            await workspace.release(keep=interrupted and job['id'])
+
+    async def expand_playlist(self, url, platform):
+        """Entry URLs of a playlist link (flat, no per-item metadata), up to BATCH_MAX_ITEMS"""
+        ydl_opts = self.get_platform_specific_options(tempfile.gettempdir(), platform, playlist=True)
+        ydl_opts['extract_flat'] = 'in_playlist'
+        probe_slot = None
+        try:
+            probe_slot = await self.platform_guard.acquire(platform)
+            info = await self.download_executor.extract(platform, url, ydl_opts, download=False)
+        except Exception as e:
+            if not self.is_fatal_error(e):
+                self.platform_guard.record_failure(platform, e)
+            logger.warning(f"⚠️ Could not expand {platform} playlist, treating it as one link: {e}")
+            return [url]
+        finally:
+            self.platform_guard.release_probe(platform, probe_slot)
+        self.platform_guard.record_success(platform)
+        
+        if not info or info.get('_type') != 'playlist':
+            return [url]
+        entries = [entry.get('webpage_url') or entry.get('url') for entry in info.get('entries') or [] if entry]
+        entries = [entry for entry in entries if entry and entry.startswith('http')]
+        logger.info(f"📃 Expanded {platform} playlist into {len(entries)} items")
+        return entries[:BATCH_MAX_ITEMS] or [url]
+
+    def build_batch_status(self, urls, states, errors, finished=False):
+        """Single aggregated progress text for every link in a batch"""
+        icons = {'queued': '⏳', 'running': '🔄', 'done': '✅', 'cached': '⚡', 'failed': '❌'}
+        completed = sum(1 for state in states.values() if state in ('done', 'cached', 'failed'))
+        
+        text = "📦 **Batch Complete**\n\n" if finished else "📦 **Batch Download**\n\n"
+        for index, url in enumerate(urls, 1):
+            text += f"{icons[states[url]]} {index}. `{url[:45]}{'...' if len(url) > 45 else ''}`\n"
+        text += f"\n📊 **Progress:** {completed}/{len(urls)}"
+        
+        if finished and errors:
+            text += "\n\n**Failed:**\n"
+            for url, reason in errors.items():
+                text += f"• {urls.index(url) + 1}. {reason}\n"
+        return text[:4096]
+
+    def batch_error_reason(self, platform, error):
+        """One-line reason for a failed batch item"""
+        if isinstance(error, MediaTooLarge):
+            return f"📏 Too large ({error.size / (1024 * 1024):.0f} MB)"
+        if isinstance(error, DownloadQueueFull):
+            return "🚦 Bot busy, try again later"
+        if isinstance(error, RateLimited):
+            return f"⏳ Rate limited, try again in {format_wait(error.retry_after)}"
+        return self.build_error_text(platform, error).split('\n')[0]
+
+    async def send_album(self, context: ContextTypes.DEFAULT_TYPE, chat_id, entries, caption):
+        """Send up to ALBUM_SIZE entries as one album; returns the sent messages"""
+        with ExitStack() as stack:
+            media = []
+            for index, entry in enumerate(entries):
+                source = entry['source']
+                if entry['path']:
+                    # Local servers read files by path; otherwise upload the bytes
+                    source = Path(entry['path']) if BOT_API_LOCAL_MODE else stack.enter_context(open(entry['path'], 'rb'))
+                options = {'caption': caption, 'parse_mode': 'Markdown'} if index == 0 else {}
+                if entry['kind'] == 'video':
+                    duration = entry['duration'] or 0
+                    options.update(supports_streaming=True, duration=duration if duration > 0 else None)
                 
+                if len(entries) == 1:
+                    # Albums need at least two items
+                    if entry['kind'] == 'photo':
+                        return [await context.bot.send_photo(chat_id=chat_id, photo=source, **options)]
+                    return [await context.bot.send_video(chat_id=chat_id, video=source, **options)]
+                media_type = InputMediaPhoto if entry['kind'] == 'photo' else InputMediaVideo
+                media.append(media_type(media=source, **options))
+            
+            return list(await context.bot.send_media_group(chat_id=chat_id, media=media))
+
+    async def download_batch(self, update: Update, context: ContextTypes.DEFAULT_TYPE, urls):
+        """Download every link in a message concurrently and deliver them as albums"""
+        user_id = update.effective_user.id
+        chat_id = update.effective_chat.id
+        
+        progress_message = await update.message.reply_text(
+            f"📦 **Batch Download**\n\n"
+            f"🔗 **Links:** {len(urls)}\n"
+            f"⏳ **Status:** Preparing downloads...",
+            parse_mode='Markdown'
+        )
+        
+        # Playlists become their individual entries
+        items = []
+        for url in urls:
+            if BATCH_PLAYLISTS and PLAYLIST_RE.search(url):
+                items.extend(await self.expand_playlist(url, self.get_platform_from_url(url)))
             else:
-                error_text = f"🚫 **{platform.title()}: Download Failed**\n\n"
-                error_text += f"**Error Details:** `{str(e)[:150]}{'...' if len(str(e)) > 150 else ''}`\n\n"
-                error_text += f"**💡 Common Solutions:**\n"
-                error_text += f"• Verify the URL is correct and public\n"
-                error_text += f"• Try a different video from {platform.title()}\n"
-                error_text += f"• Try other platforms (each has different success rates)\n"
-                error_text += f"• Contact support if the issue persists"
+                items.append(url)
+        items = list(dict.fromkeys(items))
+        if len(items) > BATCH_MAX_ITEMS:
+            logger.info(f"✂️ Trimmed batch from user {user_id} to {BATCH_MAX_ITEMS} of {len(items)} items")
+            items = items[:BATCH_MAX_ITEMS]
+        
+        logger.info(f"📦 User {user_id} batch downloading {len(items)} items")
+        
+        states = {url: 'queued' for url in items}
+        errors = {}
+        results = {}
+        workspaces = []
+        progress = self.progress_editor.tracker(progress_message)
+        
+        async def refresh():
+            # One message for the whole batch; item updates coalesce into it
+            progress.update(self.build_batch_status(items, states, errors))
+        
+        async def run(url):
+            platform = self.get_platform_from_url(url)
+            cached = await self.lookup_cached_video(url_key(url))
+            if cached:
+                results[url] = [{**cached, 'url': url, 'kind': 'video', 'source': cached['file_id'], 'path': None,
+                                 'platform': platform, 'cache_keys': None}]
+                states[url] = 'cached'
+                self.downloads_total.inc(platform=platform, outcome='cached')
+                await refresh()
+                return
             
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔄 Try Different URL", callback_data="start"),
-                    InlineKeyboardButton("🧪 Test Other Platforms", callback_data="test")
-                ],
-                [
-                    InlineKeyboardButton("📞 Get Support", callback_data="contact")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            try:
+                blocked = self.platform_guard.blocked(platform)
+                if blocked:
+                    raise blocked
+                waited = await self.scheduler.acquire(user_id, limit=BATCH_CONCURRENCY)
+                self.scheduler_wait.observe(waited, kind='batch')
+            except Exception as e:
+                errors[url] = self.batch_error_reason(platform, e)
+                states[url] = 'failed'
+                await refresh()
+                return
             
-            await processing_message.edit_text(
-                error_text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+            try:
+                states[url] = 'running'
+                await refresh()
+                workspace = self.temp_storage.create()
+                workspaces.append(workspace)
+                fetched = await self.fetch_media(url, platform, workspace, allow_playlist=BATCH_PLAYLISTS)
+                
+                entries = []
+                for path in fetched['files']:
+                    path = await self.prepare_for_upload(workspace, path, fetched['duration'], platform)
+                    file_size = os.path.getsize(path)
+                    if file_size > MAX_FILE_SIZE:
+                        raise MediaTooLarge(file_size, MAX_FILE_SIZE, fetched['title'])
+                    entries.append({
+                        'url': url,
+                        'kind': 'photo' if Path(path).suffix.lower() in PHOTO_EXTS else 'video',
+                        'source': None,
+                        'path': path,
+                        'platform': platform,
+                        'title': fetched['title'],
+                        'uploader': fetched['uploader'],
+                        'duration': fetched['duration'],
+                        'file_size': file_size,
+                        # Only single-video links map one-to-one onto a cached file_id
+                        'cache_keys': [url_key(url), media_key(fetched['info'])] if len(fetched['files']) == 1 else None,
+                    })
+                results[url] = entries
+                states[url] = 'done'
+                self.downloads_total.inc(platform=platform, outcome='success')
+            except Exception as e:
+                logger.warning(f"⚠️ Batch item failed for user {user_id} from {platform}: {e}")
+                self.downloads_total.inc(platform=platform, outcome='failed')
+                errors[url] = self.batch_error_reason(platform, e)
+                states[url] = 'failed'
+            finally:
+                self.scheduler.release(user_id)
+                await refresh()
+        
+        try:
+            await asyncio.gather(*(run(url) for url in items))
             
-        finally:
-            # Cleanup
-            if temp_dir and os.path.exists(temp_dir):
+            # Albums keep the order the links were sent in
+            delivered = [entry for url in items for entry in results.get(url, [])]
+            for start in range(0, len(delivered), ALBUM_SIZE):
+                chunk = delivered[start:start + ALBUM_SIZE]
+                caption = (
+                    f"📦 **AnyLink Batch** ({start + 1}-{start + len(chunk)} of {len(delivered)})\n\n"
+                    f"🤖 **AnyLink Bot v3.0.0** | ☁️ **Railway Cloud**"
+                )
                 try:
-                    shutil.rmtree(temp_dir)
-                    logger.info(f"🧹 Cleaned up temp directory: {temp_dir}")
+                    with self.stage_seconds.time(stage='upload_album', platform='batch'):
+                        sent_messages = await self.send_album(context, chat_id, chunk, caption)
+                    self.uploads_total.inc(len(chunk), method='album')
                 except Exception as e:
-                    logger.warning(f"⚠️ Failed to clean temp directory: {e}")
+                    logger.error(f"❌ Failed to send batch album to user {user_id}: {e}")
+                    for entry in chunk:
+                        errors.setdefault(entry['url'], self.batch_error_reason(entry['platform'], e))
+                        states[entry['url']] = 'failed'
+                    continue
+                
+                for entry, sent in zip(chunk, sent_messages):
+                    sent_media = sent.video or sent.document
+                    if entry['cache_keys'] and sent_media:
+                        await self.store_cached_video(
+                            entry['cache_keys'], sent_media.file_id, entry['title'],
+                            entry['uploader'], entry['duration'], entry['file_size']
+                        )
+            
+            try:
+                await progress.finish(self.build_batch_status(items, states, errors, finished=True))
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to show batch summary: {e}")
+            logger.info(f"🎉 Finished batch for user {user_id}: {len(items) - len(errors)}/{len(items)} delivered")
+            
+        finally:
+            progress.close()
+            await asyncio.gather(*(workspace.release() for workspace in workspaces))
 
     async def post_init(self, application: Application):
         """Post-initialization setup"""
@@ -980,6 +2385,122 @@ Each test uses a known working URL to verify platform-specific functionality.
             print("📱 Ready to receive download requests!")
         except Exception as e:
             logger.error(f"❌ Failed to get bot info: {e}")
+        
+        if ROLE != 'frontend':
+            self.sweep_task = asyncio.create_task(self.sweep_temp_dirs())
+        if self.job_queue and ROLE != 'frontend':
+            await self.start_worker()
+        
+        if self.metrics_server:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.warning(f"⚠️ Metrics endpoint disabled, could not bind {METRICS_HOST}:{METRICS_PORT}: {e}")
+                self.metrics_server = None
+            else:
+                self.metrics_task = asyncio.create_task(self.refresh_metrics())
+
+    async def post_stop(self, application: Application):
+        """Give running jobs SHUTDOWN_GRACE seconds to finish, then hand the rest back to the queue"""
+        self.draining = True
+        if self.claim_task:
+            self.claim_task.cancel()
+            await asyncio.gather(self.claim_task, return_exceptions=True)
+        tasks = list(self.job_tasks)
+        if tasks:
+            logger.info(f"🛑 Draining {len(tasks)} running jobs (up to {SHUTDOWN_GRACE:.0f}s)...")
+            _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_GRACE)
+            if pending:
+                logger.warning(f"⏸️ {len(pending)} jobs still running after {SHUTDOWN_GRACE:.0f}s, interrupting them")
+                self.aborting = True
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            logger.info("✅ Job drain complete")
+        for task in (self.heartbeat_task, self.sweep_task, self.metrics_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if self.job_queue and ROLE != 'frontend':
+            # Another worker (or this one after the restart) can pick them up without waiting out the lease
+            try:
+                released = await self.job_queue.arelease(WORKER_ID)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to release unfinished jobs: {e}")
+            else:
+                if released:
+                    logger.info(f"📤 Handed {released} unfinished jobs back to the queue")
+
+    async def post_shutdown(self, application: Application):
+        """Release background resources on shutdown"""
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        self.download_executor.shutdown(wait=False)
+        if self.transcoder:
+            self.transcoder.shutdown()
+        if self.streaming_uploader:
+            await self.streaming_uploader.close()
+        if self.file_cache:
+            self.file_cache.close()
+        self.info_cache.close()
+        if self.job_queue:
+            self.job_queue.close()
+
+    def is_ready(self):
+        """True while this process takes new updates (not starting up or draining)"""
+        return self.application.running and not self.draining
+
+    async def serve_webhook(self):
+        """Receive updates through a webhook until SIGINT/SIGTERM, then drain like polling does"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        server = WebhookServer(
+            self.application, WEBHOOK_PATH, WEBHOOK_SECRET, host=WEBHOOK_HOST, port=PORT, ready=self.is_ready
+        )
+        await self.application.initialize()
+        try:
+            await self.post_init(self.application)
+            await self.application.start()
+            await server.start()
+            # Every replica registers the same URL and secret; updates queued meanwhile are kept
+            await self.application.bot.set_webhook(
+                f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=False,
+                secret_token=WEBHOOK_SECRET,
+            )
+            logger.info(f"🪝 Webhook registered at {WEBHOOK_URL}/{WEBHOOK_PATH} (max {WEBHOOK_MAX_CONNECTIONS} connections)")
+            await stop.wait()
+            
+            # Not ready from here on: new updates get 503 and Telegram redelivers them later
+            logger.info("🛑 Shutdown signal received, stopping webhook...")
+            await self.application.stop()
+            await self.post_stop(self.application)
+        finally:
+            await server.stop()
+            await self.application.shutdown()
+            await self.post_shutdown(self.application)
+
+    async def serve_worker(self):
+        """Worker role: no polling, just claim jobs from the broker until SIGINT/SIGTERM"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        await self.application.initialize()
+        try:
+            await self.post_init(self.application)
+            await stop.wait()
+            logger.info("🛑 Shutdown signal received, stopping worker...")
+            await self.post_stop(self.application)
+        finally:
+            await self.application.shutdown()
+            await self.post_shutdown(self.application)
 
     def run(self):
         """Start the bot"""
@@ -990,22 +2511,37 @@ Each test uses a known working URL to verify platform-specific functionality.
         print("🌍 Multi-platform optimization: ACTIVE")
         print("📱 Bot starting... Press Ctrl+C to stop.")
         
-        # Set post-init callback
-        self.application.post_init = self.post_init
+        if ROLE == 'worker':
+            logger.info(f"👷 Running as download worker {WORKER_ID} (broker: {JOB_QUEUE_PATH})")
+            try:
+                asyncio.run(self.serve_worker())
+            except Exception as e:
+                logger.error(f"❌ Critical error running worker: {e}")
+                print(f"💥 CRITICAL ERROR: {e}")
+                sys.exit(1)
+            return
         
-        # Handle graceful shutdown
-        def signal_handler(signum, frame):
-            logger.info("🛑 Shutdown signal received, stopping bot gracefully...")
-            sys.exit(0)
+        if WEBHOOK_URL:
+            logger.info(f"🪝 Running in webhook mode on {WEBHOOK_HOST}:{PORT}")
+            try:
+                asyncio.run(self.serve_webhook())
+            except Exception as e:
+                logger.error(f"❌ Critical error running bot: {e}")
+                print(f"💥 CRITICAL ERROR: {e}")
+                sys.exit(1)
+            return
         
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+        # Set post-init callback
+        self.application.post_init = self.post_init
+        self.application.post_stop = self.post_stop
+        self.application.post_shutdown = self.post_shutdown
         
-        # Start the bot
+        # Start the bot; SIGINT/SIGTERM stop polling, then post_stop drains running jobs.
+        # Updates sent while the bot was down are still processed after a restart.
         try:
             self.application.run_polling(
                 allowed_updates=Update.ALL_TYPES,
-                drop_pending_updates=True
+                drop_pending_updates=False
             )
         except Exception as e:
             logger.error(f"❌ Critical error running bot: {e}")
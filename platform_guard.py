@@ -0,0 +1,362 @@
+# platform_guard.py - Per-platform rate limiting and circuit breaking for extraction calls
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the platform is blocking us rather than the content being unavailable
+BOT_DETECTION_MARKERS = [
+    'sign in to confirm',
+    'not a bot',
+    'too many requests',
+    'http error 429',
+    'rate-limit',
+    'rate limit',
+]
+
+
+# Errors that mean the platform (or the path to it) is overloaded; worth retrying later, not sooner
+OVERLOAD_MARKERS = [
+    'timed out',
+    'timeout',
+    'connection reset',
+    'temporarily unavailable',
+    'http error 502',
+    'http error 503',
+    'http error 504',
+]
+
+RETRY_AFTER_RE = re.compile(r'retry[- ]after[:= ]+(\d+)', re.IGNORECASE)
+
+
+def is_bot_detection(error):
+    message = str(error).lower()
+    return any(marker in message for marker in BOT_DETECTION_MARKERS)
+
+
+def is_overload(error):
+    if isinstance(error, TimeoutError):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in OVERLOAD_MARKERS)
+
+
+def _error_chain(error):
+    """error and the exceptions behind it, following yt-dlp's exc_info and cause as well"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, 'exc_info', None)
+        error = (
+            getattr(error, 'cause', None) or error.__cause__ or error.__context__
+            or (exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None)
+        )
+
+
+def retry_after(error):
+    """Seconds a Retry-After header (or message) behind error asks us to wait, or None"""
+    for cause in _error_chain(error):
+        response = getattr(cause, 'response', None)
+        headers = getattr(response, 'headers', None) or getattr(cause, 'headers', None)
+        value = headers.get('Retry-After') if headers is not None else None
+        if value:
+            value = value.strip()
+            if value.isdigit():
+                return float(value)
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    match = RETRY_AFTER_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def retry_sleep(n):
+    """yt-dlp retry_sleep_functions entry: jittered exponential pause before its nth retry of a request"""
+    delay = min(30.0, 2.0 ** n)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def parse_platform_rates(spec):
+    """Parse 'youtube=0.5,tiktok=2' into {'youtube': 0.5, 'tiktok': 2.0}"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        platform, _, value = item.partition('=')
+        try:
+            rates[platform.strip().lower()] = max(0.01, float(value))
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid platform rate: {item}")
+    return rates
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a platform that is currently blocking us"""
+
+    def __init__(self, platform, reason, retry_after):
+        self.platform = platform
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(
+            f"{platform.title()} paused for {max(1, round(retry_after / 60))} more min after repeated blocks: {reason}"
+        )
+
+
+class RateLimited(Exception):
+    """Raised instead of waiting out a backoff the platform asked for that is longer than a request should wait"""
+
+    def __init__(self, platform, reason, retry_after):
+        self.platform = platform
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{platform.title()} is rate limiting us, try again in {format_wait(retry_after)}: {reason}")
+
+
+def format_wait(seconds):
+    """'45s' or '3 min'"""
+    if seconds < 120:
+        return f"{max(1, round(seconds))}s"
+    return f"{round(seconds / 60)} min"
+
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, up to burst saved"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Take one token, waiting for it if the bucket is empty"""
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class CircuitBreaker:
+    """Opens after threshold bot-detection errors within window seconds.
+
+    While open every call fails fast. After cooldown one half-open probe is
+    let through; its success closes the circuit, its failure re-opens it.
+    The probe holds a token, so giving up a slot that already had its
+    outcome (and went to a newer probe) does nothing.
+    """
+
+    def __init__(self, threshold=5, window=120, cooldown=600):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.reason = None
+        self._failures = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe = None
+
+    def retry_after(self):
+        return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def check(self):
+        """False when closed, a token for the half-open probe, None to fail fast"""
+        if self.state == 'closed':
+            return False
+        if self.state == 'open' and self.retry_after() <= 0:
+            self.state = 'half_open'
+        if self.state == 'half_open' and not self._probing:
+            self._probing = True
+            self._probe = object()
+            return self._probe
+        return None
+
+    def record_success(self):
+        if self.state != 'closed':
+            logger.info("✅ Circuit closed after a successful probe")
+        self.state = 'closed'
+        self._probing = False
+        self._probe = None
+        self._failures.clear()
+
+    def record_failure(self, error):
+        now = time.monotonic()
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window:
+            self._failures.popleft()
+
+        if self.state == 'half_open' or len(self._failures) >= self.threshold:
+            self.state = 'open'
+            self.reason = str(error)[:200]
+            self._opened_at = now
+            self._probing = False
+            self._probe = None
+
+    def release_probe(self, token=None):
+        """Give up the half-open probe slot without an outcome (only if token still holds it, when given)"""
+        if token is None or token is self._probe:
+            self._probing = False
+            self._probe = None
+
+
+class Backoff:
+    """Jittered exponential backoff for one platform, stepped only by throttling signals.
+
+    Rate limiting, bot detection and overload errors each double the delay
+    (half of it randomized so retries don't arrive together), a
+    Retry-After from the platform wins when it asks for longer, and a
+    success resets it. Other failures, and the happy path, wait for nothing.
+    """
+
+    def __init__(self, base=2.0, cap=60.0):
+        self.base = base
+        self.cap = cap
+        self.level = 0
+        self.reason = None
+        self._resume_at = 0.0
+
+    def remaining(self):
+        return max(0.0, self._resume_at - time.monotonic())
+
+    def record_failure(self, error):
+        """Back off if error says to; returns the delay imposed (0 for other errors)"""
+        hint = retry_after(error)
+        if hint is None and not (is_bot_detection(error) or is_overload(error)):
+            return 0.0
+        self.level += 1
+        delay = min(self.cap, self.base * 2 ** (self.level - 1))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if hint is not None:
+            delay = max(delay, hint)
+        self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        self.reason = str(error)[:200]
+        return delay
+
+    def record_success(self):
+        self.level = 0
+
+
+class PlatformGuard:
+    """Token bucket, backoff and circuit breaker per platform"""
+
+    def __init__(self, default_rate=1.0, burst=5, rates=None, threshold=5, window=120, cooldown=600,
+                 backoff_base=2.0, backoff_max=60.0):
+        self.default_rate = default_rate
+        self.burst = burst
+        self.rates = rates or {}
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets = {}
+        self._breakers = {}
+        self._backoffs = {}
+
+    def _bucket(self, platform):
+        if platform not in self._buckets:
+            self._buckets[platform] = TokenBucket(self.rates.get(platform, self.default_rate), self.burst)
+        return self._buckets[platform]
+
+    def _breaker(self, platform):
+        if platform not in self._breakers:
+            self._breakers[platform] = CircuitBreaker(self.threshold, self.window, self.cooldown)
+        return self._breakers[platform]
+
+    def _backoff(self, platform):
+        if platform not in self._backoffs:
+            self._backoffs[platform] = Backoff(self.backoff_base, self.backoff_max)
+        return self._backoffs[platform]
+
+    def blocked(self, platform):
+        """CircuitOpen describing why the platform is paused, or None"""
+        breaker = self._breaker(platform)
+        if breaker.state == 'closed':
+            return None
+        if breaker.state == 'open' and breaker.retry_after() <= 0:
+            return None  # next call becomes the half-open probe
+        if breaker.state == 'half_open' and not breaker._probing:
+            return None
+        return CircuitOpen(platform, breaker.reason, breaker.retry_after() or breaker.cooldown)
+
+    async def acquire(self, platform):
+        """Wait for a rate-limit token, or raise CircuitOpen or RateLimited to fail fast.
+
+        Returns the half-open probe token if this call became the probe
+        (None otherwise). The caller must record an outcome or pass the
+        token to release_probe() however the call ends, or the platform
+        stays blocked.
+        """
+        breaker = self._breaker(platform)
+        probe = breaker.check()
+        if probe is None:
+            raise CircuitOpen(platform, breaker.reason, breaker.retry_after() or breaker.cooldown)
+        if not probe:
+            probe = None
+        else:
+            logger.info(f"🔌 Half-open probe for {platform}")
+        try:
+            backoff = self._backoff(platform)
+            wait = backoff.remaining()
+            if wait > self.backoff_max:
+                # The platform asked for a longer pause than a request should sit through
+                raise RateLimited(platform, backoff.reason, wait)
+            if wait > 0:
+                logger.info(f"⏳ Backing off {platform} for {wait:.1f}s")
+                await asyncio.sleep(wait)
+            await self._bucket(platform).acquire()
+        except BaseException:
+            if probe:
+                breaker.release_probe(probe)
+            raise
+        return probe
+
+    def release_probe(self, platform, token):
+        """Free a half-open probe slot taken by acquire() if no outcome was recorded for it"""
+        if token is not None:
+            self._breaker(platform).release_probe(token)
+
+    def record_success(self, platform):
+        self._breaker(platform).record_success()
+        self._backoff(platform).record_success()
+
+    def record_failure(self, platform, error):
+        """Back off after throttling errors, and count bot-detection errors towards opening the circuit"""
+        delay = self._backoff(platform).record_failure(error)
+        if delay:
+            logger.info(f"⏳ {platform} is throttling us, next call in {delay:.1f}s")
+        breaker = self._breaker(platform)
+        if not is_bot_detection(error):
+            # Only a bot-detection failure says anything about the block
+            if breaker.state == 'half_open':
+                breaker.release_probe()
+            return
+        was_open = breaker.state == 'open'
+        breaker.record_failure(error)
+        if breaker.state == 'open' and not was_open:
+            logger.warning(f"🔌 Circuit opened for {platform} for {breaker.cooldown}s: {breaker.reason}")
+
+    def stats(self):
+        return {
+            platform: {
+                'state': breaker.state,
+                'retry_after': round(breaker.retry_after(), 1),
+                'backoff': round(self._backoff(platform).remaining(), 1),
+            }
+            for platform, breaker in self._breakers.items()
+        }
@@ -0,0 +1,91 @@
+# platforms.py - Platform registry with precompiled URL patterns and a host-suffix index
+import logging
+import re
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Any http(s) URL in a message
+URL_RE = re.compile(r'https?://[^\s]+', re.IGNORECASE)
+
+# Links that point at a playlist, channel set or album rather than one post
+PLAYLIST_RE = re.compile(r'[?&]list=|/playlist\b|/sets/|/album/', re.IGNORECASE)
+
+
+def extract_urls(text):
+    """Every distinct http(s) URL in the text, in order of appearance"""
+    return list(dict.fromkeys(match.group(0) for match in URL_RE.finditer(text or '')))
+
+
+class Platform:
+    """Everything the bot needs to know about one supported site"""
+
+    def __init__(self, name, hosts, patterns=(), max_attempts=3, options=None):
+        self.name = name
+        self.hosts = [host.lower() for host in hosts]
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.max_attempts = max_attempts
+        self.options = options
+
+    def build_options(self, base_opts, attempt):
+        """Apply the platform's strategy for an attempt to the base yt-dlp options"""
+        if self.options is None:
+            return base_opts
+        return self.options(base_opts, attempt)
+
+    def __repr__(self):
+        return f"Platform({self.name!r})"
+
+
+class PlatformRegistry:
+    """Looks platforms up by hostname suffix in O(number of labels)"""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self._platforms = {}
+        self._hosts = {}
+        self._url_pattern = None
+
+    def register(self, platform):
+        self._platforms[platform.name] = platform
+        for host in platform.hosts:
+            if host in self._hosts and self._hosts[host] is not platform:
+                logger.warning(f"⚠️ Host {host} moved from {self._hosts[host].name} to {platform.name}")
+            self._hosts[host] = platform
+        self._url_pattern = None
+        return platform
+
+    def get(self, name):
+        """Platform by name, or the fallback for unknown names"""
+        return self._platforms.get(name, self.fallback)
+
+    def names(self):
+        return list(self._platforms)
+
+    def for_url(self, url):
+        """Platform whose host (or a parent domain of it) matches the URL"""
+        try:
+            hostname = urlparse(url if '://' in url else f'https://{url}').hostname
+        except ValueError:
+            return self.fallback
+        if not hostname:
+            return self.fallback
+
+        labels = hostname.lower().rstrip('.').split('.')
+        for i in range(len(labels) - 1):
+            platform = self._hosts.get('.'.join(labels[i:]))
+            if platform:
+                return platform
+        return self.fallback
+
+    def _combined_pattern(self):
+        # One alternation of every platform pattern, compiled once per registry change
+        if self._url_pattern is None:
+            sources = [p.pattern for platform in self._platforms.values() for p in platform.patterns]
+            sources.append(URL_RE.pattern)
+            self._url_pattern = re.compile('|'.join(f'(?:{source})' for source in sources), re.IGNORECASE)
+        return self._url_pattern
+
+    def looks_like_url(self, text):
+        """True if the text contains a URL or a known platform link without a scheme"""
+        return self._combined_pattern().search(text) is not None
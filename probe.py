@@ -0,0 +1,49 @@
+# probe.py - Metadata-only size checks before any bytes are downloaded
+
+
+class MediaTooLarge(Exception):
+    """Raised when no available format fits under the upload limit"""
+
+    def __init__(self, size, limit, title=None):
+        self.size = size
+        self.limit = limit
+        self.title = title
+        super().__init__(f"Media is {size / (1024 * 1024):.1f} MB, limit is {limit / (1024 * 1024):.0f} MB")
+
+
+def format_size(fmt, duration=None):
+    """Best-effort size of one format in bytes, or None if unknown"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+
+    # Fall back to bitrate (kbit/s) x duration
+    tbr = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    if tbr and duration:
+        return int(tbr * 1000 / 8 * duration)
+    return None
+
+
+def selected_size(info):
+    """Estimated size of the format yt-dlp selected, or None if unknown"""
+    duration = info.get('duration')
+    parts = info.get('requested_formats') or [info]
+    sizes = [format_size(part, duration) for part in parts]
+    if not sizes or any(size is None for size in sizes):
+        return None
+    return sum(sizes)
+
+
+def is_progressive(fmt):
+    """True if a format carries both audio and video (or doesn't say otherwise)"""
+    return has_video(fmt) and has_audio(fmt)
+
+
+def has_video(fmt):
+    """True unless the format is known to be audio-only"""
+    return fmt.get('vcodec') != 'none'
+
+
+def has_audio(fmt):
+    """True unless the format is known to be video-only"""
+    return fmt.get('acodec') != 'none'
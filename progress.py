@@ -0,0 +1,207 @@
+# progress.py - Throttled, coalesced progress-message edits fed by yt-dlp progress hooks
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(error):
+    """RetryAfter.retry_after as float seconds (int or timedelta depending on the PTB version)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def progress_bar(fraction, width=10):
+    filled = max(0, min(width, int(round(fraction * width))))
+    return '▓' * filled + '░' * (width - filled)
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return 'Unknown'
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def describe_progress(event):
+    """Percent, sizes and speed from a yt-dlp progress event, or None if it has no numbers"""
+    downloaded = event.get('downloaded_bytes') or 0
+    total = event.get('total_bytes') or event.get('total_bytes_estimate')
+    if not total and event.get('fragment_count'):
+        # Fragmented streams only know how many pieces are done
+        fraction = (event.get('fragment_index') or 0) / event['fragment_count']
+    elif total:
+        fraction = downloaded / total
+    else:
+        return None
+    return {
+        'fraction': min(1.0, fraction),
+        'downloaded_mb': downloaded / (1024 * 1024),
+        'total_mb': total / (1024 * 1024) if total else None,
+        'speed_mb': (event.get('speed') or 0) / (1024 * 1024),
+        'eta': event.get('eta'),
+    }
+
+
+class ProgressEditor:
+    """Shared edit budget for every progress message.
+
+    Each message is edited at most once per min_interval, intermediate
+    updates are coalesced into the latest one, unchanged text is never
+    re-sent, and a RetryAfter from Telegram pauses all progress edits
+    until the flood wait is over.
+    """
+
+    def __init__(self, min_interval=3.0):
+        self.min_interval = min_interval
+        self.edits = 0
+        self.coalesced = 0
+        self.flood_waits = 0
+        self._paused_until = 0.0
+
+    def backoff_remaining(self):
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def tracker(self, message, parse_mode='Markdown'):
+        """Progress tracker for one message"""
+        return MessageProgress(self, message, parse_mode)
+
+    async def edit(self, message, text, **kwargs):
+        """Edit once, honouring the global flood backoff; False if Telegram asked us to wait"""
+        wait = self.backoff_remaining()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            await message.edit_text(text, **kwargs)
+        except RetryAfter as e:
+            seconds = retry_after_seconds(e)
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.flood_waits += 1
+            logger.warning(f"🐢 Telegram flood control, pausing progress edits for {seconds:.0f}s")
+            return False
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+        self.edits += 1
+        return True
+
+    async def finish(self, message, text, **kwargs):
+        """Final edit of a message, retried after any flood wait instead of being dropped"""
+        while not await self.edit(message, text, **kwargs):
+            pass
+
+    def stats(self):
+        return {
+            'edits': self.edits,
+            'coalesced': self.coalesced,
+            'flood_waits': self.flood_waits,
+            'backoff_remaining': round(self.backoff_remaining(), 1),
+        }
+
+
+class MessageProgress:
+    """Latest-wins progress updates for a single message"""
+
+    def __init__(self, editor, message, parse_mode='Markdown'):
+        self.editor = editor
+        self.message = message
+        self.parse_mode = parse_mode
+        self._last_text = getattr(message, 'text', None)
+        self._last_sent = 0.0
+        self._pending = None
+        self._task = None
+        self._closed = False
+
+    def update(self, text):
+        """Queue text for the message; newer text replaces anything not yet sent"""
+        if self._closed:
+            return
+        if text == self._last_text:
+            self._pending = None
+            return
+        if self._pending is not None:
+            self.editor.coalesced += 1
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        while self._pending is not None and not self._closed:
+            delay = max(
+                self._last_sent + self.editor.min_interval - time.monotonic(),
+                self.editor.backoff_remaining(),
+            )
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text, self._pending = self._pending, None
+            if text is None or text == self._last_text:
+                continue
+            try:
+                sent = await self.editor.edit(self.message, text, parse_mode=self.parse_mode)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to update progress message: {e}")
+                return
+            if sent:
+                self._last_text = text
+                self._last_sent = time.monotonic()
+            elif self._pending is None:
+                # Flood wait: retry this text unless something newer arrived meanwhile
+                self._pending = text
+
+    def close(self):
+        """Drop queued updates so a final edit can't be overwritten"""
+        self._closed = True
+        self._pending = None
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def finish(self, text, **kwargs):
+        """Replace any queued update with a final edit, sent as soon as flood control allows"""
+        self.close()
+        kwargs.setdefault('parse_mode', self.parse_mode)
+        await self.editor.finish(self.message, text, **kwargs)
+        self._last_text = text
+
+    def hook(self, render, min_interval=0.5):
+        """yt-dlp progress hook that renders events into this message from worker threads"""
+        loop = asyncio.get_running_loop()
+        last = [0.0]
+
+        def hook(event):
+            if event.get('status') not in ('downloading', 'finished'):
+                return
+            now = time.monotonic()
+            # Progress callbacks fire per chunk; only hand a few per second to the loop
+            if event['status'] == 'downloading' and now - last[0] < min_interval:
+                return
+            last[0] = now
+            try:
+                text = render(event)
+            except Exception as e:
+                logger.debug(f"Progress render failed: {e}")
+                return
+            if text:
+                loop.call_soon_threadsafe(self.update, text)
+
+        return hook
+
+
+class MessageRef:
+    """Just enough of a Message to edit or delete it by chat and message id"""
+
+    def __init__(self, bot, chat_id, message_id):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = None
+
+    async def edit_text(self, text, **kwargs):
+        return await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id, **kwargs)
+
+    async def delete(self):
+        return await self.bot.delete_message(chat_id=self.chat_id, message_id=self.message_id)
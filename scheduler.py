@@ -0,0 +1,117 @@
+# scheduler.py - Per-user fair scheduling for download jobs
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class FairScheduler:
+    """Round-robin admission across users with per-user and global in-flight caps"""
+
+    def __init__(self, max_active=4, per_user_limit=1):
+        self.max_active = max(1, max_active)
+        self.per_user_limit = max(1, per_user_limit)
+        self._waiters = OrderedDict()  # user_id -> deque of (future, enqueued_at, limit)
+        self._in_flight = {}
+        self._active = 0
+        self._wait_stats = {}  # user_id -> (last_wait, avg_wait)
+
+    @property
+    def queue_depth(self):
+        """Number of jobs waiting for a slot"""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    @property
+    def active(self):
+        """Number of jobs currently holding a slot"""
+        return self._active
+
+    def would_wait(self, user_id):
+        """True if a new job for this user could not start right away"""
+        return (
+            self._active >= self.max_active
+            or self._in_flight.get(user_id, 0) >= self.per_user_limit
+            or self.queue_depth > 0
+        )
+
+    def user_wait_time(self, user_id):
+        """Last and average queue wait in seconds for a user"""
+        last, avg = self._wait_stats.get(user_id, (0.0, 0.0))
+        return {'last': last, 'avg': avg}
+
+    async def acquire(self, user_id, limit=None):
+        """Wait for a fair slot and return the time spent queued.
+
+        limit overrides the per-user in-flight cap for this job, e.g. to let
+        a batch run a few items side by side. Users are still served
+        round-robin, one job per pass.
+        """
+        enqueued_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_id, deque()).append((future, enqueued_at, limit))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted right as we were cancelled
+                self.release(user_id)
+            else:
+                self._remove_waiter(user_id, future)
+            raise
+
+        waited = time.monotonic() - enqueued_at
+        _, avg = self._wait_stats.get(user_id, (0.0, waited))
+        self._wait_stats[user_id] = (waited, avg * 0.8 + waited * 0.2)
+        if waited > 1:
+            logger.info(f"⏳ User {user_id} waited {waited:.1f}s in queue (depth {self.queue_depth})")
+        return waited
+
+    def release(self, user_id):
+        """Free a slot held by the user and admit the next job"""
+        count = self._in_flight.get(user_id, 0) - 1
+        if count > 0:
+            self._in_flight[user_id] = count
+        else:
+            self._in_flight.pop(user_id, None)
+        self._active = max(0, self._active - 1)
+        self._dispatch()
+
+    def _remove_waiter(self, user_id, future):
+        waiters = self._waiters.get(user_id)
+        if not waiters:
+            return
+        for entry in list(waiters):
+            if entry[0] is future:
+                waiters.remove(entry)
+        if not waiters:
+            del self._waiters[user_id]
+
+    def _dispatch(self):
+        """Grant slots round-robin, one job per user per pass"""
+        progressed = True
+        while self._active < self.max_active and self._waiters and progressed:
+            progressed = False
+            for user_id in list(self._waiters):
+                if self._active >= self.max_active:
+                    break
+
+                waiters = self._waiters[user_id]
+                while waiters and waiters[0][0].done():
+                    waiters.popleft()
+                # A user at their in-flight cap is passed over, and goes to the back like a served one
+                if waiters and self._in_flight.get(user_id, 0) < (waiters[0][2] or self.per_user_limit):
+                    future, _, _ = waiters.popleft()
+                    self._in_flight[user_id] = self._in_flight.get(user_id, 0) + 1
+                    self._active += 1
+                    future.set_result(None)
+                    progressed = True
+
+                # Rotate the user to the back of the ring
+                if waiters:
+                    self._waiters.move_to_end(user_id)
+                else:
+                    del self._waiters[user_id]
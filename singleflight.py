@@ -0,0 +1,73 @@
+# singleflight.py - Coalesce concurrent downloads of the same media
+import asyncio
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """Handle the leading request uses to publish its outcome to waiters"""
+
+    def __init__(self, key, future):
+        self.key = key
+        self._future = future
+        self.followers = 0
+
+    def publish(self, result):
+        """Share a successful result with every waiting request"""
+        if not self._future.done():
+            self._future.set_result(result)
+
+    def fail(self, error):
+        """Share a failure with every waiting request"""
+        if not self._future.done():
+            self._future.set_exception(error)
+            # Nobody may be waiting; don't let asyncio log it as unretrieved
+            self._future.exception()
+
+
+class SingleFlight:
+    """Lets one request do the work for a key while concurrent requests wait for it"""
+
+    def __init__(self):
+        self._flights = {}
+
+    def in_flight(self, key):
+        return key in self._flights
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def wait(self, key):
+        """Wait for the leader of key; returns its result or raises its error"""
+        flight = self._flights.get(key)
+        if not flight:
+            return None
+        flight.followers += 1
+        logger.info(f"🔗 Joined in-flight download {key} ({flight.followers} waiting)")
+        # Shield so a cancelled follower doesn't cancel the shared result
+        return await asyncio.shield(flight._future)
+
+    @contextmanager
+    def lead(self, key):
+        """Register the caller as leader for key for the duration of the block"""
+        if key in self._flights:
+            # Someone else already leads this key; run unshared
+            yield Flight(key, asyncio.get_running_loop().create_future())
+            return
+
+        flight = Flight(key, asyncio.get_running_loop().create_future())
+        self._flights[key] = flight
+        try:
+            yield flight
+        except BaseException as e:
+            if isinstance(e, Exception):
+                flight.fail(e)
+            elif not flight._future.done():
+                flight._future.cancel()
+            raise
+        finally:
+            # Waiters fall back to their own download if nothing was published
+            flight.publish(None)
+            self._flights.pop(key, None)
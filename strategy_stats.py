@@ -0,0 +1,82 @@
+# strategy_stats.py - Reorder per-platform retry strategies by recent success
+import logging
+import time
+from collections import defaultdict, deque
+from statistics import median
+
+logger = logging.getLogger(__name__)
+
+
+class StrategySelector:
+    """Tracks success rate and latency per (platform, strategy) in a sliding window.
+
+    Outcomes are weighted by age (half-life decay) and dropped once they fall
+    out of the window, so a strategy that was blocked an hour ago gets a fresh
+    chance. Strategies without data keep their default position.
+    """
+
+    def __init__(self, window_size=50, max_age=3600, half_life=600, prior_weight=2.0, prior_rate=0.5):
+        self.window_size = window_size
+        self.max_age = max_age
+        self.half_life = half_life
+        self.prior_weight = prior_weight
+        self.prior_rate = prior_rate
+        self._outcomes = defaultdict(lambda: deque(maxlen=self.window_size))
+
+    def record(self, platform, strategy, success, latency):
+        """Remember how a strategy did for a platform"""
+        self._outcomes[(platform, strategy)].append((time.monotonic(), bool(success), latency))
+
+    def _prune(self, key, now):
+        outcomes = self._outcomes.get(key)
+        while outcomes and now - outcomes[0][0] > self.max_age:
+            outcomes.popleft()
+        return outcomes or ()
+
+    def score(self, platform, strategy, now=None):
+        """Decayed success rate, pulled towards the prior when data is thin"""
+        now = now or time.monotonic()
+        weight = successes = 0.0
+        for recorded_at, success, _ in self._prune((platform, strategy), now):
+            w = 0.5 ** ((now - recorded_at) / self.half_life)
+            weight += w
+            successes += w if success else 0.0
+        return (successes + self.prior_weight * self.prior_rate) / (weight + self.prior_weight)
+
+    def median_latency(self, platform, strategy):
+        """Median latency of recent successes, or None"""
+        latencies = [
+            latency for _, success, latency in self._prune((platform, strategy), time.monotonic())
+            if success
+        ]
+        return median(latencies) if latencies else None
+
+    def order(self, platform, strategies):
+        """Strategies sorted best-first; ties keep the default order"""
+        now = time.monotonic()
+
+        def key(item):
+            index, strategy = item
+            latency = self.median_latency(platform, strategy)
+            return (
+                -round(self.score(platform, strategy, now), 2),
+                latency if latency is not None else float('inf'),
+                index,
+            )
+
+        ordered = [strategy for _, strategy in sorted(enumerate(strategies), key=key)]
+        if ordered != list(strategies):
+            logger.info(f"📈 Reordered {platform} strategies: {ordered}")
+        return ordered
+
+    def stats(self):
+        """Snapshot of score and sample count per (platform, strategy)"""
+        now = time.monotonic()
+        return {
+            f"{platform}:{strategy}": {
+                'score': round(self.score(platform, strategy, now), 3),
+                'samples': len(self._prune((platform, strategy), now)),
+                'median_latency': self.median_latency(platform, strategy),
+            }
+            for platform, strategy in list(self._outcomes)
+        }
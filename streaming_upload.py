@@ -0,0 +1,140 @@
+# streaming_upload.py - Pipe a progressive media stream straight into a Telegram upload
+import asyncio
+import json
+import logging
+import uuid
+
+import httpx
+
+from probe import MediaTooLarge, is_progressive
+
+logger = logging.getLogger(__name__)
+
+# Only containers Telegram plays inline are worth streaming as video
+STREAMABLE_EXTS = {'mp4'}
+
+_END = object()
+
+
+def streamable_format(info, spec=None):
+    """The single progressive http(s) format to stream, or None if it needs yt-dlp"""
+    if not info or info.get('_type') == 'playlist':
+        return None
+
+    if spec:
+        if '+' in spec:
+            return None
+        fmt = next((f for f in info.get('formats') or [] if f.get('format_id') == spec), None)
+    elif info.get('requested_formats'):
+        return None
+    else:
+        fmt = info
+
+    if not fmt or not fmt.get('url') or fmt.get('protocol') not in ('http', 'https'):
+        return None
+    if fmt.get('ext') not in STREAMABLE_EXTS or not is_progressive(fmt):
+        return None
+    return fmt
+
+
+class StreamingUploader:
+    """Uploads media to sendVideo while it is still being downloaded.
+
+    A producer task reads the source in chunks into a bounded queue; the
+    multipart request body drains it. When Telegram is slower than the
+    source the queue fills and the producer waits, so memory stays at
+    roughly buffer_chunks * chunk_size.
+    """
+
+    def __init__(self, chunk_size=256 * 1024, buffer_chunks=16, timeout=600):
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=30), follow_redirects=True)
+
+    async def _produce(self, fmt, queue, max_bytes):
+        """Download the source into the queue, enforcing the size limit"""
+        headers = dict(fmt.get('http_headers') or {})
+        if fmt.get('cookie_header'):
+            # Built from yt-dlp's cookie jar at extraction time (see download_executor.add_cookie_headers)
+            headers['Cookie'] = fmt['cookie_header']
+        total = 0
+        try:
+            async with self._client.stream('GET', fmt['url'], headers=headers) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    total += len(chunk)
+                    if total > max_bytes:
+                        raise MediaTooLarge(total, max_bytes)
+                    await queue.put(chunk)
+            await queue.put(_END)
+        except Exception as e:
+            # Hand the failure to the consumer so the upload aborts too
+            await queue.put(e)
+            raise
+        return total
+
+    async def _body(self, queue, boundary, fields, filename):
+        """Multipart body: form fields, then the file part fed from the queue"""
+        preamble = []
+        for name, value in fields.items():
+            preamble.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            )
+        preamble.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="video"; filename="{filename}"\r\n'
+            f'Content-Type: video/mp4\r\n\r\n'
+        )
+        yield ''.join(preamble).encode('utf-8')
+
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+        yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+    async def send_video(self, base_url, chat_id, fmt, filename, max_bytes, caption=None,
+                         parse_mode=None, duration=None, supports_streaming=True):
+        """Stream fmt into sendVideo and return the resulting message as a dict"""
+        boundary = uuid.uuid4().hex
+        fields = {'chat_id': chat_id, 'supports_streaming': json.dumps(supports_streaming)}
+        if caption:
+            fields['caption'] = caption
+        if parse_mode:
+            fields['parse_mode'] = parse_mode
+        if duration:
+            fields['duration'] = duration
+
+        queue = asyncio.Queue(maxsize=self.buffer_chunks)
+        producer = asyncio.create_task(self._produce(fmt, queue, max_bytes))
+        try:
+            response = await self._client.post(
+                f"{base_url}/sendVideo",
+                content=self._body(queue, boundary, fields, filename),
+                headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+            )
+        except Exception:
+            # Prefer the source-side error (e.g. MediaTooLarge) over the aborted upload
+            if producer.done() and not producer.cancelled() and producer.exception():
+                raise producer.exception()
+            raise
+        finally:
+            if not producer.done():
+                producer.cancel()
+            # A cancelled producer must not look like this task being cancelled (that means shutdown)
+            await asyncio.gather(producer, return_exceptions=True)
+
+        data = response.json()
+        if not data.get('ok'):
+            raise Exception(f"Telegram rejected streamed upload: {data.get('description', response.status_code)}")
+        if producer.cancelled():
+            raise Exception("Telegram answered before the streamed upload was complete")
+        total = producer.result()
+        logger.info(f"📡 Streamed {total / (1024 * 1024):.1f} MB to chat {chat_id}")
+        return data['result']
+
+    async def close(self):
+        await self._client.aclose()
@@ -0,0 +1,254 @@
+# temp_storage.py - Disk quota, tmpfs staging and cleanup for download temp directories
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class StorageQuotaExceeded(Exception):
+    """A download's estimated size can never fit in the temp storage quota"""
+
+    def __init__(self, needed, quota):
+        self.needed = needed
+        self.quota = quota
+        super().__init__(f"Needs {needed / MB:.0f} MB of temp space but the quota is {quota / MB:.0f} MB")
+
+
+def free_bytes(path):
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+
+def tree_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def last_modified(path):
+    """Newest mtime of a directory and everything in it"""
+    newest = 0.0
+    for dirpath, _, filenames in os.walk(path):
+        for name in [dirpath] + [os.path.join(dirpath, filename) for filename in filenames]:
+            try:
+                newest = max(newest, os.path.getmtime(name))
+            except OSError:
+                pass
+    return newest
+
+
+def clear_dir(path):
+    for name in os.listdir(path):
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+
+
+class Workspace:
+    """One download's temp directory and the disk space reserved for it"""
+
+    def __init__(self, storage, path, staged=False, on_move=None):
+        self.storage = storage
+        self.path = path
+        self.staged = staged
+        self.on_move = on_move
+        self.reserved = 0
+
+    def files(self):
+        """Downloaded files, sorted by name"""
+        return sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if os.path.isfile(os.path.join(self.path, name))
+        )
+
+    async def clear(self):
+        """Delete a previous attempt's files, keeping the directory"""
+        await asyncio.to_thread(clear_dir, self.path)
+
+    async def reserve(self, estimate, on_wait=None):
+        await self.storage.reserve(self, estimate, on_wait)
+
+    async def release(self, keep=False):
+        await self.storage.release(self, keep)
+
+
+class TempStorage:
+    """Hands out download directories under a global disk quota.
+
+    reserve() waits until a download's estimated size fits both the quota
+    and the disk's actual free space (so other processes count too).
+    Downloads expected to be small are moved to a tmpfs staging directory
+    while it has room. Directories are deleted off the event loop, and
+    sweep() removes stale ones that a crashed or killed run left behind.
+    """
+
+    def __init__(self, root=None, quota=0, headroom=200 * MB, default_reserve=50 * MB, staging_root=None,
+                 staging_quota=128 * MB, staging_max_file=20 * MB, prefix='anylink-', max_age=6 * 3600,
+                 poll_interval=5.0):
+        self.root = root or tempfile.gettempdir()
+        os.makedirs(self.root, exist_ok=True)
+        if not quota:
+            # Default to most of what is free right now
+            free = free_bytes(self.root)
+            quota = int(free * 0.8) if free else float('inf')
+        self.quota = quota
+        self.headroom = headroom
+        self.default_reserve = default_reserve
+        self.staging_root = staging_root if staging_root and os.access(staging_root, os.W_OK) else None
+        self.staging_quota = staging_quota
+        self.staging_max_file = staging_max_file
+        self.prefix = prefix
+        self.max_age = max_age
+        self.poll_interval = poll_interval
+        self.reserved = 0
+        self.staging_reserved = 0
+        self.waiting = 0
+        self._active = {}
+        self._changed = asyncio.Condition()
+        staging = f", staging up to {staging_max_file / MB:.0f} MB files in {self.staging_root}" if self.staging_root else ''
+        logger.info(f"💾 Temp storage in {self.root}, quota {self.quota / MB:.0f} MB{staging}")
+
+    def create(self, reuse=None, on_move=None):
+        """A workspace in a fresh directory, or in reuse if it still exists (resumed job)"""
+        if reuse and os.path.isdir(reuse):
+            path = reuse
+        else:
+            path = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+        staged = bool(self.staging_root) and os.path.dirname(path) == self.staging_root
+        workspace = Workspace(self, path, staged, on_move)
+        self._active[path] = workspace
+        return workspace
+
+    def _fits(self, needed):
+        if self.reserved + needed > self.quota:
+            return False
+        free = free_bytes(self.root)
+        return free is None or free - needed >= self.headroom
+
+    def _staging_fits(self, needed):
+        if not self.staging_root or needed > self.staging_max_file:
+            return False
+        if self.staging_reserved + needed > self.staging_quota:
+            return False
+        free = free_bytes(self.staging_root)
+        return free is None or free >= needed
+
+    def _unreserve(self, workspace):
+        if workspace.staged:
+            self.staging_reserved -= workspace.reserved
+        else:
+            self.reserved -= workspace.reserved
+        workspace.reserved = 0
+
+    async def _move(self, workspace, staged):
+        """Point an empty workspace at a new directory on tmpfs or disk"""
+        path = tempfile.mkdtemp(prefix=self.prefix, dir=self.staging_root if staged else self.root)
+        os.rmdir(workspace.path)
+        self._active.pop(workspace.path, None)
+        self._active[path] = workspace
+        workspace.path = path
+        workspace.staged = staged
+        if workspace.on_move:
+            await workspace.on_move(path)
+
+    async def reserve(self, workspace, estimate, on_wait=None):
+        """Hold space for a download of about estimate bytes, waiting while the quota is used up.
+
+        A workspace reserves once per attempt; a new reservation replaces the
+        previous one. on_wait() is awaited once if the download has to wait.
+        """
+        needed = int(estimate) if estimate else self.default_reserve
+        self._unreserve(workspace)
+
+        # Only an empty directory can move; one with .part files stays where it is
+        staged = self._staging_fits(needed)
+        if staged != workspace.staged and not os.listdir(workspace.path):
+            await self._move(workspace, staged)
+        if workspace.staged:
+            self.staging_reserved += needed
+            workspace.reserved = needed
+            return
+
+        if needed > self.quota:
+            raise StorageQuotaExceeded(needed, self.quota)
+        if not self._fits(needed):
+            self.waiting += 1
+            logger.info(f"💾 Waiting for {needed / MB:.0f} MB of temp space ({self.reserved / MB:.0f} MB reserved)")
+            try:
+                if on_wait:
+                    await on_wait()
+                async with self._changed:
+                    while not self._fits(needed):
+                        try:
+                            # Free disk space can change without a release here, so re-check periodically
+                            await asyncio.wait_for(self._changed.wait(), self.poll_interval)
+                        except asyncio.TimeoutError:
+                            pass
+            finally:
+                self.waiting -= 1
+        self.reserved += needed
+        workspace.reserved = needed
+
+    async def release(self, workspace, keep=False):
+        """Give back a workspace's reservation and delete its directory unless keep is set"""
+        self._unreserve(workspace)
+        self._active.pop(workspace.path, None)
+        async with self._changed:
+            self._changed.notify_all()
+        if keep or not os.path.exists(workspace.path):
+            return
+        try:
+            await asyncio.to_thread(shutil.rmtree, workspace.path)
+            logger.info(f"🧹 Cleaned up temp directory: {workspace.path}")
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to clean temp directory: {e}")
+
+    def _roots(self):
+        return [root for root in (self.root, self.staging_root) if root]
+
+    def _directories(self):
+        for root in self._roots():
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith(self.prefix) and entry.is_dir(follow_symlinks=False):
+                    yield entry.path
+
+    def disk_usage(self):
+        """Bytes held by every temp directory, including ones no workspace owns"""
+        return sum(tree_size(path) for path in self._directories())
+
+    def sweep(self, keep=()):
+        """Delete directories untouched for max_age that no workspace or resumable job uses"""
+        keep = set(keep) | set(self._active)
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for path in self._directories():
+            if path in keep or last_modified(path) > cutoff:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def stats(self):
+        return {
+            'reserved': self.reserved,
+            'staging_reserved': self.staging_reserved,
+            'waiting': self.waiting,
+            'active': len(self._active),
+        }
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# main.py reads its configuration at import time; keep the tests off the network and the disk
+os.environ.setdefault('BOT_TOKEN', '123:abc')
+os.environ.setdefault('METRICS_PORT', '0')
+os.environ.setdefault('FILE_CACHE_PATH', '')
+os.environ.setdefault('JOB_QUEUE_PATH', '')
+os.environ.setdefault('INFO_CACHE_PATH', '')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
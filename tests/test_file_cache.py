@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from file_cache import FileIdCache, normalize_url, url_key
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.youtube.com/watch?v=abc&si=xyz&feature=share&t=30', 'https://youtube.com/watch?v=abc'),
+    ('https://youtu.be/abc?si=xyz', 'https://youtube.com/watch?v=abc'),
+    ('https://m.youtube.com/shorts/abc', 'https://youtube.com/watch?v=abc'),
+    ('https://x.com/user/status/1?s=20&t=abc', 'https://x.com/user/status/1'),
+    ('https://www.tiktok.com/@u/video/1?is_from_webapp=1&sender_device=pc', 'https://tiktok.com/@u/video/1'),
+    ('https://www.instagram.com/reel/abc/?igsh=xyz&utm_source=ig', 'https://instagram.com/reel/abc'),
+    ('https://example.com/v?b=2&a=1&utm_source=x', 'https://example.com/v?a=1&b=2'),
+])
+def test_normalize_url_strips_tracking(url, expected):
+    assert normalize_url(url) == expected
+
+
+@pytest.mark.parametrize('param', ['s', 't', 'ref', 'si'])
+def test_normalize_url_keeps_short_params_on_other_sites(param):
+    first = normalize_url(f'https://videos.example.com/watch?{param}=1')
+    second = normalize_url(f'https://videos.example.com/watch?{param}=2')
+    assert first != second
+
+
+def test_hit_and_invalidate_bad_file_id(tmp_path):
+    cache = FileIdCache(str(tmp_path / 'cache.sqlite3'))
+    keys = [url_key('https://youtu.be/abc'), 'id:youtube:abc']
+    cache.put(keys, 'file-1', title='Video', duration=10, file_size=1024)
+    assert cache.get(url_key('https://www.youtube.com/watch?v=abc&si=x'))['file_id'] == 'file-1'
+    assert cache.get(None, 'id:youtube:abc')['title'] == 'Video'
+
+    cache.invalidate('file-1')
+    assert cache.get(*keys) is None
+    cache.close()
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = FileIdCache(str(tmp_path / 'cache.sqlite3'), ttl=0.05)
+    cache.put(['key'], 'file-1')
+    time.sleep(0.1)
+    assert cache.get('key') is None
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = FileIdCache(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    cache.put(['a'], 'file-a')
+    time.sleep(0.01)
+    cache.put(['b'], 'file-b')
+    time.sleep(0.01)
+    cache.get('a')
+    time.sleep(0.01)
+    cache.put(['c'], 'file-c')
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+    cache.close()
@@ -0,0 +1,76 @@
+import pytest
+
+from format_selector import plan_download, select_format
+from probe import MediaTooLarge
+
+MB = 1024 * 1024
+LIMIT = 50 * MB
+
+
+def progressive(format_id, height, ext='mp4', **size):
+    return dict(format_id=format_id, height=height, ext=ext, vcodec='avc1', acodec='mp4a', **size)
+
+
+def video_only(format_id, height, ext='mp4', **size):
+    return dict(format_id=format_id, height=height, ext=ext, vcodec='avc1', acodec='none', **size)
+
+
+def audio_only(format_id, ext='m4a', **size):
+    return dict(format_id=format_id, ext=ext, vcodec='none', acodec='mp4a', **size)
+
+
+@pytest.mark.parametrize('formats, duration, expected', [
+    # Exact sizes
+    ([progressive('18', 360, filesize=10 * MB), progressive('22', 720, filesize=40 * MB)], 60, '22'),
+    ([progressive('18', 360, filesize=10 * MB), progressive('22', 720, filesize=60 * MB)], 60, '18'),
+    # Only filesize_approx
+    ([progressive('18', 360, filesize_approx=10 * MB), progressive('22', 720, filesize_approx=60 * MB)], 60, '18'),
+    ([progressive('22', 720, filesize_approx=45 * MB)], 60, '22'),
+    # Only tbr x duration: 2000 kbit/s for 120 s is 30 MB, 8000 kbit/s is 120 MB
+    ([progressive('low', 480, tbr=2000), progressive('high', 1080, tbr=8000)], 120, 'low'),
+    ([progressive('high', 1080, tbr=8000)], 30, 'high'),
+    # vbr + abr when tbr is missing
+    ([progressive('v', 720, vbr=3000, abr=128)], 60, 'v'),
+    # Video-only formats are paired with the best audio that fits the container
+    ([video_only('137', 1080, tbr=3000), audio_only('140', tbr=128), audio_only('251', ext='webm', tbr=160)],
+     60, '137+140'),
+])
+def test_select_format(formats, duration, expected):
+    choice = select_format({'formats': formats, 'duration': duration}, LIMIT)
+    assert choice.spec == expected
+
+
+def test_unknown_sizes_are_not_selected():
+    info = {'formats': [progressive('18', 360)], 'duration': None}
+    assert select_format(info, LIMIT) is None
+    # ...and plan_download leaves the choice to yt-dlp instead of rejecting
+    assert plan_download(info, LIMIT) is None
+
+
+def test_max_height_prefers_formats_within_it_but_falls_back():
+    formats = [progressive('22', 720, filesize=20 * MB), progressive('37', 1080, filesize=30 * MB)]
+    assert select_format({'formats': formats}, LIMIT, max_height=720).spec == '22'
+    assert select_format({'formats': formats[1:]}, LIMIT, max_height=720).spec == '37'
+
+
+def test_nothing_fits_raises_media_too_large_with_selected_size():
+    info = {
+        'title': 'Long video',
+        'duration': 600,
+        'formats': [progressive('18', 360, tbr=1000), progressive('22', 720, filesize_approx=200 * MB)],
+        'filesize_approx': 200 * MB,
+    }
+    assert select_format(info, LIMIT) is None
+    with pytest.raises(MediaTooLarge) as raised:
+        plan_download(info, LIMIT)
+    assert raised.value.size == 200 * MB
+    assert raised.value.title == 'Long video'
+
+
+def test_nothing_fits_but_selected_size_unknown_keeps_yt_dlp_selection():
+    info = {'duration': 600, 'formats': [progressive('22', 720, filesize=200 * MB)]}
+    assert plan_download(info, LIMIT) is None
+
+
+def test_playlists_are_left_to_yt_dlp():
+    assert plan_download({'_type': 'playlist', 'entries': []}, LIMIT) is None
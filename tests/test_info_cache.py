@@ -0,0 +1,83 @@
+import sqlite3
+import time
+
+from info_cache import InfoCache
+
+URL = 'https://www.youtube.com/watch?v=abc'
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = InfoCache(ttl=60)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    cache.put_info(URL, 'youtube', 'default', {'id': 'abc'})
+    assert cache.get_info(URL, 'youtube', ['default']) == ('default', {'id': 'abc'})
+
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.get_info(URL, 'youtube', ['default']) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_failure_ttl_zero_turns_failures_off():
+    cache = InfoCache(failure_ttl=0)
+    cache.put_failure(URL, 'Private video')
+    assert cache.get_failure(URL) is None
+
+    cache = InfoCache()
+    cache.put_failure(URL, 'Private video')
+    assert cache.get_failure(URL) == 'Private video'
+
+
+def test_memory_evicts_least_recently_used():
+    cache = InfoCache(max_entries=2)
+    for video in ('a', 'b'):
+        cache.put_info(f"https://youtu.be/{video}", 'youtube', 'default', {'id': video})
+    assert cache.get_info('https://youtu.be/a', 'youtube', ['default'])
+    cache.put_info('https://youtu.be/c', 'youtube', 'default', {'id': 'c'})
+
+    assert cache.stats()['entries'] == 2
+    assert cache.get_info('https://youtu.be/b', 'youtube', ['default']) is None
+    assert cache.get_info('https://youtu.be/a', 'youtube', ['default'])
+    assert cache.get_info('https://youtu.be/c', 'youtube', ['default'])
+
+
+def test_memory_miss_falls_back_to_sqlite(tmp_path):
+    path = str(tmp_path / 'info.sqlite3')
+    writer = InfoCache(path=path, max_entries=1)
+    writer.put_info(URL, 'youtube', 'android', {'id': 'abc', 'formats': []})
+    writer.put_info('https://youtu.be/other', 'youtube', 'default', {'id': 'other'})
+    writer.close()
+
+    reader = InfoCache(path=path)
+    assert reader.stats()['entries'] == 0
+    assert reader.get_info(URL, 'youtube', ['default', 'android']) == ('android', {'id': 'abc', 'formats': []})
+    assert reader.stats()['entries'] == 1
+    reader.close()
+
+
+def test_get_info_reads_every_strategy_in_one_query(tmp_path):
+    path = str(tmp_path / 'info.sqlite3')
+    cache = InfoCache(path=path)
+    cache.put_info(URL, 'youtube', 'web', {'id': 'web'})
+    cache.put_info(URL, 'youtube', 'ios', {'id': 'ios'})
+    cache._memory.clear()
+
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    assert cache.get_info(URL, 'youtube', ['default', 'web', 'ios']) == ('web', {'id': 'web'})
+    assert len([sql for sql in statements if sql.startswith('SELECT')]) == 1
+
+    statements.clear()
+    assert cache.get_info(URL, 'youtube', ['web']) == ('web', {'id': 'web'})
+    assert statements == []
+    cache.close()
+
+
+def test_drop_info_removes_stale_metadata_from_disk(tmp_path):
+    path = str(tmp_path / 'info.sqlite3')
+    cache = InfoCache(path=path)
+    cache.put_info(URL, 'youtube', 'default', {'id': 'abc'})
+    cache.drop_info(URL, 'youtube', 'default')
+    assert cache.get_info(URL, 'youtube', ['default']) is None
+    assert sqlite3.connect(path).execute('SELECT COUNT(*) FROM entries').fetchone()[0] == 0
+    cache.close()
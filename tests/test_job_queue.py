@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+
+from job_queue import DONE, FAILED, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    yield queue
+    queue.close()
+
+
+def add(queue, user_id=1, url='https://youtu.be/a'):
+    return queue.add(chat_id=user_id, user_id=user_id, url=url, platform='youtube')
+
+
+def test_claim_takes_queued_jobs_once(queue):
+    job = add(queue)
+    claimed = queue.claim('worker-1', lease=60)
+    assert claimed['id'] == job['id']
+    assert claimed['worker'] == 'worker-1'
+    assert claimed['resumes'] == 0
+    assert queue.claim('worker-2', lease=60) is None
+
+
+def test_live_lease_is_not_stolen(queue):
+    add(queue)
+    queue.claim('worker-1', lease=60)
+    queue.heartbeat('worker-1', [1], lease=60)
+    assert queue.claim('worker-2', lease=60) is None
+
+
+def test_expired_lease_is_claimed_again_as_a_resume(queue):
+    job = add(queue)
+    queue.claim('worker-1', lease=0.05)
+    queue.update(job['id'], stage='downloading')
+    time.sleep(0.1)
+    claimed = queue.claim('worker-2', lease=60)
+    assert claimed['id'] == job['id']
+    assert claimed['worker'] == 'worker-2'
+    assert claimed['resumes'] == 1
+    assert queue.get(job['id'])['worker'] == 'worker-2'
+
+
+def test_heartbeat_only_extends_own_leases(queue):
+    job = add(queue)
+    queue.claim('worker-1', lease=0.05)
+    queue.heartbeat('worker-2', [job['id']], lease=60)
+    time.sleep(0.1)
+    assert queue.claim('worker-2', lease=60)['id'] == job['id']
+
+
+def test_released_jobs_can_be_claimed_right_away(queue):
+    job = add(queue)
+    queue.claim('worker-1', lease=60)
+    queue.update(job['id'], stage='downloading')
+    assert queue.release('worker-1') == 1
+    # It had started, so picking it up again is a resume
+    assert queue.claim('worker-2', lease=60)['resumes'] == 1
+
+
+def test_finished_jobs_are_never_claimed(queue):
+    done = add(queue)
+    failed = add(queue, user_id=2)
+    queue.finish(done['id'])
+    queue.finish(failed['id'], 'boom')
+    assert queue.claim('worker-1', lease=60) is None
+    assert queue.get(done['id'])['stage'] == DONE
+    assert queue.get(failed['id'])['stage'] == FAILED
+    assert queue.get(failed['id'])['error'] == 'boom'
+
+
+def test_users_with_fewest_running_jobs_go_first(queue):
+    add(queue, user_id=1, url='https://youtu.be/a')
+    add(queue, user_id=1, url='https://youtu.be/b')
+    add(queue, user_id=2, url='https://youtu.be/c')
+    assert queue.claim('worker-1', lease=60)['user_id'] == 1
+    assert queue.claim('worker-1', lease=60)['user_id'] == 2
+
+
+def test_too_many_restarts_fail_the_job(tmp_path):
+    import main
+
+    bot = main.MultiPlatformDownloaderBot()
+    bot.job_queue = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    job = add(bot.job_queue)
+    # Every claim whose lease ran out counts as a restart
+    for _ in range(main.JOB_MAX_RESUMES + 1):
+        bot.job_queue.claim('crashed-worker', lease=-1)
+    assert bot.job_queue.get(job['id'])['resumes'] == main.JOB_MAX_RESUMES
+
+    started = []
+    bot.start_job = lambda *args, **kwargs: started.append(args)
+
+    async def scenario():
+        task = asyncio.create_task(bot.claim_jobs())
+        for _ in range(100):
+            if bot.job_queue.get(job['id'])['stage'] == FAILED:
+                break
+            await asyncio.sleep(0.01)
+        bot.draining = True
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    finished = bot.job_queue.get(job['id'])
+    assert finished['stage'] == FAILED
+    assert finished['error'] == 'Interrupted by too many restarts'
+    assert not started
+    bot.job_queue.close()
@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+
+def test_scrape_reads_cached_disk_usage_computed_off_the_loop():
+    import main
+
+    bot = main.MultiPlatformDownloaderBot()
+    threads = []
+
+    def disk_usage():
+        threads.append(threading.current_thread())
+        return 1234
+
+    bot.temp_storage.disk_usage = disk_usage
+    assert 'anylink_temp_disk_bytes 0' in bot.metrics.render()
+    assert not threads
+
+    async def refresh_once():
+        task = asyncio.create_task(bot.refresh_metrics())
+        while not bot.slow_gauges['temp_disk_bytes']:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(refresh_once())
+    assert threads[0] is not threading.main_thread()
+    assert 'anylink_temp_disk_bytes 1234' in bot.metrics.render()
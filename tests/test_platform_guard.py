@@ -0,0 +1,137 @@
+import asyncio
+import tempfile
+import time
+
+import pytest
+
+from platform_guard import CircuitOpen, PlatformGuard, RateLimited
+from probe import MediaTooLarge
+
+
+def half_open(guard, platform):
+    """Open the platform's circuit with its cooldown already over, so the next call is the probe"""
+    breaker = guard._breaker(platform)
+    breaker.state = 'open'
+    breaker.reason = 'Sign in to confirm you are not a bot'
+    breaker._opened_at = time.monotonic() - breaker.cooldown - 1
+    return breaker
+
+
+class Workspace:
+    def __init__(self, path):
+        self.path = path
+
+    async def clear(self):
+        pass
+
+    async def reserve(self, size, on_wait=None):
+        pass
+
+    def files(self):
+        return []
+
+
+@pytest.fixture
+def bot():
+    import main
+    return main.MultiPlatformDownloaderBot()
+
+
+def test_probe_slot_is_exclusive_until_released():
+    async def scenario():
+        guard = PlatformGuard(default_rate=1000, burst=10)
+        half_open(guard, 'youtube')
+        token = await guard.acquire('youtube')
+        assert token
+        with pytest.raises(CircuitOpen):
+            await guard.acquire('youtube')
+        guard.release_probe('youtube', token)
+        assert guard.blocked('youtube') is None
+        assert await guard.acquire('youtube')
+
+    asyncio.run(scenario())
+
+
+def test_stale_token_does_not_release_newer_probe():
+    async def scenario():
+        guard = PlatformGuard(default_rate=1000, burst=10)
+        breaker = half_open(guard, 'youtube')
+        old = await guard.acquire('youtube')
+        guard.release_probe('youtube', old)
+        new = await guard.acquire('youtube')
+        guard.release_probe('youtube', old)
+        assert breaker._probing
+        guard.release_probe('youtube', new)
+        assert not breaker._probing
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_acquire_releases_probe():
+    async def scenario():
+        guard = PlatformGuard(default_rate=1000, burst=10, backoff_max=60)
+        half_open(guard, 'youtube')
+        guard._backoff('youtube')._resume_at = time.monotonic() + 30
+        task = asyncio.create_task(guard.acquire('youtube'))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert guard.blocked('youtube') is None
+
+    asyncio.run(scenario())
+
+
+def test_long_backoff_is_reported_as_rate_limit_with_retry_time():
+    async def scenario():
+        guard = PlatformGuard(default_rate=1000, burst=10, backoff_max=60)
+        half_open(guard, 'youtube')
+        backoff = guard._backoff('youtube')
+        backoff.reason = 'HTTP Error 429: Too Many Requests'
+        backoff._resume_at = time.monotonic() + 300
+        with pytest.raises(RateLimited, match=r'try again in 5 min'):
+            await guard.acquire('youtube')
+        assert guard.blocked('youtube') is None
+
+    asyncio.run(scenario())
+
+
+def test_fetch_media_gives_probe_back_on_media_too_large(bot):
+    async def extract(platform, url, ydl_opts, download=False):
+        raise MediaTooLarge(3 * 1024 ** 3, 50 * 1024 ** 2)
+
+    async def scenario():
+        half_open(bot.platform_guard, 'youtube')
+        bot.download_executor.extract = extract
+        with tempfile.TemporaryDirectory() as path:
+            with pytest.raises(MediaTooLarge):
+                await bot.fetch_media('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'youtube', Workspace(path))
+        assert bot.platform_guard.blocked('youtube') is None
+
+    asyncio.run(scenario())
+
+
+def test_fetch_media_gives_probe_back_when_cancelled(bot):
+    started = None
+
+    async def extract(platform, url, ydl_opts, download=False):
+        started.set()
+        await asyncio.sleep(60)
+
+    async def scenario():
+        nonlocal started
+        started = asyncio.Event()
+        half_open(bot.platform_guard, 'youtube')
+        bot.download_executor.extract = extract
+        with tempfile.TemporaryDirectory() as path:
+            task = asyncio.create_task(
+                bot.fetch_media('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'youtube', Workspace(path))
+            )
+            await started.wait()
+            assert bot.platform_guard.blocked('youtube') is not None
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert bot.platform_guard.blocked('youtube') is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,51 @@
+import pytest
+
+from platforms import Platform, PlatformRegistry, extract_urls
+
+
+@pytest.fixture
+def registry():
+    registry = PlatformRegistry(fallback=Platform('unknown', []))
+    registry.register(Platform('youtube', ['youtube.com', 'youtu.be']))
+    registry.register(Platform('tiktok', ['tiktok.com']))
+    registry.register(Platform('twitter', ['twitter.com', 'x.com']))
+    return registry
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://youtube.com/watch?v=a', 'youtube'),
+    ('https://www.youtube.com/watch?v=a', 'youtube'),
+    ('https://m.youtube.com/watch?v=a', 'youtube'),
+    ('https://music.youtube.com/watch?v=a', 'youtube'),
+    ('https://youtu.be/a', 'youtube'),
+    ('https://vm.tiktok.com/abc/', 'tiktok'),
+    ('https://x.com/user/status/1', 'twitter'),
+    # Uppercase hosts, ports, trailing dots and missing schemes
+    ('https://WWW.YouTube.COM/watch?v=a', 'youtube'),
+    ('https://www.youtube.com:443/watch?v=a', 'youtube'),
+    ('http://tiktok.com:8080/@u/video/1', 'tiktok'),
+    ('https://youtube.com./watch?v=a', 'youtube'),
+    ('www.youtube.com/watch?v=a', 'youtube'),
+    # Look-alike hosts must not match
+    ('https://notyoutube.com/watch?v=a', 'unknown'),
+    ('https://youtube.com.evil.example/watch?v=a', 'unknown'),
+    ('https://mx.com/a', 'unknown'),
+    ('https://example.com/youtube.com', 'unknown'),
+    ('not a url', 'unknown'),
+    ('https://[bad/', 'unknown'),
+])
+def test_for_url(registry, url, expected):
+    assert registry.for_url(url).name == expected
+
+
+def test_bare_suffix_is_not_a_host(registry):
+    registry.register(Platform('generic', ['com']))
+    assert registry.for_url('https://example.com/a').name == 'unknown'
+
+
+def test_looks_like_url_and_extract_urls(registry):
+    assert registry.looks_like_url('see https://example.com/a')
+    assert not registry.looks_like_url('just some text')
+    assert extract_urls('a https://x.com/1 b https://x.com/1 c https://youtu.be/a') == [
+        'https://x.com/1', 'https://youtu.be/a'
+    ]
@@ -0,0 +1,42 @@
+import asyncio
+
+from scheduler import FairScheduler
+
+
+def test_user_at_limit_is_rotated_behind_waiting_users():
+    async def scenario():
+        scheduler = FairScheduler(max_active=2, per_user_limit=1)
+        order = []
+        await scheduler.acquire('A')  # A0 and another user's job fill both slots
+        await scheduler.acquire('X')
+
+        async def job(name):
+            await scheduler.acquire(name[0])
+            order.append(name)
+
+        tasks = [asyncio.create_task(job(name)) for name in ('A1', 'B0', 'B1', 'C0')]
+        await asyncio.sleep(0)
+        scheduler.release('X')  # A is at its limit, so B0 runs and A goes behind C
+        await asyncio.sleep(0)
+        for user in ('A', 'B', 'C'):
+            scheduler.release(user)
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ['B0', 'C0', 'A1', 'B1']
+
+
+def test_wait_time_is_returned_and_remembered_per_user():
+    async def scenario():
+        scheduler = FairScheduler(max_active=1, per_user_limit=1)
+        assert await scheduler.acquire('A') < 0.05
+        waiter = asyncio.create_task(scheduler.acquire('B'))
+        await asyncio.sleep(0.1)
+        scheduler.release('A')
+        waited = await waiter
+        assert waited >= 0.1
+        assert scheduler.user_wait_time('B')['last'] == waited
+        assert scheduler.user_wait_time('A')['last'] < 0.05
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from download_executor import DownloadQueueFull
+
+
+class Bot:
+    async def edit_message_text(self, text, **kwargs):
+        return None
+
+    async def delete_message(self, **kwargs):
+        return None
+
+
+def job(url):
+    return {
+        'id': None, 'user_id': 1, 'chat_id': 1, 'url': url, 'platform': 'youtube',
+        'status_message_id': 1, 'resumes': 0, 'temp_dir': None, 'stage': None,
+    }
+
+
+def test_followers_share_a_queue_full_failure():
+    import main
+
+    bot = main.MultiPlatformDownloaderBot()
+
+    async def fetch_media(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        raise DownloadQueueFull("Download queue is full (20 jobs)")
+
+    bot.fetch_media = fetch_media
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+    async def scenario():
+        leader = asyncio.create_task(bot.run_job(Bot(), job(url)))
+        await asyncio.sleep(0)
+        assert bot.inflight.in_flight(main.url_key(url))
+        follower = asyncio.create_task(bot.inflight.wait(main.url_key(url)))
+        await leader
+        with pytest.raises(DownloadQueueFull):
+            await follower
+
+    asyncio.run(scenario())
@@ -0,0 +1,54 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+from telegram.error import BadRequest, TimedOut
+
+from progress import MessageRef
+
+
+class Bot:
+    async def edit_message_text(self, text, **kwargs):
+        raise BadRequest("Message to edit not found")
+
+
+def test_final_status_edit_of_a_deleted_message_does_not_raise():
+    import main
+
+    bot = main.MultiPlatformDownloaderBot()
+    message = MessageRef(Bot(), 1, 1)
+    asyncio.run(bot.show_download_success(message, 'youtube'))
+
+
+class TimingOutBot:
+    async def edit_message_text(self, text, **kwargs):
+        raise TimedOut()
+
+
+def test_final_status_timeout_keeps_delivered_job_done(tmp_path):
+    import main
+
+    bot = main.MultiPlatformDownloaderBot()
+    bot.file_cache = None
+
+    async def fetch_media(url, platform, workspace, **kwargs):
+        path = os.path.join(workspace.path, 'video.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 4096)
+        return {
+            'info': {'id': 'abc', 'extractor_key': 'Youtube'}, 'ydl_opts': {}, 'file_path': path,
+            'stream_format': None, 'title': 'Video', 'duration': 10, 'uploader': 'Someone',
+        }
+
+    async def upload_video(*args):
+        return SimpleNamespace(video=SimpleNamespace(file_id='file-id'), document=None)
+
+    bot.fetch_media = fetch_media
+    bot.upload_video = upload_video
+    job = {
+        'id': None, 'user_id': 1, 'chat_id': 1, 'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'platform': 'youtube', 'status_message_id': 1, 'resumes': 0, 'temp_dir': None, 'stage': None,
+    }
+    asyncio.run(bot.process_download(TimingOutBot(), job))
+    assert job['stage'] == main.DONE
+    assert bot.downloads_total._values == {('youtube', 'success'): 1}
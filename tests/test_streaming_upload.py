@@ -0,0 +1,99 @@
+import asyncio
+import http.cookiejar
+
+import httpx
+import pytest
+import yt_dlp
+
+from download_executor import add_cookie_headers
+from streaming_upload import StreamingUploader
+
+
+def cookie(name, value, domain):
+    return http.cookiejar.Cookie(
+        0, name, value, None, False, domain, True, domain.startswith('.'), '/', False, False,
+        None, False, None, None, {},
+    )
+
+
+def test_cookie_header_comes_from_the_jar():
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        ydl.cookiejar.set_cookie(cookie('session', 'abc', '.example.com'))
+        ydl.cookiejar.set_cookie(cookie('other', 'xyz', '.example.org'))
+        url = 'https://cdn.example.com/video.mp4'
+        info = {
+            'url': url, 'protocol': 'https',
+            'cookies': 'session=abc; Domain=.example.com; Path=/; Expires=0',
+            'formats': [{'url': url, 'protocol': 'https', 'cookies': 'session=abc; Domain=.example.com'}],
+        }
+        add_cookie_headers(ydl, info)
+    assert info['cookie_header'] == 'session=abc'
+    assert info['formats'][0]['cookie_header'] == 'session=abc'
+
+
+def test_stream_sends_cookie_header_not_set_cookie_string():
+    seen = {}
+
+    def handler(request):
+        seen['cookie'] = request.headers.get('cookie')
+        return httpx.Response(200, content=b'x' * 10)
+
+    async def scenario():
+        uploader = StreamingUploader()
+        uploader._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        fmt = {
+            'url': 'https://cdn.example.com/video.mp4',
+            'cookies': 'session=abc; Domain=.example.com; Path=/',
+            'cookie_header': 'session=abc',
+        }
+        queue = asyncio.Queue()
+        await uploader._produce(fmt, queue, 100)
+        await uploader.close()
+
+    asyncio.run(scenario())
+    assert seen['cookie'] == 'session=abc'
+
+
+class PartialTransport(httpx.AsyncBaseTransport):
+    """Serves the source, and reads only the start of the upload body before telegram() answers"""
+
+    def __init__(self, telegram):
+        self.telegram = telegram
+
+    async def handle_async_request(self, request):
+        if request.url.host == 'cdn.example.com':
+            return httpx.Response(200, content=b'x' * (1024 * 1024))
+        body = request.stream.__aiter__()
+        await body.__anext__()
+        await body.__anext__()
+        return self.telegram()
+
+
+def stream(telegram):
+    async def scenario():
+        uploader = StreamingUploader(chunk_size=1024, buffer_chunks=2)
+        uploader._client = httpx.AsyncClient(transport=PartialTransport(telegram))
+        try:
+            return await uploader.send_video(
+                'https://api.telegram.org/bot123:abc', 1, {'url': 'https://cdn.example.com/video.mp4'},
+                'video.mp4', max_bytes=10 * 1024 * 1024,
+            )
+        finally:
+            await uploader.close()
+    return asyncio.run(scenario())
+
+
+def test_upload_rejected_part_way_is_an_error_not_a_cancellation():
+    def telegram():
+        return httpx.Response(413, json={'ok': False, 'description': 'Request Entity Too Large'})
+
+    with pytest.raises(Exception, match='Request Entity Too Large'):
+        stream(telegram)
+
+
+def test_upload_connection_lost_part_way_is_an_error_not_a_cancellation():
+    def telegram():
+        raise httpx.WriteError("connection reset")
+
+    with pytest.raises(httpx.WriteError):
+        stream(telegram)
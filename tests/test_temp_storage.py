@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from temp_storage import MB, StorageQuotaExceeded, TempStorage
+
+
+def storage(tmp_path, **kwargs):
+    kwargs.setdefault('quota', 10 * MB)
+    return TempStorage(root=str(tmp_path / 'root'), headroom=0, poll_interval=0.05, **kwargs)
+
+
+def make_stale(path, age=7 * 3600):
+    then = time.time() - age
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            os.utime(os.path.join(dirpath, name), (then, then))
+        os.utime(dirpath, (then, then))
+
+
+def test_reservation_over_quota_raises(tmp_path):
+    temp = storage(tmp_path)
+    workspace = temp.create()
+    with pytest.raises(StorageQuotaExceeded):
+        asyncio.run(workspace.reserve(20 * MB))
+    assert temp.reserved == 0
+
+
+def test_release_returns_bytes_to_waiting_download(tmp_path):
+    temp = storage(tmp_path)
+
+    async def scenario():
+        first, second = temp.create(), temp.create()
+        await first.reserve(6 * MB)
+        assert temp.reserved == 6 * MB
+
+        waits = []
+
+        async def on_wait():
+            waits.append(True)
+
+        waiter = asyncio.create_task(second.reserve(6 * MB, on_wait=on_wait))
+        await asyncio.sleep(0.01)
+        assert not waiter.done() and waits and temp.waiting == 1
+
+        await first.release()
+        await asyncio.wait_for(waiter, 1)
+        assert temp.reserved == 6 * MB and temp.waiting == 0
+        assert not os.path.exists(first.path)
+
+        await second.release()
+        assert temp.reserved == 0
+
+    asyncio.run(scenario())
+
+
+def test_new_reservation_replaces_the_previous_one(tmp_path):
+    temp = storage(tmp_path)
+
+    async def scenario():
+        workspace = temp.create()
+        await workspace.reserve(4 * MB)
+        await workspace.reserve(8 * MB)
+        assert temp.reserved == 8 * MB
+        await workspace.release(keep=True)
+        assert temp.reserved == 0 and os.path.isdir(workspace.path)
+
+    asyncio.run(scenario())
+
+
+def test_small_downloads_are_staged_on_tmpfs(tmp_path):
+    staging = tmp_path / 'shm'
+    staging.mkdir()
+    temp = storage(tmp_path, staging_root=str(staging), staging_quota=4 * MB, staging_max_file=2 * MB)
+
+    async def scenario():
+        small, large = temp.create(), temp.create()
+        await small.reserve(1 * MB)
+        await large.reserve(3 * MB)
+        assert small.staged and os.path.dirname(small.path) == str(staging)
+        assert not large.staged
+        assert temp.staging_reserved == 1 * MB and temp.reserved == 3 * MB
+
+    asyncio.run(scenario())
+
+
+def test_sweep_removes_only_stale_directories_nobody_owns(tmp_path):
+    temp = storage(tmp_path, max_age=3600)
+    root = tmp_path / 'root'
+    active = temp.create()
+    stale, fresh, kept, foreign = (root / name for name in ('anylink-stale', 'anylink-fresh', 'anylink-kept', 'other'))
+    for path in (stale, fresh, kept, foreign):
+        path.mkdir()
+        (path / 'video.part').write_bytes(b'x')
+    for path in (active.path, stale, kept, foreign):
+        make_stale(path)
+
+    assert temp.sweep(keep=[str(kept)]) == 1
+    assert not stale.exists()
+    assert fresh.exists() and kept.exists() and foreign.exists() and os.path.isdir(active.path)
+    assert temp.disk_usage() == 2
@@ -0,0 +1,47 @@
+import asyncio
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+import transcode
+from temp_storage import StorageQuotaExceeded
+from transcode import TranscodeError, probe_media
+
+
+def test_probe_media_timeout_is_a_transcode_error(monkeypatch):
+    def run(args, **kwargs):
+        raise subprocess.TimeoutExpired(args, kwargs.get('timeout'))
+
+    monkeypatch.setattr(transcode.subprocess, 'run', run)
+    with pytest.raises(TranscodeError, match='timed out'):
+        probe_media('ffprobe', 'video.mkv')
+
+
+def test_probe_media_garbage_output_is_a_transcode_error(monkeypatch):
+    def run(args, **kwargs):
+        return SimpleNamespace(returncode=0, stdout=b'not json', stderr=b'')
+
+    monkeypatch.setattr(transcode.subprocess, 'run', run)
+    with pytest.raises(TranscodeError):
+        probe_media('ffprobe', 'video.mkv')
+
+
+def test_prepare_for_upload_keeps_original_without_disk_space(tmp_path):
+    import main
+
+    class Workspace:
+        async def reserve(self, size, on_wait=None):
+            raise StorageQuotaExceeded(size, 1)
+
+    class Transcoder:
+        async def compress(self, path, size_limit, duration=None):
+            raise AssertionError("compress ran without disk space")
+
+    video = tmp_path / 'video.mp4'
+    with open(video, 'wb') as f:
+        f.truncate(main.MAX_FILE_SIZE + 1)
+    bot = main.MultiPlatformDownloaderBot()
+    bot.transcoder = Transcoder()
+    prepared = asyncio.run(bot.prepare_for_upload(Workspace(), str(video), 60, 'youtube'))
+    assert prepared == str(video)
@@ -0,0 +1,70 @@
+import gc
+import weakref
+
+import yt_dlp
+from yt_dlp.networking.common import RequestDirector
+
+import ydl_pool
+from ydl_pool import YDLPool
+
+
+OPTS = {'quiet': True, 'no_warnings': True, 'socket_timeout': 7}
+
+
+def test_yt_dlp_internals_are_where_the_pool_expects_them():
+    assert ydl_pool.internals_supported()
+    ydl = yt_dlp.YoutubeDL(OPTS)
+    assert isinstance(ydl._ies, dict) and ydl._ies
+    jar = ydl.cookiejar
+    assert ydl.__dict__['cookiejar'] is jar
+    director = ydl._request_director
+    assert ydl.__dict__['_request_director'] is director
+    assert isinstance(director, RequestDirector)
+    assert hasattr(director, 'logger')
+    assert director.handlers
+    for handler in director.handlers.values():
+        assert handler.cookiejar is jar
+        assert handler.timeout == 7.0
+        for attribute in ('headers', '_logger'):
+            assert hasattr(handler, attribute)
+    director.close()
+
+
+def test_session_is_reused_with_this_jobs_logger_and_settings():
+    pool = YDLPool(max_idle=2)
+    with pool.session('youtube', dict(OPTS)) as first:
+        director = first._request_director
+    with pool.session('youtube', dict(OPTS, socket_timeout=3)) as second:
+        assert second._request_director is director
+        for handler in director.handlers.values():
+            assert handler.timeout == 3.0
+            assert handler._logger._ydl is second
+        assert director.logger._ydl is second
+    assert pool.stats()['reused'] == 1
+    pool.close()
+
+
+def test_idle_session_does_not_keep_the_finished_job_alive():
+    pool = YDLPool(max_idle=2)
+    with pool.session('youtube', dict(OPTS, progress_hooks=[lambda d: None])) as ydl:
+        ydl._request_director
+        ydl.get_info_extractor('Youtube')
+        ref = weakref.ref(ydl)
+    del ydl
+    gc.collect()
+    assert ref() is None
+    pool.close()
+
+
+def test_pool_switches_off_when_internals_are_missing(monkeypatch):
+    import download_executor
+
+    monkeypatch.setattr(ydl_pool, '_YDLLogger', None)
+    assert not ydl_pool.internals_supported()
+    download_executor.configure_pool(2, 100, 300)
+    try:
+        assert download_executor._ydl_pool is None
+        with download_executor.youtube_dl('youtube', dict(OPTS)) as ydl:
+            assert isinstance(ydl, yt_dlp.YoutubeDL)
+    finally:
+        download_executor.configure_pool(0, 100, 300)
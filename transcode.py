@@ -0,0 +1,235 @@
+# transcode.py - ffmpeg stage: faststart remux for streaming and re-encoding oversized videos
+import asyncio
+import glob
+import json
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Codecs Telegram clients play inline; anything else can't be fixed by a remux
+STREAMABLE_VIDEO = {'h264', 'hevc'}
+STREAMABLE_AUDIO = {'aac', 'mp3'}
+
+# Lower the resolution along with the bitrate so starved encodes stay watchable
+HEIGHT_FOR_BITRATE = ((1_500_000, 720), (900_000, 540), (500_000, 480), (250_000, 360), (0, 240))
+
+
+class TranscodeUnavailable(Exception):
+    """ffmpeg or ffprobe is not installed"""
+
+
+class TranscodeError(Exception):
+    """ffmpeg failed, ran out of time, or could not get the file under the limit"""
+
+
+def usable_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def lower_priority(nice):
+    """Pool initializer: ffmpeg children inherit the worker's niceness"""
+    try:
+        os.nice(nice)
+    except OSError:
+        pass
+
+
+def target_bitrates(size_limit, duration, audio_bitrate=96_000, overhead=0.03):
+    """(video, audio) bits per second that fill size_limit over duration, minus container overhead"""
+    total = size_limit * 8 * (1 - overhead) / duration
+    audio = int(min(audio_bitrate, total * 0.15))
+    return int(total - audio), audio
+
+
+def height_for_bitrate(video_bitrate, max_height):
+    for floor, height in HEIGHT_FOR_BITRATE:
+        if video_bitrate >= floor:
+            return min(height, max_height)
+    return min(HEIGHT_FOR_BITRATE[-1][1], max_height)
+
+
+def moov_first(path):
+    """True if an MP4's index precedes its media data, so playback can start before the download ends"""
+    with open(path, 'rb') as media:
+        while True:
+            header = media.read(8)
+            if len(header) < 8:
+                return False
+            size, kind = struct.unpack('>I4s', header)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack('>Q', media.read(8))[0]
+                header_size = 16
+            if kind == b'moov':
+                return True
+            if kind == b'mdat' or size < header_size:
+                return False
+            media.seek(size - header_size, os.SEEK_CUR)
+
+
+def run_ffmpeg(command, deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TranscodeError("Transcode time budget exhausted")
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=remaining)
+    except subprocess.TimeoutExpired:
+        raise TranscodeError("ffmpeg ran out of its time budget")
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode(errors='replace').strip()[-300:] or f"ffmpeg exited with {result.returncode}")
+
+
+def probe_media(ffprobe, path):
+    """ffprobe's format and stream description of a file"""
+    try:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+            capture_output=True, timeout=60,
+        )
+    except subprocess.TimeoutExpired:
+        raise TranscodeError("ffprobe timed out")
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode(errors='replace').strip()[-300:] or "ffprobe failed")
+    try:
+        return json.loads(result.stdout or b'{}')
+    except ValueError:
+        raise TranscodeError("ffprobe returned output that is not JSON")
+
+
+def remux(ffmpeg, source, target, budget):
+    """Copy the streams into an MP4 with the index up front"""
+    run_ffmpeg([
+        ffmpeg, '-hide_banner', '-nostdin', '-y', '-v', 'error', '-i', source,
+        '-map', '0:v:0?', '-map', '0:a:0?', '-c', 'copy', '-movflags', '+faststart', target,
+    ], time.monotonic() + budget)
+    return target
+
+
+def encode(ffmpeg, source, target, video_bitrate, audio_bitrate, height, mode, preset, threads, budget):
+    """Re-encode to H.264/AAC at video_bitrate, two-pass or capped CRF, within budget seconds"""
+    deadline = time.monotonic() + budget
+    base = [ffmpeg, '-hide_banner', '-nostdin', '-y', '-v', 'error', '-i', source]
+    video = [
+        '-map', '0:v:0', '-c:v', 'libx264', '-preset', preset, '-pix_fmt', 'yuv420p', '-threads', str(threads),
+        '-vf', f"scale=-2:'min({height},trunc(ih/2)*2)'",
+    ]
+    audio = ['-map', '0:a:0?', '-c:a', 'aac', '-b:a', str(audio_bitrate), '-ac', '2']
+    output = ['-movflags', '+faststart', target]
+
+    if mode == 'crf':
+        # CRF picks the quality; the rate cap keeps the size under the limit
+        cap = ['-maxrate', str(video_bitrate), '-bufsize', str(video_bitrate * 2)]
+        run_ffmpeg(base + video + ['-crf', '23'] + cap + audio + output, deadline)
+        return target
+
+    passlog = os.path.splitext(target)[0] + '-pass'
+    try:
+        run_ffmpeg(base + video + ['-b:v', str(video_bitrate), '-pass', '1', '-passlogfile', passlog,
+                                   '-an', '-f', 'mp4', os.devnull], deadline)
+        # Two-pass already hits the average; the looser cap only smooths out spikes
+        run_ffmpeg(base + video + ['-b:v', str(video_bitrate), '-pass', '2', '-passlogfile', passlog,
+                                   '-maxrate', str(video_bitrate * 3 // 2), '-bufsize', str(video_bitrate * 2)]
+                   + audio + output, deadline)
+    finally:
+        for leftover in glob.glob(passlog + '*'):
+            os.remove(leftover)
+    return target
+
+
+class Transcoder:
+    """Runs ffmpeg jobs in a niced process pool sized to the CPU cores available.
+
+    make_streamable() remuxes files Telegram can't stream (other containers,
+    or MP4s with the index at the end) without re-encoding. compress()
+    re-encodes a video to the bitrate that fits it under a size limit.
+    Both remove the source file once its replacement is ready and raise
+    TranscodeError (leaving the source alone) otherwise.
+    """
+
+    def __init__(self, workers=0, threads=2, nice=10, budget=300, mode='twopass', preset='veryfast',
+                 audio_bitrate=96_000, min_video_bitrate=150_000, max_height=720):
+        self.ffmpeg = shutil.which('ffmpeg')
+        self.ffprobe = shutil.which('ffprobe')
+        if not self.ffmpeg or not self.ffprobe:
+            raise TranscodeUnavailable("ffmpeg and ffprobe must be on PATH")
+        self.threads = max(1, threads)
+        self.workers = workers or max(1, usable_cores() // self.threads)
+        self.budget = budget
+        self.mode = mode if mode in ('twopass', 'crf') else 'twopass'
+        self.preset = preset
+        self.audio_bitrate = audio_bitrate
+        self.min_video_bitrate = min_video_bitrate
+        self.max_height = max_height
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=lower_priority, initargs=(nice,))
+        logger.info(f"🎞️ Transcoder: {self.workers} workers x {self.threads} threads, {self.mode}, {budget:.0f}s budget")
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+
+    def can_fit(self, duration, size_limit):
+        """True if a re-encode of this duration under size_limit keeps a watchable bitrate"""
+        if not duration:
+            return False
+        video_bitrate, _ = target_bitrates(size_limit, duration, self.audio_bitrate)
+        return video_bitrate >= self.min_video_bitrate
+
+    async def make_streamable(self, path):
+        """Path of a faststart MP4 with the same streams, or path itself if it already is one or can't be"""
+        info = await self._run(probe_media, self.ffprobe, path)
+        streams = info.get('streams', [])
+        video = [s.get('codec_name') for s in streams if s.get('codec_type') == 'video']
+        audio = [s.get('codec_name') for s in streams if s.get('codec_type') == 'audio']
+        if not video or video[0] not in STREAMABLE_VIDEO or (audio and audio[0] not in STREAMABLE_AUDIO):
+            return path
+        format_name = info.get('format', {}).get('format_name', '')
+        if 'mp4' in format_name and await asyncio.to_thread(moov_first, path):
+            return path
+
+        target = os.path.splitext(path)[0] + '.faststart.mp4'
+        await self._produce(target, remux, self.ffmpeg, path, target, self.budget)
+        os.remove(path)
+        return target
+
+    async def compress(self, path, size_limit, duration=None):
+        """Path of a re-encoded copy under size_limit; the original is removed"""
+        if not duration:
+            info = await self._run(probe_media, self.ffprobe, path)
+            duration = float(info.get('format', {}).get('duration') or 0)
+        if not self.can_fit(duration, size_limit):
+            raise TranscodeError(f"{duration:.0f}s of video can't fit {size_limit / (1024 * 1024):.0f} MB at a watchable bitrate")
+
+        video_bitrate, audio_bitrate = target_bitrates(size_limit, duration, self.audio_bitrate)
+        height = height_for_bitrate(video_bitrate, self.max_height)
+        logger.info(f"🗜️ Compressing {os.path.basename(path)} to {video_bitrate // 1000} kbps at {height}p")
+        target = os.path.splitext(path)[0] + '.small.mp4'
+        await self._produce(
+            target, encode, self.ffmpeg, path, target, video_bitrate, audio_bitrate, height,
+            self.mode, self.preset, self.threads, self.budget,
+        )
+        size = os.path.getsize(target)
+        if size > size_limit:
+            os.remove(target)
+            raise TranscodeError(f"Compressed file is still {size / (1024 * 1024):.1f} MB")
+        os.remove(path)
+        return target
+
+    async def _produce(self, target, function, *args):
+        """Run an ffmpeg job in the pool, removing its partial output if it fails"""
+        try:
+            await self._run(function, *args)
+        except BaseException:
+            if os.path.exists(target):
+                os.remove(target)
+            raise
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,72 @@
+# webhook.py - aiohttp server receiving Telegram webhook updates, plus health and readiness probes
+import hmac
+import json
+import logging
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    """Feeds POSTed updates into an Application's update queue.
+
+    Telegram sends the secret token in X-Telegram-Bot-Api-Secret-Token;
+    requests without the right one are rejected before they are parsed.
+    GET /healthz answers while the process is up, GET /readyz only while
+    ready() says new updates can be taken, so a load balancer stops
+    routing to a replica that is draining.
+    """
+
+    def __init__(self, application, path, secret_token, host='0.0.0.0', port=8080, ready=None):
+        self.application = application
+        self.path = '/' + path.strip('/')
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.ready = ready or (lambda: True)
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+
+    async def handle_update(self, request):
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.rejected += 1
+            logger.warning(f"🚫 Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+        if not self.ready():
+            # Telegram retries undelivered updates, hopefully on a replica that is still up
+            return web.Response(status=503)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except (json.JSONDecodeError, ValueError, TypeError) as e:
+            logger.warning(f"⚠️ Ignoring malformed webhook update: {e}")
+            return web.Response(status=400)
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(self, request):
+        return web.json_response({'status': 'ok'})
+
+    async def handle_ready(self, request):
+        if self.ready():
+            return web.json_response({'status': 'ready'})
+        return web.json_response({'status': 'not ready'}, status=503)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        app.router.add_get('/readyz', self.handle_ready)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"🪝 Webhook server listening on http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,215 @@
+# ydl_pool.py - Reusable yt-dlp sessions: warm extractors, keep-alive connections and shared cookie jars
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import yt_dlp
+
+# Not public API; when a yt-dlp release moves them the pool switches itself off instead of breaking imports
+try:
+    from yt_dlp.networking.common import DEFAULT_TIMEOUT
+    from yt_dlp.utils._utils import _YDLLogger
+    from yt_dlp.utils.networking import clean_headers
+except ImportError:
+    DEFAULT_TIMEOUT = _YDLLogger = clean_headers = None
+
+logger = logging.getLogger(__name__)
+
+# Sessions move yt-dlp internals between YoutubeDL instances: the cached
+# cookiejar and _request_director properties, the _ies registry, _YDLLogger,
+# and the handlers' cookiejar, headers, timeout and _logger. They were
+# checked against this release (tests/test_ydl_pool.py fails if they change).
+CHECKED_YTDLP_VERSION = '2026.08.19'
+
+
+def internals_supported():
+    """True if this yt-dlp still has the private pieces sessions rely on"""
+    cls = yt_dlp.YoutubeDL
+    return (
+        None not in (DEFAULT_TIMEOUT, _YDLLogger, clean_headers)
+        and isinstance(cls.__dict__.get('cookiejar'), functools.cached_property)
+        and isinstance(cls.__dict__.get('_request_director'), functools.cached_property)
+        and hasattr(cls, 'add_info_extractor')
+    )
+
+# Options baked into a session's connections and extractor list; jobs only share a session if these match
+SESSION_OPTIONS = (
+    'cookiefile', 'cookiesfrombrowser', 'proxy', 'geo_verification_proxy', 'impersonate', 'source_address',
+    'nocheckcertificate', 'legacyserverconnect', 'client_certificate', 'client_certificate_key',
+    'enable_file_urls', 'allowed_extractors', 'compat_opts',
+)
+
+
+def session_key(platform, ydl_opts):
+    # yt-dlp fills some of these in (compat_opts becomes an empty set), so empty counts as unset
+    values = [ydl_opts.get(option) or None for option in SESSION_OPTIONS]
+    return (platform, repr([sorted(value) if isinstance(value, set) else value for value in values]))
+
+
+class Session:
+    """What one job hands to the next: extractor instances and the request director with its open connections"""
+
+    def __init__(self, key):
+        self.key = key
+        self.extractors = None
+        self.director = None
+        self.jobs = 0
+        self.idle_since = time.monotonic()
+
+    def close(self):
+        if self.director:
+            self.director.close()
+            self.director = None
+
+
+class YDLPool:
+    """Hands out YoutubeDL instances built on warm, reusable sessions.
+
+    Building a YoutubeDL registers ~1800 extractor classes, and its first
+    requests pay for extractor initialization, TLS handshakes and parsing
+    the cookie file. A session keeps the extractor instances and the
+    request director (and so its keep-alive connections) of a finished job,
+    and the next job with the same platform and connection options gets
+    them back. Each session serves one job at a time; sessions of a
+    platform share one cookie jar. Everything else (format selection, output
+    template, hooks, counters) comes from a fresh YoutubeDL per job, and a
+    job that fails gives its session up instead of returning it.
+    """
+
+    def __init__(self, max_idle=8, max_jobs=100, idle_timeout=300):
+        self.max_idle = max_idle
+        self.max_jobs = max_jobs
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self._idle = []
+        self._jars = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def _checkout(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expired = [s for s in self._idle if now - s.idle_since > self.idle_timeout]
+            self._idle = [s for s in self._idle if now - s.idle_since <= self.idle_timeout]
+            # Most recently used first: its connections are the likeliest to still be open
+            session = next((s for s in reversed(self._idle) if s.key == key), None)
+            if session:
+                self._idle.remove(session)
+                self.hits += 1
+            else:
+                self.misses += 1
+        for stale in expired:
+            stale.close()
+        return session or Session(key)
+
+    def _checkin(self, session):
+        session.jobs += 1
+        session.idle_since = time.monotonic()
+        if session.jobs >= self.max_jobs:
+            session.close()
+            return
+        with self._lock:
+            self._idle.append(session)
+            evicted = self._idle[:-self.max_idle] if len(self._idle) > self.max_idle else []
+            self._idle = self._idle[len(evicted):]
+        for old in evicted:
+            old.close()
+
+    def _cookiejar(self, platform, ydl):
+        """The platform's shared jar for this cookie source, reloaded if the cookie file changed on disk"""
+        cookiefile = ydl.params.get('cookiefile')
+        jar_key = (platform, cookiefile, repr(ydl.params.get('cookiesfrombrowser')))
+        mtime = os.path.getmtime(cookiefile) if cookiefile and os.path.exists(cookiefile) else None
+        with self._lock:
+            jar, loaded = self._jars.get(jar_key, (None, None))
+        if jar is None or loaded != mtime:
+            jar = ydl.cookiejar
+            with self._lock:
+                self._jars[jar_key] = (jar, mtime)
+        return jar
+
+    def _save_cookies(self, platform, ydl):
+        cookiefile = ydl.params.get('cookiefile')
+        if not cookiefile:
+            return
+        with self._save_lock:
+            try:
+                ydl.cookiejar.save()
+            except OSError as e:
+                logger.warning(f"⚠️ Could not save cookies to {cookiefile}: {e}")
+                return
+            jar_key = (platform, cookiefile, repr(ydl.params.get('cookiesfrombrowser')))
+            with self._lock:
+                if jar_key in self._jars:
+                    self._jars[jar_key] = (ydl.cookiejar, os.path.getmtime(cookiefile))
+
+    def _attach(self, platform, session, ydl_opts):
+        if session.extractors is None:
+            ydl = yt_dlp.YoutubeDL(ydl_opts)
+        else:
+            ydl = yt_dlp.YoutubeDL(ydl_opts, auto_init=False)
+            for extractor in session.extractors.values():
+                ydl.add_info_extractor(extractor)
+        ydl.__dict__['cookiejar'] = self._cookiejar(platform, ydl)
+
+        director = session.director
+        if director and all(handler.cookiejar is ydl.cookiejar for handler in director.handlers.values()):
+            # The connections stay; this job's headers (user agent), timeout and logger replace the last one's
+            headers = ydl.params['http_headers'].copy()
+            clean_headers(headers)
+            timeout = float(ydl.params.get('socket_timeout') or DEFAULT_TIMEOUT)
+            self._set_logger(director, _YDLLogger(ydl))
+            for handler in director.handlers.values():
+                handler.headers = headers
+                handler.timeout = timeout
+            ydl.__dict__['_request_director'] = director
+        else:
+            session.close()
+        return ydl
+
+    def _set_logger(self, director, ydl_logger):
+        director.logger = ydl_logger
+        for handler in director.handlers.values():
+            handler._logger = ydl_logger
+
+    def _detach(self, session, ydl):
+        # An idle session must not keep the finished job's YoutubeDL (and its hooks) alive
+        session.extractors = dict(ydl._ies)
+        for extractor in session.extractors.values():
+            if not isinstance(extractor, type):
+                extractor.set_downloader(None)
+        session.director = ydl.__dict__.pop('_request_director', None)
+        if session.director:
+            self._set_logger(session.director, _YDLLogger())
+
+    @contextmanager
+    def session(self, platform, ydl_opts):
+        """A YoutubeDL for ydl_opts on a warm session of platform, returned to the pool afterwards"""
+        session = self._checkout(session_key(platform, ydl_opts))
+        ydl = self._attach(platform, session, ydl_opts)
+        try:
+            yield ydl
+        except BaseException:
+            # Whatever went wrong may live in the connections or extractor state; start over next time
+            self._save_cookies(platform, ydl)
+            director = ydl.__dict__.pop('_request_director', None)
+            if director:
+                director.close()
+            raise
+        self._save_cookies(platform, ydl)
+        self._detach(session, ydl)
+        self._checkin(session)
+
+    def stats(self):
+        with self._lock:
+            return {'idle': len(self._idle), 'reused': self.hits, 'created': self.misses}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()